@@ -0,0 +1,174 @@
+"""
+Non-blocking logging for hot paths
+Loggers under "camsys.<subsystem>" hand records to a QueueHandler backed by
+a SimpleQueue (put never blocks); one QueueListener thread does the actual
+writing, so the PTZ actor, pipeline threads and event-loop handlers never
+wait on stdout/journald. On top of that:
+
+  - rate limiting: at most LOG_RATE_LIMIT_BURST records per message template
+    and LOG_RATE_LIMIT_WINDOW seconds; the next record that gets through
+    reports how many were suppressed
+  - structured fields: pass extra={'stage': ..., 'seq': ..., 'latency_ms': ...};
+    they are appended as key=value (text) or emitted as keys (json)
+  - per-subsystem levels from LOG_LEVELS, adjustable at runtime
+  - a bounded backlog: past LOG_QUEUE_MAX pending records new ones are dropped
+    and counted instead of growing without limit
+
+Use %-style arguments (log.info("x %s", value)), not f-strings, so repeated
+messages share a template for rate limiting and are only formatted when
+they are actually written.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import sys
+import threading
+import time
+from queue import SimpleQueue
+from config import *
+
+ROOT = "camsys"
+FIELDS = ('stage', 'seq', 'latency_ms')
+
+_lock = threading.Lock()
+_handler = None
+_listener = None
+
+
+class RateLimitFilter(logging.Filter):
+    def __init__(self, burst=LOG_RATE_LIMIT_BURST, window=LOG_RATE_LIMIT_WINDOW):
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        self.windows = {}         # (logger, template) -> [start, count, suppressed]
+        self.suppressed = 0
+
+    def filter(self, record):
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        entry = self.windows.get(key)
+        if entry is None or now - entry[0] >= self.window:
+            if len(self.windows) > 1000:
+                self.windows.clear()
+            if entry is not None and entry[2]:
+                record.suppressed = entry[2]
+            self.windows[key] = [now, 1, 0]
+            return True
+        if entry[1] < self.burst:
+            entry[1] += 1
+            return True
+        entry[2] += 1
+        self.suppressed += 1
+        return False
+
+
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops (and counts) records when the writer falls behind"""
+
+    def __init__(self, queue, limit=LOG_QUEUE_MAX):
+        super().__init__(queue)
+        self.limit = limit
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Formatting happens in the writer thread; callers pass immutable args
+        return record
+
+    def enqueue(self, record):
+        if self.queue.qsize() >= self.limit:
+            self.dropped += 1
+            return
+        self.queue.put_nowait(record)
+
+
+class StructuredFormatter(logging.Formatter):
+    def __init__(self, json_lines=False):
+        super().__init__('%(asctime)s %(levelname)-7s %(name)s: %(message)s')
+        self.json_lines = json_lines
+
+    def format(self, record):
+        fields = {name: getattr(record, name) for name in FIELDS if getattr(record, name, None) is not None}
+        suppressed = getattr(record, 'suppressed', 0)
+
+        if self.json_lines:
+            entry = {
+                'time': round(record.created, 3),
+                'level': record.levelname,
+                'logger': record.name,
+                'message': record.getMessage(),
+                **fields
+            }
+            if suppressed:
+                entry['suppressed'] = suppressed
+            return json.dumps(entry, ensure_ascii=False)
+
+        line = super().format(record)
+        if fields:
+            line += "  " + " ".join(f"{name}={value}" for name, value in fields.items())
+        if suppressed:
+            line += f"  (+{suppressed} similar suppressed)"
+        return line
+
+
+def configure_logging():
+    """Install the queue handler and start the writer thread (idempotent)"""
+    global _handler, _listener
+    with _lock:
+        if _listener is not None:
+            return
+
+        writer = logging.StreamHandler(sys.stdout)
+        writer.setFormatter(StructuredFormatter(json_lines=LOG_FORMAT == 'json'))
+
+        queue = SimpleQueue()
+        _handler = BoundedQueueHandler(queue)
+        _handler.addFilter(RateLimitFilter())
+
+        root = logging.getLogger(ROOT)
+        root.addHandler(_handler)
+        root.propagate = False
+        _apply_level(root, LOG_LEVEL)
+        for subsystem, level in LOG_LEVELS.items():
+            _apply_level(logging.getLogger(f"{ROOT}.{subsystem}"), level)
+
+        _listener = logging.handlers.QueueListener(queue, writer)
+        _listener.start()
+        # Flush what is still queued when the process exits
+        atexit.register(_listener.stop)
+
+
+def _apply_level(logger, level):
+    """Case-insensitive level from config; a bad value falls back to INFO instead of failing import"""
+    try:
+        logger.setLevel(str(level).upper())
+    except ValueError:
+        logger.setLevel(logging.INFO)
+        logger.warning("Unknown log level %r, using INFO", level)
+
+
+def get_logger(subsystem):
+    configure_logging()
+    return logging.getLogger(f"{ROOT}.{subsystem}")
+
+
+def set_level(subsystem, level):
+    """Change a subsystem's level at runtime ('' = all subsystems)"""
+    name = f"{ROOT}.{subsystem}" if subsystem else ROOT
+    logging.getLogger(name).setLevel(level.upper())
+
+
+def get_stats():
+    configure_logging()
+    levels = {'': logging.getLevelName(logging.getLogger(ROOT).level)}
+    for name, logger in logging.root.manager.loggerDict.items():
+        if name.startswith(ROOT + ".") and isinstance(logger, logging.Logger) and logger.level:
+            levels[name[len(ROOT) + 1:]] = logging.getLevelName(logger.level)
+    rate_limit = next(f for f in _handler.filters if isinstance(f, RateLimitFilter))
+    return {
+        'levels': levels,
+        'format': LOG_FORMAT,
+        'pending': _handler.queue.qsize(),
+        'dropped': _handler.dropped,
+        'suppressed': rate_limit.suppressed,
+    }
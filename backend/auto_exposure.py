@@ -0,0 +1,158 @@
+"""
+Auto-exposure - closed loop on camera brightness from the output histogram
+Samples the latest output packet a few times per second and reads its
+cached histogram (FramePacket.get_histogram, shared with /histogram and the
+WebSocket push, so no extra frame pass when the dashboard is open). The
+median and a highlight percentile of the cumulative histogram are compared
+against a target band:
+
+  highlight above AE_HIGHLIGHT_MAX, or median above the band -> darker
+  median below the band                                       -> brighter
+
+A direction must hold for AE_CONFIRM_SAMPLES samples in a row (hysteresis),
+brightness changes are at least AE_MIN_CHANGE_INTERVAL apart (rate limit),
+and frames captured before the last change has settled are ignored. Steps
+go to the next level that has its own genfile, so the calibration cache is
+not churned with interpolated profiles.
+"""
+import threading
+import time
+from collections import deque
+import numpy as np
+from config import *
+from app_logging import get_logger
+
+log = get_logger('ae')
+
+
+def histogram_percentile(cdf, fraction):
+    """Bin (0-255) at which the cumulative histogram reaches `fraction` of all pixels"""
+    return int(np.searchsorted(cdf, fraction * cdf[-1]))
+
+
+class AutoExposure:
+    def __init__(self, camera):
+        self.camera = camera
+        self.enabled = False
+        self.thread = None
+
+        # Measurements / state
+        self.median = None
+        self.highlight = None
+        self.last_seq = None
+        self.pending = 0            # +1 brighter / -1 darker / 0 in band
+        self.pending_count = 0
+        self.last_change = 0.0
+        self.changes = 0
+        self.decisions = deque(maxlen=10)
+
+    def set_enabled(self, enabled):
+        if enabled == self.enabled:
+            return
+        self.enabled = enabled
+        self.pending = 0
+        self.pending_count = 0
+        if enabled and (self.thread is None or not self.thread.is_alive()):
+            self.thread = threading.Thread(target=self._run, name="auto-exposure", daemon=True)
+            self.thread.start()
+        log.info("Auto-exposure: %s", 'ON' if enabled else 'OFF')
+
+    def manual_override(self):
+        """Operator moved brightness by hand: hand control back to them"""
+        if self.enabled:
+            log.info("Manual brightness change - auto-exposure off")
+            self.set_enabled(False)
+
+    # ------------------------------------------------------------------
+    # Control loop
+    # ------------------------------------------------------------------
+
+    def _run(self):
+        log.info("Controller thread started")
+        # Lives as long as AE is enabled; idles while the camera is not running
+        # (enabled before start-up finished, or across a camera restart)
+        while self.enabled:
+            time.sleep(AE_INTERVAL)
+            if not self.camera.running or self.camera.calibration_generator.active:
+                continue
+
+            packet = self.camera.get_packet()
+            if packet is None or packet.seq == self.last_seq:
+                continue
+            # Ignore frames captured before the last change has taken effect
+            if packet.timestamp < self.last_change + AE_SETTLE_SEC:
+                continue
+            self.last_seq = packet.seq
+
+            histogram = packet.get_histogram()
+            if histogram is None:
+                continue
+            try:
+                self._evaluate(histogram)
+            except Exception as e:
+                log.warning("Error: %s", e, extra={'seq': packet.seq})
+        log.info("Controller thread stopped")
+
+    def _evaluate(self, histogram):
+        cdf = np.cumsum(histogram.sum(axis=0, dtype=np.int64))
+        self.median = histogram_percentile(cdf, 0.5)
+        self.highlight = histogram_percentile(cdf, AE_HIGHLIGHT_PERCENTILE)
+
+        low, high = AE_TARGET_MEDIAN
+        if self.highlight > AE_HIGHLIGHT_MAX or self.median > high:
+            direction = -1
+        elif self.median < low:
+            direction = 1
+        else:
+            direction = 0
+
+        if direction != self.pending:
+            self.pending = direction
+            self.pending_count = 0
+        self.pending_count += 1
+
+        if direction == 0 or self.pending_count < AE_CONFIRM_SAMPLES:
+            return
+        if time.time() - self.last_change < AE_MIN_CHANGE_INTERVAL:
+            return
+
+        current = self.camera.brightness
+        target = self._next_level(current, direction)
+        if target == current:
+            return
+
+        self.camera.set_brightness(target)
+        self.last_change = time.time()
+        self.changes += 1
+        self.pending_count = 0
+        self.decisions.append({
+            'time': round(self.last_change, 3),
+            'from': current,
+            'to': target,
+            'median': self.median,
+            'highlight': self.highlight,
+        })
+        log.info("Brightness %s → %s (median %d, p%g %d)", current, target,
+                 self.median, AE_HIGHLIGHT_PERCENTILE * 100, self.highlight)
+
+    def _next_level(self, current, direction):
+        """Next genfile level in `direction` (or AE_STEP without genfiles), within limits"""
+        low, high = AE_BRIGHTNESS_RANGE
+        levels = [l for l in self.camera.calibration_library.available() if low <= l <= high]
+        if AE_PROFILE_STEPS and levels:
+            if direction > 0:
+                return min((l for l in levels if l > current), default=current)
+            return max((l for l in levels if l < current), default=current)
+        return max(low, min(high, current + direction * AE_STEP))
+
+    def get_status(self):
+        return {
+            'enabled': self.enabled,
+            'median': self.median,
+            'highlight': self.highlight,
+            'target_median': list(AE_TARGET_MEDIAN),
+            'highlight_max': AE_HIGHLIGHT_MAX,
+            'pending': self.pending,
+            'changes': self.changes,
+            'decisions': list(self.decisions),
+        }
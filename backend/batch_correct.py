@@ -0,0 +1,340 @@
+"""
+Batch offline corrections - apply a .genrgb profile to archived images/videos
+
+Inputs are streamed through BLC/SLC, hot/dead pixel repair, GLC and Dark GLC
+in a pool of worker processes. The calibration planes are loaded once by the
+parent into one shared-memory block; every worker maps them read-only instead
+of receiving its own copy. Each worker runs the kernels single-threaded
+(OMP_NUM_THREADS=1) so the pool, not OpenMP, spreads the work across the cores.
+
+Images are read and written by the workers themselves; video frames are
+decoded by the parent, corrected in the pool and written back in input
+order. Inputs whose size differs from the profile are resized to it.
+
+Run:
+    python batch_correct.py VG43 archive/ -o corrected/
+    python batch_correct.py genfiles/VG40.genrgb run1.avi run2.avi -o corrected/ --workers 8
+    python batch_correct.py VG43 archive/ -o corrected/ --no-dark-glc --output report.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context, shared_memory
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+IMAGE_EXTENSIONS = {'.png', '.bmp', '.tif', '.tiff', '.jpg', '.jpeg'}
+VIDEO_EXTENSIONS = {'.avi', '.mp4', '.mkv', '.mov'}
+PROGRESS_INTERVAL = 2.0
+
+# Per-worker state (set by _init_worker)
+_shm = None
+_engine = None
+_stages = None
+
+
+# ----------------------------------------------------------------------
+# Shared calibration
+# ----------------------------------------------------------------------
+
+def share_calibration(calibration, plane_keys):
+    """Copy every calibration plane into one shared-memory block; returns (shm, layout)"""
+    keys = [key for key in plane_keys if calibration[key] is not None]
+    shape = (calibration['height'], calibration['width'])
+    plane_bytes = shape[0] * shape[1] * np.dtype(np.int32).itemsize
+
+    shm = shared_memory.SharedMemory(create=True, size=plane_bytes * len(keys))
+    planes = np.ndarray((len(keys),) + shape, dtype=np.int32, buffer=shm.buf)
+    for i, key in enumerate(keys):
+        planes[i] = calibration[key]
+
+    layout = {
+        'name': shm.name,
+        'shape': shape,
+        'keys': keys,
+        'meta': {k: v for k, v in calibration.items() if k not in plane_keys},
+    }
+    return shm, layout
+
+
+def attach_calibration(layout):
+    """Map the shared block and rebuild a calibration dict of plane views"""
+    shm = shared_memory.SharedMemory(name=layout['name'])
+    planes = np.ndarray((len(layout['keys']),) + tuple(layout['shape']), dtype=np.int32, buffer=shm.buf)
+    planes.flags.writeable = False
+
+    calibration = dict(layout['meta'])
+    for key in _plane_keys():
+        calibration[key] = None
+    for i, key in enumerate(layout['keys']):
+        calibration[key] = planes[i]
+    return shm, calibration
+
+
+def _plane_keys():
+    from corrections_loader import CorrectionEngine
+    return CorrectionEngine.PLANE_KEYS
+
+
+# ----------------------------------------------------------------------
+# Worker side
+# ----------------------------------------------------------------------
+
+def _init_worker(layout, stages):
+    global _shm, _engine, _stages
+    # Inherited from the parent, but make sure before the kernels load
+    os.environ.setdefault('OMP_NUM_THREADS', '1')
+    from corrections_loader import CorrectionEngine, is_fast_mode
+
+    _shm, calibration = attach_calibration(layout)
+    _engine = CorrectionEngine()
+    _engine.set_calibration(calibration)
+    _stages = stages
+    is_fast_mode()
+
+
+def _correct(frame):
+    height, width = _engine.calibration['height'], _engine.calibration['width']
+    resized = frame.shape[:2] != (height, width)
+    if resized:
+        frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+    frame = np.ascontiguousarray(frame)
+    frame = _engine.apply_corrections(frame, enable_nlm=False, **_stages)
+    return frame, resized
+
+
+def correct_image(source, destination):
+    """Worker job: read, correct and write one image; returns (ok, resized, ms)"""
+    start = time.perf_counter()
+    frame = cv2.imread(source, cv2.IMREAD_COLOR)
+    if frame is None:
+        return False, False, 0.0
+    frame, resized = _correct(frame)
+    Path(destination).parent.mkdir(parents=True, exist_ok=True)
+    ok = cv2.imwrite(destination, frame)
+    return ok, resized, (time.perf_counter() - start) * 1000
+
+
+def correct_frame(frame):
+    """Worker job: correct one decoded video frame; returns (frame, resized, ms)"""
+    start = time.perf_counter()
+    frame, resized = _correct(frame)
+    return frame, resized, (time.perf_counter() - start) * 1000
+
+
+# ----------------------------------------------------------------------
+# Parent side
+# ----------------------------------------------------------------------
+
+class Throughput:
+    def __init__(self, pixels_per_frame):
+        self.pixels_per_frame = pixels_per_frame
+        self.start = time.perf_counter()
+        self.last_report = self.start
+        self.frames = 0
+        self.failed = 0
+        self.resized = 0
+        self.worker_ms = 0.0
+
+    def add(self, ok, resized, ms):
+        if ok:
+            self.frames += 1
+            self.worker_ms += ms
+        else:
+            self.failed += 1
+        self.resized += int(resized)
+
+        now = time.perf_counter()
+        if now - self.last_report >= PROGRESS_INTERVAL:
+            self.last_report = now
+            elapsed = now - self.start
+            print(f"  {self.frames:7d} frames  {self.frames / elapsed:7.1f} fps  "
+                  f"{self.frames * self.pixels_per_frame / elapsed / 1e6:7.1f} MPix/s")
+
+    def summary(self, workers):
+        elapsed = time.perf_counter() - self.start
+        return {
+            'workers': workers,
+            'frames': self.frames,
+            'failed': self.failed,
+            'resized': self.resized,
+            'elapsed_s': round(elapsed, 2),
+            'fps': round(self.frames / elapsed, 1) if elapsed else 0.0,
+            'mpix_per_s': round(self.frames * self.pixels_per_frame / elapsed / 1e6, 1) if elapsed else 0.0,
+            'worker_ms_mean': round(self.worker_ms / self.frames, 2) if self.frames else 0.0,
+        }
+
+
+def run_ordered(pool, jobs, on_result, max_in_flight):
+    """Submit jobs with at most max_in_flight pending; results handled in submission order"""
+    pending = deque()
+    for fn, *args in jobs:
+        pending.append(pool.submit(fn, *args))
+        if len(pending) >= max_in_flight:
+            on_result(pending.popleft().result())
+    while pending:
+        on_result(pending.popleft().result())
+
+
+def collect_inputs(paths, output_dir):
+    """Split inputs into (image jobs, video jobs) with their output paths"""
+    images, videos = [], []
+    for raw in paths:
+        path = Path(raw)
+        if path.is_dir():
+            for item in sorted(path.rglob('*')):
+                if item.is_file() and item.suffix.lower() in IMAGE_EXTENSIONS:
+                    images.append((item, output_dir / path.name / item.relative_to(path)))
+        elif path.suffix.lower() in VIDEO_EXTENSIONS:
+            videos.append((path, output_dir / f"{path.stem}.mp4"))
+        elif path.suffix.lower() in IMAGE_EXTENSIONS:
+            images.append((path, output_dir / path.name))
+        else:
+            print(f"⚠️ Skipping unsupported input: {path}")
+    return images, videos
+
+
+def process_images(pool, images, throughput, max_in_flight):
+    jobs = ((correct_image, str(src), str(dst)) for src, dst in images)
+    run_ordered(pool, jobs, lambda result: throughput.add(*result), max_in_flight)
+
+
+def process_video(pool, source, destination, calibration, throughput, max_in_flight):
+    cap = cv2.VideoCapture(str(source))
+    if not cap.isOpened():
+        print(f"❌ Could not open video: {source}")
+        return
+
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    size = (calibration['width'], calibration['height'])
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    writer = cv2.VideoWriter(str(destination), cv2.VideoWriter_fourcc(*'mp4v'), fps, size)
+    if not writer.isOpened():
+        cap.release()
+        print(f"❌ Could not create video: {destination}")
+        return
+
+    def frames():
+        while True:
+            ok, frame = cap.read()
+            if not ok:
+                return
+            yield correct_frame, frame
+
+    def write(result):
+        frame, resized, ms = result
+        writer.write(frame)
+        throughput.add(True, resized, ms)
+
+    print(f"▶ {source} → {destination} ({fps:.1f} fps)")
+    try:
+        run_ordered(pool, frames(), write, max_in_flight)
+    finally:
+        writer.release()
+        cap.release()
+
+
+def resolve_profile(profile):
+    """Accept a .genrgb path or a profile name like VG43"""
+    path = Path(profile)
+    if path.exists():
+        return path
+    from config import GENFILES_PATH
+    return Path(GENFILES_PATH) / f"{profile}.genrgb"
+
+
+def run(args):
+    # One OpenMP thread per worker process; set before anything loads the kernels
+    os.environ['OMP_NUM_THREADS'] = str(args.threads_per_worker)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from corrections_loader import CorrectionEngine
+    from thread_budget import cpu_count
+
+    profile = resolve_profile(args.profile)
+    if not profile.exists():
+        print(f"❌ Calibration file not found: {profile}")
+        return 1
+
+    engine = CorrectionEngine()
+    engine.load_calibration(str(profile))
+    calibration = engine.calibration
+
+    output_dir = Path(args.output_dir)
+    images, videos = collect_inputs(args.inputs, output_dir)
+    if not images and not videos:
+        print("❌ No images or videos found")
+        return 1
+
+    workers = args.workers or max(1, cpu_count() // args.threads_per_worker)
+    max_in_flight = workers * args.queue_depth
+    stages = {
+        'enable_blc_slc': not args.no_blc_slc,
+        'enable_glc': not args.no_glc,
+        'enable_dark_glc': not args.no_dark_glc,
+        'enable_defects': not args.no_defects,
+    }
+
+    print("=" * 70)
+    print(f"BATCH CORRECTIONS  {profile.stem}  {calibration['width']}×{calibration['height']}")
+    print(f"  {len(images)} images, {len(videos)} videos → {output_dir}")
+    print(f"  {workers} workers × {args.threads_per_worker} OpenMP thread(s), "
+          f"stages: {', '.join(k[7:] for k, v in stages.items() if v) or 'none'}")
+    print("=" * 70)
+
+    shm, layout = share_calibration(calibration, CorrectionEngine.PLANE_KEYS)
+    # The parent's planes are no longer needed once they live in shared memory
+    engine.calibration = calibration = {k: v for k, v in calibration.items() if k not in CorrectionEngine.PLANE_KEYS}
+    throughput = Throughput(calibration['width'] * calibration['height'])
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn'),
+                                 initializer=_init_worker, initargs=(layout, stages)) as pool:
+            if images:
+                process_images(pool, images, throughput, max_in_flight)
+            for source, destination in videos:
+                process_video(pool, source, destination, calibration, throughput, max_in_flight)
+    finally:
+        shm.close()
+        shm.unlink()
+
+    report = throughput.summary(workers)
+    report.update({'profile': profile.stem, 'stages': stages, 'threads_per_worker': args.threads_per_worker})
+    print("-" * 70)
+    print(f"✓ {report['frames']} frames in {report['elapsed_s']:.1f}s: {report['fps']:.1f} fps, "
+          f"{report['mpix_per_s']:.1f} MPix/s, {report['worker_ms_mean']:.1f} ms/frame per worker")
+    if report['failed']:
+        print(f"⚠️ {report['failed']} inputs could not be read or written")
+    if report['resized']:
+        print(f"⚠️ {report['resized']} frames resized to the profile size")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"✓ Report written: {args.output}")
+    return 0 if report['failed'] == 0 else 2
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply a .genrgb profile to image directories and videos")
+    parser.add_argument('profile', help="calibration file or profile name (e.g. VG43)")
+    parser.add_argument('inputs', nargs='+', help="image files, image directories or video files")
+    parser.add_argument('-o', '--output-dir', default='corrected')
+    parser.add_argument('--workers', type=int, default=0, help="worker processes (default: one per CPU)")
+    parser.add_argument('--threads-per-worker', type=int, default=1, help="OpenMP threads per worker")
+    parser.add_argument('--queue-depth', type=int, default=4, help="jobs in flight per worker")
+    parser.add_argument('--no-blc-slc', action='store_true')
+    parser.add_argument('--no-glc', action='store_true')
+    parser.add_argument('--no-dark-glc', action='store_true')
+    parser.add_argument('--no-defects', action='store_true', help="skip hot/dead pixel correction")
+    parser.add_argument('--output', default=None, help="write the throughput report as JSON")
+    return run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    sys.exit(main())
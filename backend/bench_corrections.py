@@ -0,0 +1,422 @@
+"""
+Correction kernel microbenchmark + conformance suite
+
+Runs every available correction backend (Cython/OpenMP, pure Python fallback)
+over a matrix of resolutions, stage combinations and OpenMP thread counts,
+using generated calibration maps. Every result is checked for bit-exact
+agreement with the NumPy reference implementation below, and timings
+(ms/frame, MPix/s) are written to JSON so versions can be compared.
+
+Run:
+    python bench_corrections.py
+    python bench_corrections.py --resolutions 640x483,1920x1080 --threads 1,4
+    python bench_corrections.py --output new.json --compare old.json
+
+Thread counts are applied through OMP_NUM_THREADS, so each count runs in its
+own worker process (OpenMP reads it once at start-up).
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+DEFAULT_RESOLUTIONS = "640x483,1280x720,1920x1080,3840x2160"
+DEFAULT_STAGES = "blc_slc,glc,dark_glc,all"
+STAGE_SETS = {
+    'blc_slc': ('blc_slc',),
+    'glc': ('glc',),
+    'dark_glc': ('dark_glc',),
+    'all': ('blc_slc', 'glc', 'dark_glc'),
+}
+
+
+# ═══════════════════════════════════════════════════════════════════════
+# REFERENCE IMPLEMENTATION (NumPy, integer semantics of corrections_fast.pyx)
+# ═══════════════════════════════════════════════════════════════════════
+
+def _trunc_div(a, b):
+    """C-style integer division (truncates toward zero), b > 0"""
+    return np.where(a >= 0, a // b, -((-a) // b))
+
+
+def reference_blc_slc(frame, blc_r, blc_g, blc_b, slc_diff_r, slc_diff_g, slc_diff_b):
+    out = frame.copy()
+    for ch, blc, diff in ((0, blc_b, slc_diff_b), (1, blc_g, slc_diff_g), (2, blc_r, slc_diff_r)):
+        val = frame[:, :, ch].astype(np.int32)
+        corrected = _trunc_div((val - blc) * 255, diff)
+        out[:, :, ch] = np.clip(corrected, 0, 255)
+    return out
+
+
+def _glc_channel(c, g):
+    maxv, mid, midp = 255, 127, 128
+    gc = np.clip(g, 0, maxv)
+
+    gd = np.maximum(gc, 1)
+    denom = maxv - gd
+    dark = np.where(
+        c > gd,
+        np.where(denom > 0, mid + _trunc_div((c - gd) * midp, np.maximum(denom, 1)), mid),
+        _trunc_div(c * mid, gd)
+    )
+    bright = np.where(
+        c > gd,
+        np.where(denom > 0, mid + _trunc_div((c - gd) * mid, np.maximum(denom, 1)), maxv),
+        _trunc_div(c * midp, gd)
+    )
+
+    result = np.where(gc < mid, dark, np.where(gc > mid, bright, c))
+    result = np.clip(result, 0, maxv)
+    return np.where(g == 0, c, result)
+
+
+def reference_glc(frame, glc_r, glc_g, glc_b):
+    out = frame.copy()
+    for ch, g in ((0, glc_b), (1, glc_g), (2, glc_r)):
+        out[:, :, ch] = _glc_channel(frame[:, :, ch].astype(np.int32), g)
+    return out
+
+
+def _dark_glc_channel(c, dg):
+    f32 = np.float32
+    quarter, half = 64, 128
+    a = c
+    result = c.copy()
+
+    # Very dark: dg < quarter
+    very_dark = (dg < quarter) & (dg != 0)
+    stretch = very_dark & (c > dg) & (c < half)
+    span = (half - dg).astype(f32) / f32(quarter)
+    stretched = quarter + ((c - dg).astype(f32) / np.where(stretch, span, f32(1))).astype(np.int32)
+    result = np.where(stretch, stretched, result)
+
+    lift = very_dark & ~stretch & (c < quarter) & (dg > 0)
+    glc_corr = f32(quarter) / np.where(lift, dg, 1).astype(f32)
+    lifted = (c.astype(f32) * glc_corr).astype(np.int32)
+    result = np.where(lift, lifted, result)
+
+    # Moderately dark: quarter < dg < half (blended with the input)
+    moderate = (dg > quarter) & (dg < half)
+    above = moderate & (c > dg)
+    corr_above = f32(quarter) / np.where(above, half - dg, 1).astype(f32)
+    value_above = quarter + ((c - dg).astype(f32) * corr_above).astype(np.int32)
+    below = moderate & ~above
+    value_below = (c.astype(f32) / (np.where(below, dg, quarter).astype(f32) / f32(quarter))).astype(np.int32)
+    result = np.where(above, (a + value_above) >> 1, result)
+    result = np.where(below, (a + value_below) >> 1, result)
+
+    return np.clip(result, 0, 255)
+
+
+def reference_dark_glc(frame, dark_glc_r, dark_glc_g, dark_glc_b):
+    out = frame.copy()
+    for ch, dg in ((0, dark_glc_b), (1, dark_glc_g), (2, dark_glc_r)):
+        out[:, :, ch] = _dark_glc_channel(frame[:, :, ch].astype(np.int32), dg)
+    return out
+
+
+REFERENCE = {
+    'blc_slc': reference_blc_slc,
+    'glc': reference_glc,
+    'dark_glc': reference_dark_glc,
+}
+
+
+# ═══════════════════════════════════════════════════════════════════════
+# INPUTS
+# ═══════════════════════════════════════════════════════════════════════
+
+def generate_calibration(width, height, seed=0):
+    """Calibration maps covering every kernel branch (zeros, thresholds, extremes)"""
+    rng = np.random.default_rng(seed)
+    shape = (height, width)
+
+    def plane(low, high):
+        return rng.integers(low, high, size=shape, dtype=np.int32)
+
+    calib = {
+        'blc_r': plane(0, 32), 'blc_g': plane(0, 32), 'blc_b': plane(0, 32),
+        'slc_diff_r': plane(1, 256), 'slc_diff_g': plane(1, 256), 'slc_diff_b': plane(1, 256),
+        'glc_r': plane(-8, 264), 'glc_g': plane(-8, 264), 'glc_b': plane(-8, 264),
+        'dark_glc_r': plane(-4, 160), 'dark_glc_g': plane(-4, 160), 'dark_glc_b': plane(-4, 160),
+    }
+    # Make sure the special-cased values (0 = passthrough, 64/127 boundaries) appear
+    for key, specials in (('glc', (0, 127, 255)), ('dark_glc', (0, 64, 128))):
+        for ch in 'rgb':
+            flat = calib[f'{key}_{ch}'].reshape(-1)
+            flat[np.arange(len(specials)) * 97] = specials
+    return calib
+
+
+def generate_frame(width, height, seed=1):
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8)
+
+
+def stage_args(stage, calib):
+    if stage == 'blc_slc':
+        return (calib['blc_r'], calib['blc_g'], calib['blc_b'],
+                calib['slc_diff_r'], calib['slc_diff_g'], calib['slc_diff_b'])
+    if stage == 'glc':
+        return (calib['glc_r'], calib['glc_g'], calib['glc_b'])
+    return (calib['dark_glc_r'], calib['dark_glc_g'], calib['dark_glc_b'])
+
+
+# ═══════════════════════════════════════════════════════════════════════
+# BACKENDS
+# ═══════════════════════════════════════════════════════════════════════
+
+def available_backends():
+    """name -> {stage: kernel}; kernels may work in place or return a new frame"""
+    backends = {}
+    try:
+        import corrections_fast
+        backends['cython'] = {
+            'blc_slc': corrections_fast.apply_blc_slc_fast,
+            'glc': corrections_fast.apply_glc_fast,
+            'dark_glc': corrections_fast.apply_dark_glc_fast,
+        }
+    except ImportError:
+        pass
+
+    # The pure Python fallback only implements BLC/SLC; its GLC / Dark GLC
+    # functions are passthrough stubs and are reported as not implemented
+    import corrections_loader
+    backends['python'] = {
+        'blc_slc': corrections_loader.apply_blc_slc_python,
+    }
+    return backends
+
+
+def run_pipeline(kernels, stages, frame, calib):
+    for stage in stages:
+        result = kernels[stage](frame, *stage_args(stage, calib))
+        if result is not None:
+            frame = result
+    return frame
+
+
+def run_reference(stages, frame, calib):
+    for stage in stages:
+        frame = REFERENCE[stage](frame, *stage_args(stage, calib))
+    return frame
+
+
+# ═══════════════════════════════════════════════════════════════════════
+# WORKER (one process per OpenMP thread count)
+# ═══════════════════════════════════════════════════════════════════════
+
+def run_worker(args):
+    threads = int(os.environ.get('OMP_NUM_THREADS', '0') or 0)
+    backends = available_backends()
+    results = []
+
+    for resolution in args.resolutions.split(','):
+        width, height = (int(v) for v in resolution.lower().split('x'))
+        calib = generate_calibration(width, height)
+        source = generate_frame(width, height)
+        work = np.empty_like(source)
+        expected = {}
+
+        for stage_name in args.stages.split(','):
+            stages = STAGE_SETS[stage_name]
+            if args.check:
+                expected[stage_name] = run_reference(stages, source.copy(), calib)
+
+            for backend_name, kernels in backends.items():
+                # Single-threaded backends only need to run once
+                if backend_name != 'cython' and not args.first_worker:
+                    continue
+
+                missing = [stage for stage in stages if stage not in kernels]
+                if missing:
+                    results.append({
+                        'backend': backend_name,
+                        'stage': stage_name,
+                        'resolution': resolution,
+                        'width': width,
+                        'height': height,
+                        'threads': 1,
+                        'implemented': False,
+                        'missing_stages': missing,
+                    })
+                    print(f"  {backend_name:7} {stage_name:9} {resolution:>10} not implemented "
+                          f"({', '.join(missing)})", flush=True)
+                    continue
+
+                conformant = None
+                mismatches = None
+                if args.check:
+                    np.copyto(work, source)
+                    out = run_pipeline(kernels, stages, work, calib)
+                    diff = out != expected[stage_name]
+                    mismatches = int(np.count_nonzero(diff))
+                    conformant = mismatches == 0
+
+                # Scale iterations down for big frames, keep at least 3
+                iterations = max(3, int(args.iterations * min(1.0, (640 * 483) / (width * height) * 4)))
+                for _ in range(args.warmup):
+                    np.copyto(work, source)
+                    run_pipeline(kernels, stages, work, calib)
+
+                timings = []
+                for _ in range(iterations):
+                    np.copyto(work, source)
+                    start = time.perf_counter()
+                    run_pipeline(kernels, stages, work, calib)
+                    timings.append((time.perf_counter() - start) * 1000)
+
+                timings.sort()
+                median = timings[len(timings) // 2]
+                results.append({
+                    'backend': backend_name,
+                    'stage': stage_name,
+                    'resolution': resolution,
+                    'width': width,
+                    'height': height,
+                    'threads': threads if backend_name == 'cython' else 1,
+                    'implemented': True,
+                    'iterations': iterations,
+                    'ms_per_frame': round(median, 3),
+                    'ms_min': round(timings[0], 3),
+                    'mpix_per_s': round(width * height / (median / 1000) / 1e6, 1),
+                    'conformant': conformant,
+                    'mismatched_values': mismatches,
+                })
+
+                status = {True: 'OK', False: f'MISMATCH ({mismatches})', None: '-'}[conformant]
+                print(f"  {backend_name:7} {stage_name:9} {resolution:>10} threads={results[-1]['threads']:<3}"
+                      f" {median:9.2f} ms  {results[-1]['mpix_per_s']:8.1f} MPix/s  {status}",
+                      flush=True)
+
+    with open(args.result_file, 'w', encoding='utf-8') as f:
+        json.dump(results, f)
+
+
+# ═══════════════════════════════════════════════════════════════════════
+# DRIVER
+# ═══════════════════════════════════════════════════════════════════════
+
+def compare(results, baseline_path, tolerance=0.10):
+    """Print per-case change vs. a previous JSON report; returns regression count"""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+
+    def key(r):
+        return (r['backend'], r['stage'], r['resolution'], r['threads'])
+
+    old = {key(r): r for r in baseline['results']}
+    regressions = 0
+    print(f"\nComparison vs {baseline_path} (tolerance {tolerance:.0%}):")
+    for r in results:
+        prev = old.get(key(r))
+        if prev is None or 'ms_per_frame' not in r or 'ms_per_frame' not in prev:
+            continue
+        change = (r['ms_per_frame'] - prev['ms_per_frame']) / prev['ms_per_frame']
+        flag = ''
+        if change > tolerance:
+            flag = '  ← REGRESSION'
+            regressions += 1
+        elif change < -tolerance:
+            flag = '  ← faster'
+        print(f"  {r['backend']:7} {r['stage']:9} {r['resolution']:>10} threads={r['threads']:<3}"
+              f" {prev['ms_per_frame']:9.2f} → {r['ms_per_frame']:9.2f} ms ({change:+.1%}){flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Correction kernel benchmark + conformance suite")
+    parser.add_argument('--resolutions', default=DEFAULT_RESOLUTIONS, help="comma list of WxH")
+    parser.add_argument('--stages', default=DEFAULT_STAGES, help=f"comma list of {', '.join(STAGE_SETS)}")
+    parser.add_argument('--threads', default=None, help="comma list of OpenMP thread counts (default 1,2,4,...,cores)")
+    parser.add_argument('--iterations', type=int, default=30)
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--no-check', dest='check', action='store_false', help="skip reference conformance check")
+    parser.add_argument('--output', default='bench_corrections.json')
+    parser.add_argument('--compare', default=None, help="previous JSON report to compare against")
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--first-worker', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--result-file', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        return 0
+
+    cores = os.cpu_count() or 1
+    if args.threads:
+        thread_counts = [int(t) for t in args.threads.split(',')]
+    else:
+        thread_counts = sorted({t for t in (1, 2, 4, 8, 16, 32) if t <= cores} | {cores})
+
+    print("=" * 70)
+    print("CORRECTION KERNEL BENCHMARK")
+    print("=" * 70)
+    print(f"Backends: {', '.join(available_backends())}")
+    print(f"Resolutions: {args.resolutions}")
+    print(f"Stages: {args.stages}")
+    print(f"OpenMP threads: {thread_counts}")
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for i, threads in enumerate(thread_counts):
+            result_file = os.path.join(tmp, f"threads_{threads}.json")
+            cmd = [sys.executable, os.path.abspath(__file__), '--worker',
+                   '--resolutions', args.resolutions, '--stages', args.stages,
+                   '--iterations', str(args.iterations), '--warmup', str(args.warmup),
+                   '--result-file', result_file]
+            if not args.check:
+                cmd.append('--no-check')
+            if i == 0:
+                cmd.append('--first-worker')
+            env = dict(os.environ, OMP_NUM_THREADS=str(threads))
+            print(f"\n▶ OMP_NUM_THREADS={threads}", flush=True)
+            proc = subprocess.run(cmd, env=env, cwd=os.path.dirname(os.path.abspath(__file__)))
+            if proc.returncode != 0:
+                print(f"❌ Worker failed (threads={threads})")
+                return proc.returncode
+            with open(result_file, 'r', encoding='utf-8') as f:
+                results.extend(json.load(f))
+
+    try:
+        import cv2
+        opencv_version = cv2.__version__
+    except ImportError:
+        opencv_version = None
+
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'platform': platform.platform(),
+            'machine': platform.machine(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'opencv': opencv_version,
+            'cpu_count': cores,
+        },
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n✓ Report written: {args.output}")
+
+    failures = [r for r in results if r.get('conformant') is False]
+    if failures:
+        print(f"⚠️ {len(failures)} case(s) differ from the reference implementation:")
+        for r in failures:
+            print(f"   {r['backend']} {r['stage']} {r['resolution']}: {r['mismatched_values']} values")
+
+    if args.compare:
+        compare(results, args.compare)
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
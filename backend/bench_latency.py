@@ -0,0 +1,211 @@
+"""
+Glass-to-glass latency harness for /video_feed
+
+Runs the real server in-process on a stamped synthetic source (the frame
+counter is drawn into the pixels), consumes /video_feed over HTTP, decodes
+the stamp from every received JPEG and reports capture -> client latency
+(p50/p99) and delivery rate, with each pipeline stage toggled on and off.
+The load governor is off unless a config sets 'governor': True, so every
+config measures the stages it names (a governor-scaled stream would also
+break stamp decoding).
+
+Run:
+    python bench_latency.py
+    python bench_latency.py --resolution 1280x720 --fps 30 --duration 10 --output latency.json
+"""
+import argparse
+import http.client
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+import numpy as np
+
+CONFIGS = {
+    'baseline': {},
+    'corrections': {'corrections': True},
+    'corrections+nlm': {'corrections': True, 'nlm': True},
+    'normalization': {'normalization': True},
+    'flip': {'flip': True},
+    'all': {'corrections': True, 'nlm': True, 'normalization': True, 'flip': True},
+}
+
+
+def synthetic_calibration(width, height, seed=0):
+    """
+    Realistic-looking calibration maps that keep pure black/white intact, so
+    the stamp survives every correction stage while the kernels do full work
+    """
+    rng = np.random.default_rng(seed)
+    shape = (height, width)
+    calib = {'width': width, 'height': height, 'has_glc': True, 'has_dark_glc': True}
+    for ch in 'rgb':
+        blc = rng.integers(0, 8, size=shape, dtype=np.int32)
+        calib[f'blc_{ch}'] = blc
+        calib[f'slc_diff_{ch}'] = (255 - blc).astype(np.int32)
+        calib[f'glc_{ch}'] = rng.integers(1, 255, size=shape, dtype=np.int32)
+        calib[f'dark_glc_{ch}'] = rng.integers(1, 128, size=shape, dtype=np.int32)
+    return calib
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def apply_config(main, options, calibration):
+    """Toggle pipeline stages directly on the running server objects"""
+    from corrections_loader import correction_engine
+    camera = main.camera
+    
+    if options.get('corrections'):
+        correction_engine.set_calibration(calibration)
+        camera.calibration_loaded = True
+        camera.current_profile = 'SYNTHETIC'
+    camera.auto_corrections = bool(options.get('corrections'))
+    camera.enable_nlm = bool(options.get('nlm'))
+    
+    if options.get('normalization'):
+        main.histogram_proc.set_min_max(16, 240)
+    else:
+        main.histogram_proc.set_min_max(0, 255)
+    
+    camera.set_horizontal_flip(bool(options.get('flip')))
+    
+    # Fresh governor state per config: no rungs carried over from the previous one
+    camera.governor.set_enabled(False)
+    camera.governor.set_enabled(bool(options.get('governor')))
+
+
+def consume_stream(port, duration, flipped, stamp_times):
+    """Read /video_feed for `duration` seconds; return per-frame latencies (ms)"""
+    import cv2
+    from frame_sources import decode_stamp
+    
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+    conn.request('GET', '/video_feed')
+    response = conn.getresponse()
+    
+    latencies = []
+    undecodable = 0
+    buffer = b''
+    start = time.time()
+    
+    while time.time() - start < duration:
+        chunk = response.read1(65536)
+        if not chunk:
+            break
+        buffer += chunk
+        
+        while True:
+            header_end = buffer.find(b'\r\n\r\n')
+            if header_end < 0:
+                break
+            part_end = buffer.find(b'\r\n--frame', header_end)
+            if part_end < 0:
+                break
+            jpeg = buffer[header_end + 4:part_end]
+            buffer = buffer[part_end + 2:]
+            received = time.time()
+            
+            frame = cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_COLOR)
+            if frame is None:
+                undecodable += 1
+                continue
+            captured = stamp_times.get(decode_stamp(frame, flipped=flipped))
+            if captured is None:
+                undecodable += 1
+                continue
+            latencies.append((received - captured) * 1000)
+    
+    conn.close()
+    return latencies, undecodable, time.time() - start
+
+
+def run(args):
+    os.environ['CAMERA_SOURCE'] = f"synthetic:{args.resolution}@{args.fps},stamp"
+    os.environ['CAMERA_SOURCE_PACING'] = 'realtime'
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    
+    import uvicorn
+    import main
+    
+    port = args.port or free_port()
+    server = uvicorn.Server(uvicorn.Config(main.app, host='127.0.0.1', port=port, log_level='warning'))
+    server_thread = threading.Thread(target=server.run, name="uvicorn", daemon=True)
+    server_thread.start()
+    
+    deadline = time.time() + 30
+    while not server.started or not main.camera.readiness.is_ready():
+        if time.time() > deadline:
+            print("❌ Server did not start")
+            return 1
+        time.sleep(0.05)
+    
+    source = main.camera.cap
+    width, height = (int(v) for v in args.resolution.lower().split('x'))
+    calibration = synthetic_calibration(width, height)
+    
+    print("=" * 78)
+    print(f"GLASS-TO-GLASS LATENCY  {args.resolution} @ {args.fps} fps, {args.duration:.0f}s per config")
+    print("=" * 78)
+    print(f"{'config':18} {'p50 ms':>8} {'p99 ms':>8} {'mean ms':>8} {'fps out':>8} {'fps src':>8} {'bad':>5}")
+    
+    results = []
+    for name in args.configs.split(','):
+        options = CONFIGS[name]
+        apply_config(main, options, calibration)
+        time.sleep(args.settle)
+        
+        produced_before = source.frame_index
+        latencies, bad, elapsed = consume_stream(port, args.duration, bool(options.get('flip')), source.stamp_times)
+        produced = source.frame_index - produced_before
+        
+        if latencies:
+            p50, p99 = np.percentile(latencies, [50, 99])
+            mean = float(np.mean(latencies))
+        else:
+            p50 = p99 = mean = float('nan')
+        result = {
+            'config': name,
+            'options': options,
+            'frames': len(latencies),
+            'undecodable': bad,
+            'p50_ms': round(float(p50), 2),
+            'p99_ms': round(float(p99), 2),
+            'mean_ms': round(mean, 2),
+            'delivered_fps': round(len(latencies) / elapsed, 2),
+            'source_fps': round(produced / elapsed, 2),
+        }
+        results.append(result)
+        print(f"{name:18} {result['p50_ms']:8.1f} {result['p99_ms']:8.1f} {result['mean_ms']:8.1f}"
+              f" {result['delivered_fps']:8.1f} {result['source_fps']:8.1f} {bad:5d}")
+    
+    server.should_exit = True
+    server_thread.join(timeout=10)
+    
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'resolution': args.resolution, 'fps': args.fps, 'results': results}, f, indent=2)
+        print(f"\n✓ Report written: {args.output}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Glass-to-glass latency harness for /video_feed")
+    parser.add_argument('--resolution', default='640x483')
+    parser.add_argument('--fps', type=float, default=30)
+    parser.add_argument('--duration', type=float, default=5.0, help="seconds measured per config")
+    parser.add_argument('--settle', type=float, default=1.0, help="seconds to wait after toggling stages")
+    parser.add_argument('--configs', default=','.join(CONFIGS), help=f"comma list of {', '.join(CONFIGS)}")
+    parser.add_argument('--port', type=int, default=0)
+    parser.add_argument('--output', default=None)
+    return run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    sys.exit(main())
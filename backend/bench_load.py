@@ -0,0 +1,353 @@
+"""
+Concurrent-viewer load generator for the streaming endpoints
+
+Opens N simultaneous /video_feed streams, each paired with the polling a
+dashboard does when its push socket is down (/histogram at 5 Hz, /status at
+1 Hz), and records per-client FPS, bytes/s, poll latency and server CPU.
+N is stepped upward (1, 2, 4, 8, ...) until per-client FPS collapses.
+
+Only asyncio streams are used on the client side, so one process can drive
+many viewers without threads.
+
+Run:
+    python bench_load.py --spawn                       # own server on a synthetic source
+    python bench_load.py --url http://127.0.0.1:8000 --pid 1234
+    python bench_load.py --spawn --steps 1,2,4,8,16,32,64 --duration 10 --output load.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from urllib.parse import urlparse
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+BOUNDARY = b'--frame\r\n'
+
+
+# ═══════════════════════════════════════════════════════════════════════
+# SERVER CPU
+# ═══════════════════════════════════════════════════════════════════════
+
+class CpuSampler:
+    """Process CPU time of the server (psutil if present, else /proc/<pid>/stat)"""
+
+    def __init__(self, pid):
+        self.pid = pid
+        self.process = psutil.Process(pid) if (psutil and pid) else None
+        self.clock_ticks = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+
+    def cpu_seconds(self):
+        if not self.pid:
+            return None
+        try:
+            if self.process is not None:
+                times = self.process.cpu_times()
+                return times.user + times.system
+            with open(f"/proc/{self.pid}/stat", 'r') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+            # utime, stime are fields 14 and 15 (1-based, comm stripped -> index 11, 12)
+            return (int(fields[11]) + int(fields[12])) / self.clock_ticks
+        except Exception:
+            return None
+
+
+# ═══════════════════════════════════════════════════════════════════════
+# CLIENTS
+# ═══════════════════════════════════════════════════════════════════════
+
+async def open_get(host, port, path, keep_alive=False):
+    """Send a GET and return (reader, writer, status, headers)"""
+    reader, writer = await asyncio.open_connection(host, port)
+    connection = 'keep-alive' if keep_alive else 'close'
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: {connection}\r\n\r\n".encode())
+    await writer.drain()
+
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    status = int(lines[0].split()[1])
+    headers = {}
+    for line in lines[1:]:
+        if ':' in line:
+            key, value = line.split(':', 1)
+            headers[key.strip().lower()] = value.strip()
+    return reader, writer, status, headers
+
+
+async def stream_client(host, port, stats, stop_event):
+    """Consume /video_feed, counting multipart frames and bytes"""
+    try:
+        reader, writer, status, _ = await open_get(host, port, '/video_feed')
+    except (OSError, asyncio.IncompleteReadError) as e:
+        stats['errors'] += 1
+        stats['error'] = str(e)
+        return
+    if status != 200:
+        stats['errors'] += 1
+        writer.close()
+        return
+
+    tail = b''
+    try:
+        while not stop_event.is_set():
+            try:
+                chunk = await asyncio.wait_for(reader.read(65536), timeout=1.0)
+            except asyncio.TimeoutError:
+                continue
+            if not chunk:
+                break
+            stats['bytes'] += len(chunk)
+            # Boundaries can straddle reads, so keep the last few bytes around
+            data = tail + chunk
+            stats['frames'] += data.count(BOUNDARY)
+            tail = data[-(len(BOUNDARY) - 1):]
+    except OSError:
+        stats['errors'] += 1
+    finally:
+        writer.close()
+
+
+async def poll_client(host, port, path, rate_hz, stats, stop_event):
+    """GET `path` at `rate_hz`, recording response latency"""
+    interval = 1.0 / rate_hz
+    next_time = time.perf_counter()
+
+    while not stop_event.is_set():
+        start = time.perf_counter()
+        try:
+            reader, writer, status, headers = await open_get(host, port, path)
+            length = headers.get('content-length')
+            body = await (reader.readexactly(int(length)) if length else reader.read())
+            writer.close()
+            if status == 200:
+                stats['latencies'].append((time.perf_counter() - start) * 1000)
+                stats['bytes'] += len(body)
+            else:
+                stats['errors'] += 1
+        except (OSError, asyncio.IncompleteReadError):
+            stats['errors'] += 1
+
+        next_time += interval
+        delay = next_time - time.perf_counter()
+        if delay > 0:
+            try:
+                await asyncio.wait_for(stop_event.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+        else:
+            next_time = time.perf_counter()
+
+
+# ═══════════════════════════════════════════════════════════════════════
+# LOAD STEPS
+# ═══════════════════════════════════════════════════════════════════════
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return round(ordered[index], 2)
+
+
+def fmt(value, width):
+    return f"{value:{width}.1f}" if value is not None else f"{'-':>{width}}"
+
+
+async def run_step(host, port, viewers, args, cpu):
+    """Run `viewers` dashboards for args.duration seconds and summarize"""
+    stop_event = asyncio.Event()
+    streams = [{'frames': 0, 'bytes': 0, 'errors': 0} for _ in range(viewers)]
+    histogram = {'latencies': [], 'bytes': 0, 'errors': 0}
+    status = {'latencies': [], 'bytes': 0, 'errors': 0}
+
+    tasks = [asyncio.create_task(stream_client(host, port, s, stop_event)) for s in streams]
+    for _ in range(viewers):
+        if args.histogram_hz > 0:
+            tasks.append(asyncio.create_task(poll_client(host, port, '/histogram', args.histogram_hz, histogram, stop_event)))
+        if args.status_hz > 0:
+            tasks.append(asyncio.create_task(poll_client(host, port, '/status', args.status_hz, status, stop_event)))
+
+    # Let streams connect before measuring
+    await asyncio.sleep(args.warmup)
+    frames_start = [s['frames'] for s in streams]
+    bytes_start = [s['bytes'] for s in streams]
+    histogram['latencies'].clear()
+    status['latencies'].clear()
+    cpu_start = cpu.cpu_seconds()
+    wall_start = time.perf_counter()
+
+    await asyncio.sleep(args.duration)
+
+    elapsed = time.perf_counter() - wall_start
+    cpu_end = cpu.cpu_seconds()
+    fps = [(s['frames'] - f0) / elapsed for s, f0 in zip(streams, frames_start)]
+    bandwidth = [(s['bytes'] - b0) / elapsed for s, b0 in zip(streams, bytes_start)]
+
+    stop_event.set()
+    await asyncio.wait(tasks, timeout=5)
+    for task in tasks:
+        task.cancel()
+
+    cpu_percent = None
+    if cpu_start is not None and cpu_end is not None:
+        cpu_percent = round((cpu_end - cpu_start) / elapsed * 100, 1)
+
+    return {
+        'viewers': viewers,
+        'fps_mean': round(statistics.mean(fps), 2),
+        'fps_min': round(min(fps), 2),
+        'fps_per_client': [round(v, 2) for v in fps],
+        'kbytes_per_sec_mean': round(statistics.mean(bandwidth) / 1024, 1),
+        'kbytes_per_sec_total': round(sum(bandwidth) / 1024, 1),
+        'stream_errors': sum(s['errors'] for s in streams),
+        'histogram_p50_ms': percentile(histogram['latencies'], 50),
+        'histogram_p99_ms': percentile(histogram['latencies'], 99),
+        'histogram_errors': histogram['errors'],
+        'status_p50_ms': percentile(status['latencies'], 50),
+        'status_p99_ms': percentile(status['latencies'], 99),
+        'status_errors': status['errors'],
+        'server_cpu_percent': cpu_percent,
+    }
+
+
+async def run_load(host, port, args, cpu):
+    print("=" * 96)
+    print(f"LOAD TEST  {host}:{port}  {args.duration:.0f}s per step, "
+          f"histogram {args.histogram_hz:g} Hz, status {args.status_hz:g} Hz per viewer")
+    print("=" * 96)
+    print(f"{'viewers':>7} {'fps mean':>9} {'fps min':>8} {'KB/s/cli':>9} {'KB/s tot':>9} "
+          f"{'hist p99':>9} {'stat p99':>9} {'cpu %':>7} {'errors':>7}")
+
+    results = []
+    baseline_fps = None
+    for viewers in args.steps:
+        result = await run_step(host, port, viewers, args, cpu)
+        results.append(result)
+        errors = result['stream_errors'] + result['histogram_errors'] + result['status_errors']
+
+        print(f"{viewers:7d} {result['fps_mean']:9.1f} {result['fps_min']:8.1f} "
+              f"{result['kbytes_per_sec_mean']:9.0f} {result['kbytes_per_sec_total']:9.0f} "
+              f"{fmt(result['histogram_p99_ms'], 9)} {fmt(result['status_p99_ms'], 9)} "
+              f"{fmt(result['server_cpu_percent'], 7)} {errors:7d}")
+
+        if baseline_fps is None:
+            baseline_fps = result['fps_mean']
+            continue
+        if baseline_fps and result['fps_mean'] < baseline_fps * args.collapse_ratio:
+            result['saturated'] = True
+            print(f"\n⚠️ Saturated at {viewers} viewers: mean FPS {result['fps_mean']:.1f} "
+                  f"< {args.collapse_ratio:.0%} of single-viewer {baseline_fps:.1f}")
+            break
+    else:
+        print(f"\n✓ No collapse up to {args.steps[-1]} viewers")
+
+    return results
+
+
+# ═══════════════════════════════════════════════════════════════════════
+# SERVER
+# ═══════════════════════════════════════════════════════════════════════
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def spawn_server(port, source):
+    """Start the app in a child process backed by a synthetic frame source"""
+    env = dict(os.environ, CAMERA_SOURCE=source, CAMERA_SOURCE_PACING='realtime')
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'main:app', '--host', '127.0.0.1',
+         '--port', str(port), '--log-level', 'warning'],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env,
+        stdout=subprocess.DEVNULL,
+    )
+    return process
+
+
+def wait_for_server(host, port, timeout=30.0):
+    """Poll /ready until start-up has finished"""
+    import http.client
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection(host, port, timeout=2)
+            conn.request('GET', '/ready')
+            status = conn.getresponse().status
+            conn.close()
+            if status == 200:
+                return True
+        except OSError:
+            pass
+        time.sleep(0.2)
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent-viewer load generator for /video_feed")
+    parser.add_argument('--url', default=None, help="server to test (default: spawn one with --spawn)")
+    parser.add_argument('--spawn', action='store_true', help="start a local server on a synthetic source")
+    parser.add_argument('--source', default='synthetic:640x483@30,stamp',
+                        help="CAMERA_SOURCE for --spawn (the stamp changes every frame, so no frame is suppressed as static)")
+    parser.add_argument('--pid', type=int, default=None, help="server pid for CPU sampling (implied by --spawn)")
+    parser.add_argument('--steps', default='1,2,4,8,16,32', help="viewer counts to step through")
+    parser.add_argument('--duration', type=float, default=5.0, help="seconds measured per step")
+    parser.add_argument('--warmup', type=float, default=1.0, help="seconds before measuring each step")
+    parser.add_argument('--histogram-hz', type=float, default=5.0)
+    parser.add_argument('--status-hz', type=float, default=1.0)
+    parser.add_argument('--collapse-ratio', type=float, default=0.8,
+                        help="stop when mean FPS falls below this fraction of single-viewer FPS")
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+    args.steps = [int(n) for n in args.steps.split(',')]
+
+    if not args.url and not args.spawn:
+        parser.error("pass --url or --spawn")
+
+    process = None
+    if args.spawn:
+        host, port = '127.0.0.1', free_port()
+        process = spawn_server(port, args.source)
+        args.pid = process.pid
+        print(f"🚀 Spawned server pid {process.pid} on port {port} ({args.source})")
+    else:
+        parsed = urlparse(args.url)
+        host, port = parsed.hostname, parsed.port or 80
+
+    try:
+        if not wait_for_server(host, port):
+            print("❌ Server not ready")
+            return 1
+        if args.pid is None:
+            print("⚠️ No --pid given, server CPU will not be reported")
+        results = asyncio.run(run_load(host, port, args, CpuSampler(args.pid)))
+    finally:
+        if process is not None:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'host': host, 'port': port, 'source': args.source if args.spawn else None,
+                       'histogram_hz': args.histogram_hz, 'status_hz': args.status_hz,
+                       'results': results}, f, indent=2)
+        print(f"✓ Report written: {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,304 @@
+"""
+Calibration generator - build .genrgb profiles from the live camera
+Replaces the external frmGenRGB capture step. For each brightness level the
+camera is set, allowed to settle, and a series of raw frames is reduced to a
+per-pixel running mean/variance (Welford, updated in place - frames are
+never kept). Capture modes are run as separate sweeps because each needs
+its own target in front of the lens:
+
+  dark       - lens capped                    -> BLC
+  flat       - uniform white target            -> SLC
+  gray       - uniform mid-gray target         -> GLC (measured after BLC/SLC)
+  dark_gray  - uniform dark-gray target        -> Dark GLC (after BLC/SLC + GLC)
+
+Per-level results are kept in CALIBRATION_WORK_PATH, and VGxx.genrgb is
+(re)written as soon as a level has both dark and flat captures, picking up
+gray/dark_gray when available. An existing profile is kept as .bak.
+"""
+import os
+import struct
+import threading
+import time
+from pathlib import Path
+from queue import Queue, Full, Empty
+import numpy as np
+from config import *
+from corrections_loader import CorrectionEngine
+from app_logging import get_logger
+
+log = get_logger('calibration')
+
+MODES = ('dark', 'flat', 'gray', 'dark_gray')
+
+# .NET DateTime ticks (100 ns since 0001-01-01), as stored by frmGenRGB
+_TICKS_AT_UNIX_EPOCH = 621355968000000000
+
+
+class RunningStats:
+    """Per-pixel running mean/variance (Welford) with preallocated buffers"""
+
+    def __init__(self, shape):
+        self.count = 0
+        self.mean = np.zeros(shape, dtype=np.float64)
+        self.m2 = np.zeros(shape, dtype=np.float64)
+        self._x = np.empty(shape, dtype=np.float64)
+        self._delta = np.empty(shape, dtype=np.float64)
+
+    def add(self, frame):
+        self.count += 1
+        np.copyto(self._x, frame, casting='unsafe')
+        np.subtract(self._x, self.mean, out=self._delta)       # x - old mean
+        self.mean += np.multiply(self._delta, 1.0 / self.count, out=self._x)
+        np.copyto(self._x, frame, casting='unsafe')
+        self._x -= self.mean                                    # x - new mean
+        self._x *= self._delta
+        self.m2 += self._x
+
+    def variance(self):
+        if self.count < 2:
+            return np.zeros_like(self.m2)
+        return self.m2 / (self.count - 1)
+
+
+def to_plane(mean_bgr):
+    """Rounded int32 plane in file order (R, G, B) from a BGR mean"""
+    return np.ascontiguousarray(np.rint(mean_bgr[:, :, ::-1])).astype(np.int32)
+
+
+def build_calibration(blc, slc, glc=None, dark_glc=None):
+    """Calibration dict (as CorrectionEngine.load_calibration builds it) from RGB planes"""
+    h, w = blc.shape[:2]
+    calib = {'width': w, 'height': h, 'has_glc': glc is not None, 'has_dark_glc': dark_glc is not None}
+    for i, ch in enumerate('rgb'):
+        calib[f'blc_{ch}'] = blc[:, :, i].copy()
+        calib[f'slc_diff_{ch}'] = np.maximum(1, slc[:, :, i] - blc[:, :, i]).astype(np.int32)
+        calib[f'glc_{ch}'] = np.clip(glc[:, :, i], 0, 255).astype(np.int32) if glc is not None else None
+        calib[f'dark_glc_{ch}'] = dark_glc[:, :, i].copy() if dark_glc is not None else None
+    return calib
+
+
+def write_genrgb(path, blc, slc, glc=None, dark_glc=None):
+    """
+    Write a .genrgb file (layout read by CorrectionEngine.load_calibration):
+    uint32 w, h; bool blc, slc; int64 date; BLC and SLC planes; bool + GLC
+    plane; bool + Dark GLC plane. Planes are int32 (h, w, 3) in R, G, B order.
+    """
+    h, w = blc.shape[:2]
+    date = _TICKS_AT_UNIX_EPOCH + int(time.time() * 10_000_000)
+    path = Path(path)
+    tmp = path.with_suffix('.tmp')
+
+    with open(tmp, 'wb') as f:
+        f.write(struct.pack('<II??q', w, h, True, True, date))
+        f.write(blc.astype('<i4').tobytes())
+        f.write(slc.astype('<i4').tobytes())
+        f.write(struct.pack('?', glc is not None))
+        if glc is not None:
+            f.write(glc.astype('<i4').tobytes())
+        f.write(struct.pack('?', dark_glc is not None))
+        if dark_glc is not None:
+            f.write(dark_glc.astype('<i4').tobytes())
+
+    if path.exists():
+        os.replace(path, path.with_suffix('.genrgb.bak'))
+    os.replace(tmp, path)
+
+
+class CalibrationGenerator:
+    def __init__(self, camera, genfiles_path=GENFILES_PATH, work_path=CALIBRATION_WORK_PATH):
+        self.camera = camera
+        self.genfiles_path = Path(genfiles_path)
+        self.work_path = Path(work_path)
+        self.queue = Queue(maxsize=2)
+        self.thread = None
+        self.lock = threading.Lock()
+
+        self.accepting = False     # processing thread submits raw frames while True
+        self.cancelled = False
+
+        # Current sweep
+        self.mode = None
+        self.levels = []
+        self.level = None
+        self.frames_wanted = 0
+        self.frames_collected = 0
+        self.started = None
+        self.finished = None
+        self.results = []
+        self.errors = []
+        self.written = []
+
+    @property
+    def active(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def submit(self, frame):
+        """Offer a raw BGR frame (processing thread) - never blocks"""
+        if not self.accepting:
+            return
+        try:
+            self.queue.put_nowait(frame)
+        except Full:
+            pass
+
+    def start(self, mode, start=BRIGHTNESS_MIN, end=BRIGHTNESS_MAX, frames=CALIBRATION_FRAMES):
+        """Start an unattended sweep of `mode` over brightness start..end; False if one is running"""
+        if mode not in MODES:
+            raise ValueError(f"Unknown calibration mode: {mode} (use {', '.join(MODES)})")
+        start = max(BRIGHTNESS_MIN, start)
+        end = min(BRIGHTNESS_MAX, end)
+        if start > end or frames < 2:
+            raise ValueError("Empty brightness range or fewer than 2 frames")
+
+        with self.lock:
+            if self.active:
+                return False
+            self.work_path.mkdir(parents=True, exist_ok=True)
+            self.mode = mode
+            self.levels = list(range(start, end + 1))
+            self.level = None
+            self.frames_wanted = frames
+            self.frames_collected = 0
+            self.started = time.time()
+            self.finished = None
+            self.results = []
+            self.errors = []
+            self.written = []
+            self.cancelled = False
+            self.thread = threading.Thread(target=self._sweep, name="calibration", daemon=True)
+            self.thread.start()
+
+        log.info("%s sweep started: VG%02d-VG%02d, %d frames per level", mode, start, end, frames)
+        return True
+
+    def cancel(self):
+        self.cancelled = True
+        thread = self.thread
+        if thread is not None:
+            thread.join(timeout=CALIBRATION_FRAME_TIMEOUT + 1.0)
+        return not self.active
+
+    # ------------------------------------------------------------------
+    # Sweep thread
+    # ------------------------------------------------------------------
+
+    def _work_file(self, level, mode):
+        return self.work_path / f"VG{level:02d}_{mode}.npy"
+
+    def _load_work(self, level, mode):
+        path = self._work_file(level, mode)
+        return np.load(path) if path.exists() else None
+
+    def _reference(self, level):
+        """Engine that applies the stages measured before this mode, or None if missing"""
+        if self.mode in ('dark', 'flat'):
+            return None
+        blc, slc = self._load_work(level, 'dark'), self._load_work(level, 'flat')
+        glc = self._load_work(level, 'gray') if self.mode == 'dark_gray' else None
+        if blc is None or slc is None or (self.mode == 'dark_gray' and glc is None):
+            needed = "dark + flat + gray" if self.mode == 'dark_gray' else "dark + flat"
+            raise RuntimeError(f"{self.mode} needs {needed} captures first")
+        engine = CorrectionEngine()
+        engine.set_calibration(build_calibration(blc, slc, glc))
+        return engine
+
+    def _sweep(self):
+        original_brightness = self.camera.brightness
+        try:
+            for level in self.levels:
+                if self.cancelled or not self.camera.running:
+                    break
+                self.level = level
+                try:
+                    self._capture_level(level)
+                except Exception as e:
+                    self.errors.append({'level': level, 'error': str(e)})
+                    log.warning("VG%02d: %s", level, e)
+        finally:
+            self.accepting = False
+            self.level = None
+            self.finished = time.time()
+            self.camera.set_brightness(original_brightness)
+
+        state = "cancelled" if self.cancelled else "finished"
+        log.info("%s sweep %s in %.0fs: %d levels, %d profiles written, %d errors", self.mode, state,
+                 self.finished - self.started, len(self.results), len(self.written), len(self.errors))
+
+    def _capture_level(self, level):
+        reference = self._reference(level)
+
+        self.accepting = False
+        self.camera.set_brightness(level)
+        time.sleep(CALIBRATION_SETTLE_SEC)
+        while True:
+            try:
+                self.queue.get_nowait()
+            except Empty:
+                break
+
+        stats = None
+        self.frames_collected = 0
+        self.accepting = True
+        deadline = time.time() + CALIBRATION_FRAME_TIMEOUT
+        while self.frames_collected < self.frames_wanted:
+            if self.cancelled:
+                return
+            try:
+                frame = self.queue.get(timeout=0.5)
+            except Empty:
+                if time.time() > deadline:
+                    raise RuntimeError(f"no frames for {CALIBRATION_FRAME_TIMEOUT:.0f}s")
+                continue
+            deadline = time.time() + CALIBRATION_FRAME_TIMEOUT
+
+            if reference is not None:
+                frame = reference.apply_corrections(frame.copy(), enable_glc=self.mode == 'dark_gray',
+                                                    enable_dark_glc=False, enable_nlm=False)
+            if stats is None:
+                stats = RunningStats(frame.shape)
+            stats.add(frame)
+            self.frames_collected = stats.count
+        self.accepting = False
+
+        plane = to_plane(stats.mean)
+        np.save(self._work_file(level, self.mode), plane)
+
+        result = {
+            'level': level,
+            'frames': stats.count,
+            'mean': round(float(stats.mean.mean()), 2),
+            'noise': round(float(np.sqrt(stats.variance().mean())), 3),
+            'saturated': round(float(np.mean(stats.mean >= 254.5)), 4),
+        }
+        self.results.append(result)
+        log.info("VG%02d %s: mean %s, noise %s", level, self.mode, result['mean'], result['noise'])
+
+        self._write_profile(level)
+
+    def _write_profile(self, level):
+        blc, slc = self._load_work(level, 'dark'), self._load_work(level, 'flat')
+        if blc is None or slc is None:
+            return
+        glc = self._load_work(level, 'gray')
+        dark_glc = self._load_work(level, 'dark_gray') if glc is not None else None
+
+        path = self.genfiles_path / f"VG{level:02d}.genrgb"
+        write_genrgb(path, blc, slc, glc, dark_glc)
+        self.written.append(path.name)
+        self.camera.calibration_library.refresh()
+
+    def get_status(self):
+        done = len(self.results) + len(self.errors)
+        return {
+            'active': self.active,
+            'mode': self.mode,
+            'level': self.level,
+            'levels': [self.levels[0], self.levels[-1]] if self.levels else None,
+            'progress': f"{done}/{len(self.levels)}",
+            'frames': f"{self.frames_collected}/{self.frames_wanted}",
+            'elapsed_s': round((self.finished or time.time()) - self.started, 1) if self.started else 0.0,
+            'cancelled': self.cancelled,
+            'results': self.results,
+            'errors': self.errors,
+            'written': self.written,
+        }
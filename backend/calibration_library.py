@@ -0,0 +1,187 @@
+"""
+Calibration library - genfile lookup, caching and interpolated profiles
+Only a sparse set of VGxx.genrgb files needs to ship: for a brightness level
+without its own file, a profile is blended per pixel between the nearest
+lower and higher genfiles. Blends run on one background worker, so the
+caller keeps its current profile until the new one is ready. Loaded files
+and blends share one LRU cache; file entries are keyed by modification
+time, so regenerated genfiles are picked up automatically.
+"""
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from config import *
+from corrections_loader import CorrectionEngine, interpolate_calibration
+from app_logging import get_logger
+
+log = get_logger('calibration')
+
+
+class CalibrationLibrary:
+    def __init__(self, genfiles_path=GENFILES_PATH, cache_size=CALIBRATION_CACHE_SIZE):
+        self.genfiles_path = Path(genfiles_path)
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="calibration-blend")
+
+        # Genfile levels, rescanned only when the directory changes
+        self.levels = []
+        self.levels_mtime = None
+        self.refresh()
+
+        # Stats
+        self.hits = 0
+        self.misses = 0
+        self.blends = 0
+        self.last_blend_ms = 0.0
+
+    # ------------------------------------------------------------------
+    # Files
+    # ------------------------------------------------------------------
+
+    def path_for(self, level):
+        return self.genfiles_path / f"VG{level:02d}.genrgb"
+
+    def refresh(self):
+        """Rescan the genfiles directory (called after a genfile is written)"""
+        try:
+            mtime = self.genfiles_path.stat().st_mtime_ns
+        except OSError:
+            mtime = None
+        levels = []
+        if mtime is not None:
+            for path in self.genfiles_path.glob("VG*.genrgb"):
+                digits = path.stem[2:]
+                if digits.isdigit():
+                    levels.append(int(digits))
+        self.levels = sorted(levels)
+        self.levels_mtime = mtime
+        return self.levels
+
+    def available(self):
+        """Brightness levels that have their own genfile (one stat, rescan only on change)"""
+        try:
+            mtime = self.genfiles_path.stat().st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime != self.levels_mtime:
+            return self.refresh()
+        return self.levels
+
+    def neighbours(self, level):
+        """(lower, higher) genfile levels around `level`; either may be None"""
+        levels = self.available()
+        lower = max((l for l in levels if l < level), default=None)
+        higher = min((l for l in levels if l > level), default=None)
+        return lower, higher
+
+    # ------------------------------------------------------------------
+    # Cache
+    # ------------------------------------------------------------------
+
+    def _cached(self, key):
+        with self.lock:
+            calibration = self.cache.get(key)
+            if calibration is not None:
+                self.cache.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+            return calibration
+
+    def _store(self, key, calibration):
+        with self.lock:
+            self.cache[key] = calibration
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+    def _file_key(self, level):
+        return ('file', level, self.path_for(level).stat().st_mtime_ns)
+
+    def load(self, level):
+        """Calibration from VGxx.genrgb (cached)"""
+        key = self._file_key(level)
+        calibration = self._cached(key)
+        if calibration is None:
+            calibration = CorrectionEngine.read_calibration(str(self.path_for(level)))
+            self._store(key, calibration)
+        return calibration
+
+    def _blend_key(self, level, lower, higher):
+        return ('blend', level, self._file_key(lower), self._file_key(higher))
+
+    # ------------------------------------------------------------------
+    # Lookup
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def blend_name(level, lower, higher):
+        return f"VG{level:02d} (VG{lower:02d}~VG{higher:02d})"
+
+    def get(self, level):
+        """
+        (name, calibration) available right now: the level's own genfile, or a
+        blend that is already cached. None if a blend has to be computed first.
+        """
+        if self.path_for(level).exists():
+            return f"VG{level:02d}", self.load(level)
+
+        lower, higher = self.neighbours(level)
+        if lower is None or higher is None:
+            return None
+        calibration = self._cached(self._blend_key(level, lower, higher))
+        if calibration is None:
+            return None
+        return self.blend_name(level, lower, higher), calibration
+
+    def can_interpolate(self, level):
+        lower, higher = self.neighbours(level)
+        return lower is not None and higher is not None
+
+    def request(self, level, on_ready):
+        """
+        Blend a profile for `level` in the background; on_ready(level, name,
+        calibration) is called from the worker. Returns the future.
+        """
+        return self.executor.submit(self._blend, level, on_ready)
+
+    def _blend(self, level, on_ready):
+        try:
+            lower, higher = self.neighbours(level)
+            if lower is None or higher is None:
+                return None
+            key = self._blend_key(level, lower, higher)
+            calibration = self._cached(key)
+            if calibration is None:
+                low, high = self.load(lower), self.load(higher)
+                if (low['width'], low['height']) != (high['width'], high['height']):
+                    raise ValueError(f"VG{lower:02d} and VG{higher:02d} have different sizes")
+                start = time.perf_counter()
+                calibration = interpolate_calibration(low, high, (level - lower) / (higher - lower))
+                self.last_blend_ms = (time.perf_counter() - start) * 1000
+                self.blends += 1
+                self._store(key, calibration)
+                log.info("Calibration interpolated: VG%02d from VG%02d/VG%02d", level, lower, higher,
+                         extra={'stage': 'calibration', 'latency_ms': round(self.last_blend_ms, 1)})
+            name = self.blend_name(level, lower, higher)
+            on_ready(level, name, calibration)
+            return name
+        except Exception as e:
+            log.error("Calibration interpolation failed for VG%02d: %s", level, e)
+            return None
+
+    def get_stats(self):
+        with self.lock:
+            cached = [f"{key[0]}:VG{key[1]:02d}" for key in self.cache]
+        return {
+            'genfiles': list(self.levels),   # cached: status must not touch the disk
+            'cached': cached,
+            'hits': self.hits,
+            'misses': self.misses,
+            'blends': self.blends,
+            'last_blend_ms': round(self.last_blend_ms, 1),
+        }
@@ -8,21 +8,148 @@ import ctypes
 from queue import Queue, Full, Empty
 from config import *
 import platform
-from corrections_loader import correction_engine, is_fast_mode
-from histogram_processor import HistogramProcessor
+from corrections_loader import correction_engine, is_fast_mode, warm_up_kernels
+from histogram_processor import HistogramProcessor, histogram_rgb
+from frame_sources import open_source
+from static_scene import StaticSceneDetector
+from recorder import Recorder
+from readiness import Readiness
+from thread_budget import pin_current_thread, get_allocation
+from load_governor import LoadGovernor
+from calibration_generator import CalibrationGenerator
+from calibration_library import CalibrationLibrary
+from frame_stacker import FrameStacker
+from auto_exposure import AutoExposure
+from app_logging import get_logger
+
+log = get_logger('camera')
+pipeline_log = get_logger('pipeline')
+
+STARTUP_PHASES = ('warmup', 'device', 'calibration', 'pipeline', 'first_frame', 'ptz')
 
 # Create global histogram processor instance
 histogram_proc = HistogramProcessor()
 
+
+def is_encoded_frame(frame):
+    """True for raw MJPEG buffers (CAP_PROP_CONVERT_RGB off), False for decoded BGR"""
+    return frame.ndim == 1 or (frame.ndim == 2 and frame.shape[0] == 1)
+
+
+class FramePacket:
+    """
+    Pipeline output frame. Holds decoded pixels and/or JPEG bytes and converts
+    lazily, so passthrough frames are only decoded when a consumer needs pixels
+    """
+    __slots__ = ('_frame', '_native', '_jpegs', '_encode_ms', '_histogram', 'seq', 'timestamp', 'passthrough',
+                 '_lock')
+    
+    def __init__(self, frame=None, jpeg=None, seq=0, timestamp=None):
+        self._frame = frame
+        self._native = jpeg         # camera-native JPEG (passthrough)
+        self._jpegs = {}            # (quality, scale) -> encoded JPEG
+        self._encode_ms = {}        # (quality, scale) -> encode time
+        self._histogram = None
+        self.seq = seq              # capture sequence number
+        self.timestamp = timestamp if timestamp is not None else time.time()  # capture time
+        self.passthrough = jpeg is not None and frame is None
+        self._lock = threading.Lock()
+    
+    @property
+    def frame(self):
+        """Decoded BGR pixels (decodes passthrough JPEG on first access)"""
+        with self._lock:
+            if self._frame is None and self._native is not None:
+                self._frame = cv2.imdecode(np.frombuffer(self._native, dtype=np.uint8), cv2.IMREAD_COLOR)
+            return self._frame
+    
+    def get_jpeg(self, quality=JPEG_QUALITY, scale=1.0, on_encode=None):
+        """
+        JPEG bytes; native camera JPEG is forwarded as-is, otherwise encoded
+        once per (quality, scale) and cached, so viewers and the recorder each
+        keep their own encode. scale < 1 shrinks the frame before encoding.
+        on_encode(ms) is called only when this call did the encode
+        """
+        key = (quality, scale)
+        with self._lock:
+            if self._native is not None:
+                return self._native
+            jpeg = self._jpegs.get(key)
+            if jpeg is not None:
+                return jpeg
+        frame = self.frame
+        if frame is None:
+            return None
+        start = time.perf_counter()
+        if scale < 1.0:
+            frame = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        ret, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        if not ret:
+            return None
+        encode_ms = (time.perf_counter() - start) * 1000
+        with self._lock:
+            jpeg = self._jpegs.setdefault(key, buffer.tobytes())
+            self._encode_ms.setdefault(key, encode_ms)
+        if on_encode is not None:
+            on_encode(encode_ms)
+        return jpeg
+    
+    def encoded(self, quality=JPEG_QUALITY, scale=1.0):
+        """(size, encode ms) of the JPEG at (quality, scale); (0, 0.0) if never encoded"""
+        with self._lock:
+            if self._native is not None:
+                return len(self._native), 0.0
+            jpeg = self._jpegs.get((quality, scale))
+            return (len(jpeg), self._encode_ms[(quality, scale)]) if jpeg is not None else (0, 0.0)
+    
+    def get_histogram(self, on_compute=None):
+        """
+        (3, 256) R/G/B histogram, computed once per packet and shared by all
+        consumers. on_compute(ms) is called only when this call computed it
+        """
+        histogram = self._histogram
+        if histogram is None:
+            frame = self.frame
+            if frame is None:
+                return None
+            start = time.perf_counter()
+            histogram = self._histogram = histogram_rgb(frame)
+            if on_compute is not None:
+                on_compute((time.perf_counter() - start) * 1000)
+        return histogram
+
+
 class CameraHandler:
-    def __init__(self):
+    def __init__(self, source_spec=CAMERA_SOURCE):
         self.cap = None
+        self.source_spec = source_spec
         self.running = False
         
         # OPTIMIZED: Multi-stage queues for parallel processing
         self.raw_queue = Queue(maxsize=1)
         self.corrected_queue = Queue(maxsize=1)  # NEW: After corrections, before hist norm
-        self.output_queue = Queue(maxsize=1)
+        
+        # Output is broadcast, not queued: every viewer sees every sent packet.
+        # latest_packet is always current (for pixel consumers); sent_seq only
+        # advances for packets that pass static-scene suppression.
+        self.output_cond = threading.Condition()
+        self.latest_packet = None
+        self.sent_packet = None
+        self.sent_seq = 0
+        self.viewers = 0
+        self.scene_detector = StaticSceneDetector()
+        
+        # Archive subscriber (own queue + writer thread, drops instead of blocking)
+        self.recorder = Recorder()
+        
+        # Low-light stacking of corrected frames (reduced output rate)
+        self.stacker = FrameStacker()
+        
+        # Closed-loop brightness from the output histogram (off until enabled)
+        self.auto_exposure = AutoExposure(self)
+        
+        # Calibration capture (raw frames tapped from the processing thread)
+        self.calibration_generator = CalibrationGenerator(self)
         
         self.brightness = BRIGHTNESS_DEFAULT
         self.zoom = 5
@@ -32,43 +159,75 @@ class CameraHandler:
         self.auto_corrections = False
         self.calibration_loaded = False
         self.current_profile = None
+        self.calibration_library = CalibrationLibrary()
+        self.calibration_target = None
+        self.calibration_pending = None   # future of a background blend
         
         self.enable_blc_slc = True
         self.enable_glc = True
         self.enable_dark_glc = True
         self.enable_nlm = False
+        self.enable_defects = DEFECT_CORRECTION
+        
+        # Software ROI (digital zoom/pan): crop is corrected, then resized
+        self.software_roi = SOFTWARE_ROI
+        self.digital_zoom = 1.0
+        self.digital_pan = 0.0   # -10 (left edge) .. 10 (right edge)
+        
+        # Applied once per frame in the post-processing stage (not per viewer)
+        self.horizontal_flip = False
+        
+        # Demand-driven capture: processing sets this when it wants a new frame
+        self.processing_ready = threading.Event()
+        self.retrieved_frames = 0
+        self.skipped_decodes = 0
+        
+        # MJPEG passthrough state
+        self.mjpeg_native = False
+        self.passthrough_frames = 0
+        self.decoded_frames = 0
         
         # Histogram processor reference
         self.histogram_proc = histogram_proc
         
+        # Watches stage timings / frame age and degrades to hold the target FPS
+        self.governor = LoadGovernor()
+        correction_engine.timing_hook = self.governor.record
+        
+        # Background start-up progress (served by /ready)
+        self.readiness = Readiness(STARTUP_PHASES)
+        
     def start(self):
+        """
+        Bring the camera up. Kernel warm-up runs in parallel with opening the
+        device; the pipeline threads only start once both are finished.
+        Progress is reported per phase in self.readiness.
+        """
+        warmup = threading.Thread(target=self._warm_up, args=(VIDEO_WIDTH, VIDEO_HEIGHT), name="warmup", daemon=True)
+        warmup.start()
+        
+        phase = 'device'   # phase in progress, blamed if anything below raises
         try:
-            if platform.system() == "Windows":
-                backend = cv2.CAP_DSHOW
-                backend_name = "DirectShow"
-            elif platform.system() == "Linux":
-                backend = cv2.CAP_V4L2
-                backend_name = "V4L2"
-            else:
-                backend = cv2.CAP_ANY
-                backend_name = "Auto"
-            
-            print(f"Opening camera with {backend_name} backend...")
-            self.cap = cv2.VideoCapture(CAMERA_INDEX, backend)
+            self.readiness.begin(phase)
+            self.cap = open_source(self.source_spec)
             
             if not self.cap.isOpened():
-                print(f"❌ Failed to open camera at index {CAMERA_INDEX}")
+                print(f"❌ Failed to open frame source: {self.source_spec}")
+                self.readiness.fail('device', f"cannot open {self.source_spec}")
+                self.cap = None
                 return False
             
-            print(f"✅ Camera opened with {backend_name}")
+            print(f"✅ Frame source opened: {self.source_spec} ({self.cap.name})")
             
             self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, VIDEO_WIDTH)
             self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, VIDEO_HEIGHT)
             self.cap.set(cv2.CAP_PROP_FPS, FPS)
             self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
             
-            self.cap.set(cv2.CAP_PROP_AUTOFOCUS, 0)
-            print("✅ Autofocus disabled for manual control")
+            if CAPTURE_MJPEG:
+                # Ask for the camera's own JPEG bytes instead of decoded BGR
+                self.cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG'))
+                self.cap.set(cv2.CAP_PROP_CONVERT_RGB, 0)
             
             actual_width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
             actual_height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
@@ -76,18 +235,41 @@ class CameraHandler:
             
             print(f"Camera resolution: {actual_width}x{actual_height} @ {actual_fps}fps")
             
-            self.set_brightness(self.brightness)
-            
             print("Testing frame capture...")
             ret, test_frame = self.cap.read()
             if not ret:
                 print("❌ ERROR: Camera opened but cannot read frames!")
+                self.readiness.fail('device', "opened but cannot read frames")
                 self.cap.release()
                 self.cap = None
                 return False
             
-            print(f"✅ Frame capture test successful: {test_frame.shape}")
+            self.mjpeg_native = is_encoded_frame(test_frame)
+            if self.mjpeg_native:
+                decoded = cv2.imdecode(test_frame, cv2.IMREAD_COLOR)
+                if decoded is None:
+                    print("⚠️ Camera MJPEG frames could not be decoded, falling back to BGR capture")
+                    self.cap.set(cv2.CAP_PROP_CONVERT_RGB, 1)
+                    self.mjpeg_native = False
+                else:
+                    print(f"✅ Frame capture test successful: {decoded.shape} (native MJPEG, passthrough available)")
+            else:
+                print(f"✅ Frame capture test successful: {test_frame.shape}")
+            
+            self.readiness.done('device', source=self.cap.name,
+                                resolution=f"{actual_width}x{actual_height}", fps=actual_fps)
             
+            phase = 'calibration'
+            self.readiness.begin(phase)
+            self.set_brightness(self.brightness)
+            if self.calibration_pending is not None:
+                self.calibration_pending.result()
+            if self.calibration_loaded:
+                self.readiness.done('calibration', profile=self.current_profile)
+            else:
+                self.readiness.skip('calibration', f"no calibration for brightness {self.brightness}")
+            
+            phase = 'pipeline'
             for i in range(5):
                 self.cap.grab()
             
@@ -104,38 +286,60 @@ class CameraHandler:
                 except Empty:
                     break
             
-            while not self.output_queue.empty():
-                try:
-                    self.output_queue.get_nowait()
-                except Empty:
-                    break
+            self._reset_output()
             
+            # First live frame must not pay for cold kernels
+            warmup.join()
+            
+            self.readiness.begin('pipeline')
+            self.processing_ready.set()
             self.running = True
             
             # OPTIMIZED: 3 threads for parallel processing
-            threading.Thread(target=self._camera_thread, daemon=True).start()
-            threading.Thread(target=self._processing_thread, daemon=True).start()
-            threading.Thread(target=self._histogram_thread, daemon=True).start()  # NEW
+            self.readiness.begin('first_frame')
+            threading.Thread(target=self._camera_thread, name="camera", daemon=True).start()
+            threading.Thread(target=self._processing_thread, name="processing", daemon=True).start()
+            threading.Thread(target=self._histogram_thread, name="histogram", daemon=True).start()  # NEW
+            self.governor.start()
+            self.readiness.done('pipeline')
             
             print(f"✅ Camera system started successfully (OPTIMIZED PIPELINE)")
             
-            zoom_val = self.cap.get(cv2.CAP_PROP_ZOOM)
-            focus_val = self.cap.get(cv2.CAP_PROP_FOCUS)
-            pan_val = self.cap.get(cv2.CAP_PROP_PAN)
-            autofocus_val = self.cap.get(cv2.CAP_PROP_AUTOFOCUS)
-            print(f"PTZ Status - Zoom: {zoom_val:.1f}, Focus: {focus_val:.1f}, Pan: {pan_val:.1f}, Autofocus: {autofocus_val}")
-            
             return True
             
         except Exception as e:
             print(f"❌ Error starting camera: {e}")
+            self.readiness.fail(phase, e)
             if self.cap:
                 self.cap.release()
                 self.cap = None
             return False
     
+    def _warm_up(self, width, height):
+        """Load the correction kernels and run the OpenCV per-frame calls once on dummy data"""
+        self.readiness.begin('warmup')
+        try:
+            # Loads the kernels; their OpenMP team is spun up in the processing thread
+            fast_mode = is_fast_mode()
+            
+            frame = np.zeros((height, width, 3), dtype=np.uint8)
+            ret, jpeg = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+            if ret:
+                cv2.imdecode(jpeg, cv2.IMREAD_COLOR)
+            cv2.resize(frame, (width // 2, height // 2), interpolation=cv2.INTER_LINEAR)
+            self.histogram_proc.apply_post_processing(frame, True)
+            self.histogram_proc.calculate_histogram_packed(frame)
+            self.scene_detector.thumbnail(FramePacket(frame=frame))
+            
+            self.readiness.done('warmup', fast_mode=fast_mode)
+        except Exception as e:
+            print(f"⚠️ Warm-up failed: {e}")
+            self.readiness.fail('warmup', e)
+    
     def stop(self):
         print("Stopping camera...")
+        self.recorder.stop()
+        self.governor.stop()
         self.running = False
         time.sleep(0.3)
         if self.cap:
@@ -155,29 +359,40 @@ class CameraHandler:
             except Empty:
                 break
         
-        while not self.output_queue.empty():
-            try:
-                self.output_queue.get_nowait()
-            except Empty:
-                break
+        self._reset_output()
         
         print("Camera stopped")
     
     def _camera_thread(self):
+        pin_current_thread('camera')
         print("Camera thread started")
         while self.running:
             if self.cap is None:
                 time.sleep(0.1)
                 continue
             
-            success, frame = self.cap.read()
+            # Always grab to keep the driver buffer fresh, but only retrieve
+            # (decode) when the processing stage is ready for another frame
+            if not self.cap.grab():
+                time.sleep(0.01)
+                continue
+            self.governor.captured += 1
+            
+            if not self.processing_ready.is_set():
+                self.skipped_decodes += 1
+                continue
+            
+            success, frame = self.cap.retrieve()
             if success:
+                self.processing_ready.clear()
+                self.retrieved_frames += 1
+                item = (self.retrieved_frames, time.time(), frame)
                 try:
-                    self.raw_queue.put(frame, block=False)
+                    self.raw_queue.put(item, block=False)
                 except Full:
                     try:
                         self.raw_queue.get_nowait()
-                        self.raw_queue.put(frame, block=False)
+                        self.raw_queue.put(item, block=False)
                     except:
                         pass
             else:
@@ -191,23 +406,62 @@ class CameraHandler:
         OPTIMIZED: Apply corrections (BLC/SLC/GLC/DarkGLC/NLM)
         NLM runs in PARALLEL in corrections_loader thread
         """
-        print("Processing thread started (corrections only)")
+        pin_current_thread('processing')
+        # OpenMP keeps one worker team per calling thread: spin up this
+        # thread's team (on its pinned CPUs) before the first live frame
+        warmup_ms = warm_up_kernels(VIDEO_WIDTH, VIDEO_HEIGHT, rounds=1)
+        print(f"Processing thread started (corrections only, kernels warm in {warmup_ms:.0f}ms)")
         while self.running:
-            frame = None
+            item = None
             while True:
                 try:
-                    frame = self.raw_queue.get_nowait()
+                    item = self.raw_queue.get_nowait()
                 except Empty:
                     break
             
-            if frame is None:
-                time.sleep(0.01)
+            if item is None:
+                # Idle: let the capture thread retrieve the next grabbed frame
+                self.processing_ready.set()
+                time.sleep(0.001)
                 continue
             
-            processed_frame = frame.copy()
+            seq, timestamp, frame = item
+            stage_start = time.perf_counter()
+            
+            # Raw recording gets the untouched camera frame (never blocks)
+            if self.recorder.target == 'raw':
+                self.recorder.submit(frame, self._recording_metadata(seq, timestamp))
+            
+            if is_encoded_frame(frame):
+                # Native MJPEG: forward the camera's bytes untouched when nothing needs pixels
+                if self.passthrough_active():
+                    self._put_output(FramePacket(jpeg=frame.tobytes(), seq=seq, timestamp=timestamp))
+                    self.passthrough_frames += 1
+                    time.sleep(0.001)
+                    continue
+                
+                frame = cv2.imdecode(frame, cv2.IMREAD_COLOR)
+                if frame is None:
+                    continue
+                self.decoded_frames += 1
+            
+            # Calibration capture gets the decoded raw frame (never blocks)
+            if self.calibration_generator.accepting:
+                self.calibration_generator.submit(frame)
+            
+            # Software ROI: copy only the visible crop, correct it, resize after
+            height, width = frame.shape[:2]
+            roi = self.get_roi(width, height)
+            if roi is not None:
+                x, y, w, h = roi
+                processed_frame = frame[y:y + h, x:x + w].copy()
+            else:
+                processed_frame = frame.copy()
             
             # Apply corrections (BLC/SLC/GLC/DarkGLC/NLM)
             # NLM is THREADED inside correction_engine, so this won't block!
+            correction_engine.nlm_interval = self.governor.nlm_interval()
+            self.governor.output_divisor = self.stacker.output_divisor()
             if self.auto_corrections and self.calibration_loaded:
                 try:
                     processed_frame = correction_engine.apply_corrections(
@@ -215,18 +469,32 @@ class CameraHandler:
                         enable_blc_slc=self.enable_blc_slc,
                         enable_glc=self.enable_glc,
                         enable_dark_glc=self.enable_dark_glc,
-                        enable_nlm=self.enable_nlm
+                        enable_nlm=self.enable_nlm,
+                        roi=roi,
+                        enable_defects=self.enable_defects
                     )
                 except Exception as e:
-                    print(f"⚠️ Correction error: {e}")
+                    pipeline_log.warning("Correction error: %s", e, extra={'stage': 'processing', 'seq': seq})
+            
+            if roi is not None:
+                processed_frame = cv2.resize(processed_frame, (width, height), interpolation=cv2.INTER_LINEAR)
+            
+            # Low-light stacking: only every n-th frame continues downstream
+            if self.stacker.enabled:
+                processed_frame = self.stacker.add(processed_frame)
+            
+            self.governor.record('processing', (time.perf_counter() - stage_start) * 1000)
+            if processed_frame is None:
+                continue
             
             # OPTIMIZED: Send to histogram thread (parallel processing)
+            item = (seq, timestamp, processed_frame)
             try:
-                self.corrected_queue.put(processed_frame, block=False)
+                self.corrected_queue.put(item, block=False)
             except Full:
                 try:
                     self.corrected_queue.get_nowait()
-                    self.corrected_queue.put(processed_frame, block=False)
+                    self.corrected_queue.put(item, block=False)
                 except:
                     pass
             
@@ -235,81 +503,187 @@ class CameraHandler:
     
     def _histogram_thread(self):
         """
-        OPTIMIZED: NEW thread for histogram normalization
+        Post-processing stage: histogram LUT (stretch/gamma/contrast) + flip
         Runs in PARALLEL with NLM thread
         """
-        print("Histogram thread started (parallel processing)")
+        pin_current_thread('histogram')
+        print("Histogram thread started (LUT + flip post-processing)")
         while self.running:
-            frame = None
+            item = None
             while True:
                 try:
-                    frame = self.corrected_queue.get_nowait()
+                    item = self.corrected_queue.get_nowait()
                 except Empty:
                     break
             
-            if frame is None:
+            if item is None:
                 time.sleep(0.01)
                 continue
             
-            # Apply histogram normalization (FAST, runs in parallel with NLM)
+            seq, timestamp, frame = item
+            stage_start = time.perf_counter()
+            
+            # Apply LUT + flip in one stage, once per frame
             try:
-                final_frame = self.histogram_proc.apply_normalization(frame)
+                final_frame = self.histogram_proc.apply_post_processing(frame, flip=self.horizontal_flip)
             except Exception as e:
-                print(f"⚠️ Histogram normalization error: {e}")
+                pipeline_log.warning("Post-processing error: %s", e, extra={'stage': 'post', 'seq': seq})
                 final_frame = frame
             
+            self.governor.record('post', (time.perf_counter() - stage_start) * 1000)
+            
             # Send to output
-            try:
-                self.output_queue.put(final_frame, block=False)
-            except Full:
-                try:
-                    self.output_queue.get_nowait()
-                    self.output_queue.put(final_frame, block=False)
-                except:
-                    pass
+            self._put_output(FramePacket(frame=final_frame, seq=seq, timestamp=timestamp))
             
             time.sleep(0.001)
         print("Histogram thread stopped")
     
+    def _put_output(self, packet):
+        """Publish a packet; only wake viewers if the scene actually changed"""
+        if self.recorder.target == 'corrected':
+            self.recorder.submit(packet, self._recording_metadata(packet.seq, packet.timestamp))
+        
+        self.governor.record_output(packet.timestamp)
+        stream = (self.governor.jpeg_quality(), self.governor.stream_scale())
+        send = self.scene_detector.should_send(packet, viewers=self.viewers, stream=stream)
+        if self.readiness.state('first_frame') == 'running':
+            self.readiness.done('first_frame', seq=packet.seq)
+        with self.output_cond:
+            self.latest_packet = packet
+            if send:
+                self.sent_packet = packet
+                self.sent_seq += 1
+                self.output_cond.notify_all()
+    
+    def _reset_output(self):
+        with self.output_cond:
+            self.latest_packet = None
+            self.sent_packet = None
+        self.scene_detector.reset()
+    
+    def _recording_metadata(self, seq, timestamp):
+        return {
+            'seq': seq,
+            'timestamp': timestamp,
+            'brightness': self.brightness,
+            'profile': self.current_profile if self.calibration_loaded else None
+        }
+    
+    def passthrough_active(self):
+        """True when camera JPEGs can go straight to viewers (no pixel processing needed)"""
+        if not (CAPTURE_MJPEG and self.mjpeg_native):
+            return False
+        if self.auto_corrections and self.calibration_loaded:
+            return False
+        if self.horizontal_flip:
+            return False
+        if self.software_roi and self.digital_zoom > 1.0:
+            return False
+        if self.calibration_generator.active or self.stacker.enabled:
+            return False
+        return self.histogram_proc.is_identity()
+    
+    def get_packet(self):
+        """Latest output FramePacket (JPEG and/or pixels), or None"""
+        return self.latest_packet
+    
+    def wait_for_packet(self, last_seq, timeout=0.5):
+        """
+        Block until a packet newer than last_seq has been sent
+        Returns (seq, packet); packet is None on timeout
+        """
+        with self.output_cond:
+            if self.sent_seq == last_seq or self.sent_packet is None:
+                self.output_cond.wait(timeout)
+            if self.sent_seq == last_seq or self.sent_packet is None:
+                return last_seq, None
+            return self.sent_seq, self.sent_packet
+    
+    def add_viewer(self):
+        with self.output_cond:
+            self.viewers += 1
+    
+    def remove_viewer(self):
+        with self.output_cond:
+            self.viewers = max(0, self.viewers - 1)
+    
     def get_frame(self):
-        try:
-            frame = self.output_queue.get(timeout=0.1)
-            return frame
-        except Empty:
+        """Latest output frame as BGR pixels (decodes passthrough frames on demand)"""
+        packet = self.get_packet()
+        if packet is None:
             return None
+        return packet.frame
     
     def set_brightness(self, value):
         self.brightness = max(BRIGHTNESS_MIN, min(BRIGHTNESS_MAX, value))
         if self.cap:
             result = self.cap.set(cv2.CAP_PROP_BRIGHTNESS, self.brightness)
             if result:
-                print(f"Brightness set to {self.brightness}")
+                log.info("Brightness set to %s", self.brightness)
             else:
-                print(f"Warning: Could not set brightness to {self.brightness}")
+                log.warning("Could not set brightness to %s", self.brightness)
+        self.stacker.reset()
         self.load_calibration_for_brightness(self.brightness)
     
     def set_zoom(self, value):
+        if self.software_roi:
+            return self.set_digital_zoom(value)
         self.zoom = max(1, min(10, value))
         if self.cap:
             result = self.cap.set(cv2.CAP_PROP_ZOOM, self.zoom)
             if result:
-                print(f"✅ Zoom set to {self.zoom}")
+                log.info("Zoom set to %s", self.zoom)
             else:
-                print(f"⚠️ Warning: Could not set zoom to {self.zoom}")
+                log.warning("Could not set zoom to %s", self.zoom)
             return result
         return False
     
     def set_pan(self, value):
+        if self.software_roi:
+            return self.set_digital_pan(value)
         self.pan = max(-10, min(10, value))
         if self.cap:
             result = self.cap.set(cv2.CAP_PROP_PAN, self.pan)
             if result:
-                print(f"✅ Pan set to {self.pan}")
+                log.info("Pan set to %s", self.pan)
             else:
-                print(f"⚠️ Warning: Could not set pan to {self.pan}")
+                log.warning("Could not set pan to %s", self.pan)
             return result
         return False
     
+    def get_roi(self, width, height):
+        """Software ROI crop (x, y, w, h) for a frame size, or None when not zoomed"""
+        if not self.software_roi or self.digital_zoom <= 1.0:
+            return None
+        
+        w = max(16, int(width / self.digital_zoom))
+        h = max(16, int(height / self.digital_zoom))
+        slack_x = (width - w) // 2
+        x = slack_x + int(round(self.digital_pan / 10.0 * slack_x))
+        y = (height - h) // 2
+        return (max(0, min(width - w, x)), y, w, h)
+    
+    def set_software_roi(self, enabled):
+        self.software_roi = enabled
+        log.info("Software ROI zoom/pan: %s", 'ON' if enabled else 'OFF')
+    
+    def set_digital_zoom(self, value):
+        self.digital_zoom = max(1.0, min(DIGITAL_ZOOM_MAX, float(value)))
+        self.zoom = round(self.digital_zoom, 2)
+        return True
+    
+    def step_digital_zoom(self, steps):
+        """Multiplicative digital zoom step (positive = in)"""
+        return self.set_digital_zoom(self.digital_zoom * (DIGITAL_ZOOM_STEP ** steps))
+    
+    def set_digital_pan(self, value):
+        self.digital_pan = max(-10.0, min(10.0, float(value)))
+        self.pan = round(self.digital_pan, 1)
+        return True
+    
+    def step_digital_pan(self, steps):
+        return self.set_digital_pan(self.digital_pan + steps)
+    
     def set_focus(self, value):
         self.focus = max(0, min(800, value))
         if self.cap:
@@ -317,13 +691,13 @@ class CameraHandler:
             
             result = self.cap.set(cv2.CAP_PROP_FOCUS, self.focus)
             if result:
-                print(f"✅ Focus set to {self.focus} (autofocus OFF)")
+                log.info("Focus set to %s (autofocus OFF)", self.focus)
             else:
-                print(f"⚠️ Warning: Could not set focus to {self.focus}")
+                log.warning("Could not set focus to %s", self.focus)
             
             af_status = self.cap.get(cv2.CAP_PROP_AUTOFOCUS)
             if af_status != 0:
-                print(f"⚠️ WARNING: Autofocus re-enabled itself! Status: {af_status}")
+                log.warning("Autofocus re-enabled itself! Status: %s", af_status)
                 self.cap.set(cv2.CAP_PROP_AUTOFOCUS, 0)
             
             return result
@@ -333,62 +707,89 @@ class CameraHandler:
         self.auto_corrections = enabled
         status = "enabled" if enabled else "disabled"
         mode = "FAST" if is_fast_mode() else "SLOW"
-        print(f"Auto corrections: {status} (Mode: {mode})")
+        log.info("Auto corrections: %s (Mode: %s)", status, mode)
         
         if enabled and not self.calibration_loaded:
-            print(f"Loading calibration for current brightness: {self.brightness}")
+            log.info("Loading calibration for current brightness: %s", self.brightness)
             self.load_calibration_for_brightness(self.brightness)
     
     def load_calibration_for_brightness(self, brightness):
-        genfile_path = Path(GENFILES_PATH) / f"VG{brightness:02d}.genrgb"
-        
-        if not genfile_path.exists():
-            print(f"⚠️ Calibration file not found: {genfile_path}")
-            self.calibration_loaded = False
-            self.current_profile = None
-            return False
-        
+        """
+        Install the profile for `brightness`. Levels without their own genfile
+        get a profile interpolated between the neighbouring genfiles; the
+        current profile stays active until the blend is ready.
+        """
+        self.calibration_target = brightness
         try:
-            if correction_engine.load_calibration(str(genfile_path)):
-                self.calibration_loaded = True
-                self.current_profile = f"VG{brightness:02d}"
-                mode = "FAST" if is_fast_mode() else "SLOW"
-                print(f"✓ Calibration loaded: {self.current_profile} (Mode: {mode})")
+            found = self.calibration_library.get(brightness)
+            if found is not None:
+                self._install_calibration(*found)
+                return True
+            
+            if self.calibration_library.can_interpolate(brightness):
+                self.calibration_pending = self.calibration_library.request(brightness, self._on_calibration_ready)
                 return True
-            else:
-                self.calibration_loaded = False
-                self.current_profile = None
-                return False
             
         except Exception as e:
-            print(f"Error loading calibration: {e}")
+            log.error("Error loading calibration: %s", e)
             self.calibration_loaded = False
             self.current_profile = None
             return False
+        
+        log.warning("Calibration file not found: %s (nothing to interpolate from)",
+                    self.calibration_library.path_for(brightness))
+        self.calibration_loaded = False
+        self.current_profile = None
+        return False
+    
+    def _install_calibration(self, name, calibration):
+        correction_engine.set_calibration(calibration)
+        self.calibration_loaded = True
+        self.current_profile = name
+        mode = "FAST" if is_fast_mode() else "SLOW"
+        log.info("Calibration loaded: %s (Mode: %s)", self.current_profile, mode)
+    
+    def _on_calibration_ready(self, brightness, name, calibration):
+        """Blend finished (worker thread); ignored if the brightness moved on meanwhile"""
+        if brightness == self.calibration_target:
+            self._install_calibration(name, calibration)
+    
+    def set_horizontal_flip(self, enabled):
+        self.horizontal_flip = enabled
+        log.info("Horizontal flip: %s", 'ENABLED' if enabled else 'DISABLED')
     
     def toggle_blc_slc(self):
         self.enable_blc_slc = not self.enable_blc_slc
-        print(f"BLC/SLC: {'ON' if self.enable_blc_slc else 'OFF'}")
+        log.info("BLC/SLC: %s", 'ON' if self.enable_blc_slc else 'OFF')
         return self.enable_blc_slc
     
     def toggle_glc(self):
         self.enable_glc = not self.enable_glc
-        print(f"GLC: {'ON' if self.enable_glc else 'OFF'}")
+        log.info("GLC: %s", 'ON' if self.enable_glc else 'OFF')
         return self.enable_glc
     
     def toggle_dark_glc(self):
         self.enable_dark_glc = not self.enable_dark_glc
-        print(f"Dark GLC: {'ON' if self.enable_dark_glc else 'OFF'}")
+        log.info("Dark GLC: %s", 'ON' if self.enable_dark_glc else 'OFF')
         return self.enable_dark_glc
     
+    def toggle_defects(self):
+        self.enable_defects = not self.enable_defects
+        log.info("Defect correction: %s", 'ON' if self.enable_defects else 'OFF')
+        return self.enable_defects
+    
     def toggle_nlm(self):
         self.enable_nlm = not self.enable_nlm
         status = 'ON' if self.enable_nlm else 'OFF'
         fps_impact = '(~60 FPS)' if self.enable_nlm else '(~60 FPS)'
-        print(f"NLM Denoise: {status} {fps_impact}")
+        log.info("NLM Denoise: %s %s", status, fps_impact)
         return self.enable_nlm
     
     def get_status(self):
+        """
+        Settings and state; changes only on events, so /ws/stream can push it
+        as a diff. Running counters are in get_stats()
+        """
         return {
             'brightness': self.brightness,
             'zoom': self.zoom,
@@ -397,13 +798,47 @@ class CameraHandler:
             'auto_corrections': self.auto_corrections,
             'profile': self.current_profile if self.calibration_loaded else None,
             'connected': self.cap is not None and self.cap.isOpened(),
+            'source': self.source_spec,
             'fast_mode': is_fast_mode(),
             'enable_blc_slc': self.enable_blc_slc,
             'enable_glc': self.enable_glc,
             'enable_dark_glc': self.enable_dark_glc,
-            'enable_nlm': self.enable_nlm
+            'enable_nlm': self.enable_nlm,
+            'enable_defects': self.enable_defects,
+            'defects': self._defect_stats(),
+            'horizontal_flip': self.horizontal_flip,
+            'software_roi': self.software_roi,
+            'digital_zoom': round(self.digital_zoom, 2),
+            'mjpeg_native': self.mjpeg_native,
+            'passthrough_active': self.passthrough_active(),
+            'viewers': self.viewers,
+            'calibration_cache': self.calibration_library.get_stats(),
+            'recording': self.recorder.get_summary(),
+            'calibration_capture': self.calibration_generator.active,
+            'stacking': self.stacker.get_summary(),
+            'auto_exposure': self.auto_exposure.enabled,
+            'threads': get_allocation(),
+            'governor': self.governor.get_summary()
+        }
+    
+    def get_stats(self):
+        """Per-frame counters (grow every frame; polled, never pushed as a diff)"""
+        return {
+            'passthrough_frames': self.passthrough_frames,
+            'decoded_frames': self.decoded_frames,
+            'retrieved_frames': self.retrieved_frames,
+            'skipped_decodes': self.skipped_decodes,
+            'recording': self.recorder.get_stats(),
+            'stacking': self.stacker.get_status(),
+            'static_scene': self.scene_detector.get_stats(),
         }
     
+    def _defect_stats(self):
+        calibration = correction_engine.calibration
+        if not self.calibration_loaded or calibration is None or calibration.get('defects') is None:
+            return None
+        return calibration['defects'].get_stats()
+    
     def diagnose_camera(self):
         if not self.cap or not self.cap.isOpened():
             print("❌ Camera not opened")
@@ -430,7 +865,9 @@ class CameraHandler:
             print(f"{name:15} : {value}")
         
         ret, frame = self.cap.read()
-        if ret:
+        if ret and is_encoded_frame(frame):
+            print(f"\n✅ Frame read successful: {frame.size} bytes native MJPEG")
+        elif ret:
             print(f"\n✅ Frame read successful: {frame.shape}")
         else:
             print("\n❌ Failed to read frame!")
@@ -1,3 +1,4 @@
+import os
 import platform
 
 IS_RASPBERRY_PI = platform.machine().startswith('arm') or platform.machine().startswith('aarch')
@@ -18,8 +19,144 @@ VIDEO_HEIGHT = 483
 FPS = 30
 
 GENFILES_PATH = "genfiles"
+CALIBRATION_CACHE_SIZE = 6     # loaded + interpolated profiles kept in memory
+
+# Hot/dead pixel correction (defect map found from BLC/SLC at calibration load)
+DEFECT_CORRECTION = True
+DEFECT_HOT_THRESHOLD = 24      # BLC above its 3x3 median by more than this = hot
+DEFECT_MIN_RESPONSE = 0.5      # SLC-BLC below this fraction of its 3x3 median = dead
+DEFECT_MAX_FRACTION = 0.01     # more defects than this = bad calibration, map disabled
 CPP_MODULE_PATH = "../cpp_modules/rgb_correction.dll"
 
 BRIGHTNESS_MIN = 7
 BRIGHTNESS_MAX = 60
 BRIGHTNESS_DEFAULT = 40
+
+# WebSocket push stream (/ws/stream)
+STATUS_PUSH_INTERVAL = 0.1      # seconds between status diff checks
+HISTOGRAM_PUSH_MAX_FPS = 30     # upper bound for client-requested histogram rate
+HISTOGRAM_POLL_INTERVAL = 0.2     # dashboard /histogram polling period (HTTP fallback)
+
+# MJPEG passthrough: request native MJPG from the camera and forward its JPEG
+# bytes untouched to /video_feed while no pixel-level processing is active
+CAPTURE_MJPEG = True
+JPEG_QUALITY = 60
+
+# Software ROI zoom/pan for cameras without CAP_PROP_ZOOM / CAP_PROP_PAN.
+# Only the visible crop is corrected, then resized to the output size.
+SOFTWARE_ROI = False
+DIGITAL_ZOOM_MAX = 8.0
+DIGITAL_ZOOM_STEP = 1.1   # multiplicative zoom change per step
+
+# PTZ device actor: one thread owns all zoom/focus/pan control I/O.
+# Units are the camera's own CAP_PROP values; digital (software ROI) moves
+# are in DIGITAL_ZOOM_STEP steps for zoom and pan units for pan.
+PTZ_TICK = 0.15                                              # continuous-move period (s)
+PTZ_LIMITS = {'zoom': (1, 10), 'focus': (0, 1000), 'pan': (-10, 10)}
+PTZ_STEP = {'zoom': 1, 'focus': 15, 'pan': 1}                # per click
+PTZ_SPEED = {'zoom': 1, 'focus': 24, 'pan': 1}               # per tick while held
+PTZ_DIGITAL_STEP = {'zoom': 2, 'pan': 1}
+PTZ_DIGITAL_SPEED = {'zoom': 1, 'pan': 1}
+
+# Static-scene suppression: skip encoding/sending frames whose downsampled
+# luma thumbnail did not change, except for a periodic keep-alive frame
+STATIC_SCENE_SUPPRESSION = True
+STATIC_SCENE_MEAN_THRESHOLD = 1.5   # mean abs luma difference (0-255)
+STATIC_SCENE_CELL_THRESHOLD = 12    # max abs difference of any thumbnail cell
+STATIC_SCENE_KEEPALIVE = 2.0        # seconds between frames on a static scene
+STATIC_SCENE_THUMB_SIZE = (32, 24)
+
+# Recording (non-blocking archive subscriber)
+RECORDINGS_PATH = "recordings"
+RECORDING_SEGMENT_SEC = 60      # start a new file every N seconds
+RECORDING_SEGMENTS_KEPT = 10    # recent segment paths reported in the stats
+RECORDER_QUEUE_SIZE = 64        # frames buffered before the recorder starts dropping
+RECORDING_JPEG_QUALITY = 85     # corrected target (MJPEG stream)
+
+# Auto-exposure (closed loop on brightness from the output histogram)
+AE_INTERVAL = 0.25              # seconds between histogram samples
+AE_TARGET_MEDIAN = (90, 150)    # median brightness band that needs no change
+AE_HIGHLIGHT_PERCENTILE = 0.99
+AE_HIGHLIGHT_MAX = 245          # darker when this percentile clips
+AE_CONFIRM_SAMPLES = 3          # same direction this many samples in a row
+AE_MIN_CHANGE_INTERVAL = 2.0    # seconds between brightness changes
+AE_SETTLE_SEC = 0.5             # ignore frames captured this soon after a change
+AE_BRIGHTNESS_RANGE = (BRIGHTNESS_MIN, BRIGHTNESS_MAX)
+AE_PROFILE_STEPS = True         # step between levels that have a genfile
+AE_STEP = 2                     # step size when no genfiles are available
+
+# Low-light frame stacking (off until enabled via /stacking)
+STACK_DEPTH = 8                 # frames per stacked output
+STACK_MAX_DEPTH = 128           # uint16 accumulator limit (255 * 257 fits)
+STACK_MODE = 'sliding'          # 'sliding' window or 'block'
+STACK_COMBINE = 'mean'          # 'mean' or 'sum' (exposure-normalized)
+STACK_OUTPUT_INTERVAL = 2       # sliding mode: output every n-th frame
+STACK_SUM_TARGET = 110          # sum mode: target mean brightness (0-255)
+SNAPSHOT_JPEG_QUALITY = 95      # /snapshot
+
+# Calibration capture (generates genfiles/VGxx.genrgb from the live camera)
+CALIBRATION_WORK_PATH = "genfiles/capture"  # per-level mean planes between sweeps
+CALIBRATION_FRAMES = 32         # frames averaged per brightness level
+CALIBRATION_SETTLE_SEC = 0.5    # wait after changing brightness before capturing
+CALIBRATION_FRAME_TIMEOUT = 5.0 # give up on a level when no frame arrives for this long
+
+# Frame source: "device" / "device:<index>" (camera), "file:<video or image dir>",
+# "synthetic" / "synthetic:<W>x<H>[@fps][,stamp]" (deterministic gradients + noise,
+# optionally with the frame counter stamped into the pixels).
+# Pacing: "realtime" (sleep to the source fps) or "fast" (as fast as possible).
+CAMERA_SOURCE = os.environ.get("CAMERA_SOURCE", "device")
+CAMERA_SOURCE_PACING = os.environ.get("CAMERA_SOURCE_PACING", "realtime")
+
+# CPU thread budget per stage (None = automatic):
+#   openmp      - threads for the Cython correction kernels (auto: CPUs - 1;
+#                 an OMP_NUM_THREADS environment variable overrides this)
+#   opencv      - OpenCV's internal pool (1 = sequential in the calling thread)
+#   nlm_workers - parallel strips for NLM denoising
+THREAD_BUDGET = {
+    'openmp': None,
+    'opencv': 1,
+    'nlm_workers': 1,
+}
+
+# Optional CPU pinning per stage (Linux only), e.g. on a 4-core Pi:
+# {'camera': [0], 'processing': [1, 2], 'nlm': [3], 'histogram': [0]}
+# Stages: camera, processing, histogram, nlm, ptz, recorder
+CPU_AFFINITY = {}
+
+# Load governor: when the output falls behind (frame age / output FPS), step
+# down the ladder rung that relieves the over-budget stage; back up with headroom.
+GOVERNOR_ENABLED = True
+GOVERNOR_TARGET_FPS = FPS
+GOVERNOR_MAX_FRAME_AGE_MS = 150     # capture -> publish
+GOVERNOR_MIN_FPS_RATIO = 0.85       # "behind" = output below 85% of the camera rate
+GOVERNOR_NLM_BUDGET_MS = 250        # async NLM worker: denoised result at least 4x/s
+GOVERNOR_LADDER = [                 # applied top-down, cumulative
+    ('nlm_rate', 0.5),              # NLM on every 2nd frame
+    ('histogram_decimation', 4),    # histograms at 1/4 rate
+    ('jpeg_quality', 45),
+    ('stream_scale', 0.5),          # half-resolution stream
+]
+GOVERNOR_INTERVAL = 0.5             # seconds between evaluations
+GOVERNOR_STEP_DOWN_AFTER = 2.0      # seconds over budget before stepping down
+GOVERNOR_STEP_UP_AFTER = 5.0        # seconds with headroom before stepping up
+GOVERNOR_HEADROOM = 0.7             # "headroom" = load and age below 70% of budget
+GOVERNOR_SMOOTHING = 0.2            # EMA factor for timings
+
+# Frontend assets are cached in memory and precompressed at startup
+STATIC_MAX_AGE = 300            # Cache-Control max-age for non-HTML assets (s)
+STATIC_COMPRESS_MIN_SIZE = 512  # smaller files are sent uncompressed
+
+# Logging: queued, written by one background thread (see app_logging.py)
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()     # default for every subsystem
+# Per-subsystem overrides, e.g. {'ptz': 'WARNING', 'pipeline': 'DEBUG'}
+# Subsystems: ptz, camera, pipeline, corrections, calibration, governor, ae, recorder,
+# profiler, robot
+LOG_LEVELS = {}
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "text")   # 'text' or 'json' (one object per line)
+LOG_RATE_LIMIT_BURST = 5        # identical messages allowed per window...
+LOG_RATE_LIMIT_WINDOW = 10.0    # ...of this many seconds
+LOG_QUEUE_MAX = 10000           # pending records before new ones are dropped
+
+# On-demand sampling profiler (/admin/profile)
+PROFILER_INTERVAL_MS = 10       # default sampling period
+PROFILER_MAX_SECONDS = 60       # longest allowed capture
@@ -8,43 +8,93 @@ import cv2
 from pathlib import Path
 import threading
 import time
-cv2.setNumThreads(0)
-try:
-    from corrections_fast import (
-        apply_blc_slc_fast,
-        apply_glc_fast,
-        apply_dark_glc_fast
-    )
-    FAST_MODE = True
-    print("✓ Using FAST corrections (Cython + OpenMP)")
-except ImportError:
-    FAST_MODE = False
-    print("⚠ Using SLOW corrections (Pure Python) - Run: python setup.py build_ext --inplace")
+from concurrent.futures import ThreadPoolExecutor
+from thread_budget import apply_process_budget, get_budget, pin_current_thread
+from defect_map import DefectMap
+from app_logging import get_logger
+
+log = get_logger('corrections')
+
+# OpenMP/OpenCV thread counts must be fixed before the kernels load
+apply_process_budget()
+
+
+def apply_blc_slc_python(frame, blc_r, blc_g, blc_b, slc_diff_r, slc_diff_g, slc_diff_b):
+    """Pure Python fallback for BLC/SLC"""
+    b, g, r = cv2.split(frame)
+    b = b.astype(np.int32)
+    g = g.astype(np.int32)
+    r = r.astype(np.int32)
     
-    def apply_blc_slc_fast(frame, blc_r, blc_g, blc_b, slc_diff_r, slc_diff_g, slc_diff_b):
-        """Pure Python fallback for BLC/SLC"""
-        b, g, r = cv2.split(frame)
-        b = b.astype(np.int32)
-        g = g.astype(np.int32)
-        r = r.astype(np.int32)
-        
-        r = ((r - blc_r) * 255) // slc_diff_r
-        g = ((g - blc_g) * 255) // slc_diff_g
-        b = ((b - blc_b) * 255) // slc_diff_b
-        
-        r = np.clip(r, 0, 255).astype(np.uint8)
-        g = np.clip(g, 0, 255).astype(np.uint8)
-        b = np.clip(b, 0, 255).astype(np.uint8)
-        
-        return cv2.merge([b, g, r])
+    r = ((r - blc_r) * 255) // slc_diff_r
+    g = ((g - blc_g) * 255) // slc_diff_g
+    b = ((b - blc_b) * 255) // slc_diff_b
     
-    def apply_glc_fast(frame, glc_r, glc_g, glc_b):
-        """Pure Python fallback for GLC"""
-        return frame
+    r = np.clip(r, 0, 255).astype(np.uint8)
+    g = np.clip(g, 0, 255).astype(np.uint8)
+    b = np.clip(b, 0, 255).astype(np.uint8)
     
-    def apply_dark_glc_fast(frame, dark_glc_r, dark_glc_g, dark_glc_b):
-        """Pure Python fallback for Dark GLC"""
-        return frame
+    return cv2.merge([b, g, r])
+
+def apply_glc_python(frame, glc_r, glc_g, glc_b):
+    """Pure Python fallback for GLC"""
+    return frame
+
+def apply_dark_glc_python(frame, dark_glc_r, dark_glc_g, dark_glc_b):
+    """Pure Python fallback for Dark GLC"""
+    return frame
+
+
+# The Cython kernels are imported on first use (or by warm_up_kernels during
+# background start-up) so importing this module stays cheap.
+FAST_MODE = None
+_kernels_lock = threading.Lock()
+apply_blc_slc_fast = apply_blc_slc_python
+apply_glc_fast = apply_glc_python
+apply_dark_glc_fast = apply_dark_glc_python
+
+
+def _ensure_kernels():
+    """Import corrections_fast once; returns FAST_MODE"""
+    global FAST_MODE, apply_blc_slc_fast, apply_glc_fast, apply_dark_glc_fast
+    if FAST_MODE is not None:
+        return FAST_MODE
+    
+    with _kernels_lock:
+        if FAST_MODE is None:
+            apply_process_budget()
+            try:
+                import corrections_fast
+                apply_blc_slc_fast = corrections_fast.apply_blc_slc_fast
+                apply_glc_fast = corrections_fast.apply_glc_fast
+                apply_dark_glc_fast = corrections_fast.apply_dark_glc_fast
+                FAST_MODE = True
+                print("✓ Using FAST corrections (Cython + OpenMP)")
+            except ImportError:
+                FAST_MODE = False
+                print("⚠ Using SLOW corrections (Pure Python) - Run: python setup.py build_ext --inplace")
+    return FAST_MODE
+
+
+def warm_up_kernels(width, height, rounds=2):
+    """
+    Load the kernels and run them on a dummy frame so the OpenMP thread pool
+    is spun up before the first live frame arrives
+    """
+    fast = _ensure_kernels()
+    frame = np.zeros((height, width, 3), dtype=np.uint8)
+    zeros = np.zeros((height, width), dtype=np.int32)
+    full = np.full((height, width), 255, dtype=np.int32)
+    
+    start = time.perf_counter()
+    for _ in range(rounds):
+        if fast:
+            apply_blc_slc_fast(frame, zeros, zeros, zeros, full, full, full)
+            apply_glc_fast(frame, full, full, full)
+            apply_dark_glc_fast(frame, full, full, full)
+        else:
+            frame = apply_blc_slc_python(frame, zeros, zeros, zeros, full, full, full)
+    return (time.perf_counter() - start) * 1000
 
 
 class CorrectionEngine:
@@ -67,6 +117,15 @@ class CorrectionEngine:
         self.latest_nlm_input = None
         self.latest_nlm_output = None
         
+        # Only every nlm_interval-th frame is sent to NLM (set by the load governor)
+        self.nlm_interval = 1
+        self.nlm_frame_counter = 0
+        self.timing_hook = None   # optional callable(stage, ms)
+        
+        # Strip workers when THREAD_BUDGET['nlm_workers'] > 1 (created on demand)
+        self.nlm_pool = None
+        self.nlm_workers = 1
+        
         # NLM parameters (matching C# defaults)
         self.nlm_h_luma = 3
         self.nlm_template = 7
@@ -78,9 +137,18 @@ class CorrectionEngine:
             return
         
         self.nlm_running = True
-        self.nlm_thread = threading.Thread(target=self._nlm_worker_loop, daemon=True)
+        workers = get_budget()['nlm_workers']
+        if workers > 1 and self.nlm_pool is None:
+            self.nlm_workers = workers
+            self.nlm_pool = ThreadPoolExecutor(
+                max_workers=workers,
+                thread_name_prefix="nlm",
+                initializer=pin_current_thread,
+                initargs=('nlm',)
+            )
+        self.nlm_thread = threading.Thread(target=self._nlm_worker_loop, name="nlm", daemon=True)
         self.nlm_thread.start()
-        print("✓ NLM thread started (Y-channel processing)")
+        log.info("NLM thread started (Y-channel processing)")
     
     def stop_nlm_thread(self):
         """Stop the NLM processing thread"""
@@ -92,24 +160,59 @@ class CorrectionEngine:
             self.latest_nlm_input = None
             self.latest_nlm_output = None
         
-        print("✓ NLM thread stopped")
+        log.info("NLM thread stopped")
+    
+    def _denoise_strip(self, y_channel, top, bottom, margin):
+        """Denoise rows [top, bottom) using `margin` extra rows of context each side"""
+        lo = max(0, top - margin)
+        hi = min(y_channel.shape[0], bottom + margin)
+        strip = cv2.fastNlMeansDenoising(
+            y_channel[lo:hi],
+            None,
+            h=self.nlm_h_luma,
+            templateWindowSize=self.nlm_template,
+            searchWindowSize=self.nlm_search
+        )
+        return strip[top - lo:top - lo + (bottom - top)]
+    
+    def _denoise_luma(self, y_channel):
+        """
+        NLM on the Y plane, split into horizontal strips across the NLM worker
+        pool. Strips overlap by the search + template radius, so every output
+        row sees the same neighbourhood as a single full-frame pass.
+        """
+        workers = self.nlm_workers if self.nlm_pool is not None else 1
+        height = y_channel.shape[0]
+        if workers <= 1:
+            return self._denoise_strip(y_channel, 0, height, 0)
+        
+        margin = self.nlm_search // 2 + self.nlm_template // 2
+        bounds = [height * i // workers for i in range(workers + 1)]
+        futures = [
+            self.nlm_pool.submit(self._denoise_strip, y_channel, bounds[i], bounds[i + 1], margin)
+            for i in range(workers)
+        ]
+        return np.vstack([f.result() for f in futures])
     
     def _nlm_worker_loop(self):
         """
         Worker thread that processes NLM denoising
         Matches C# NlmWorkerLoop() implementation
         """
-        print("NLM worker thread started (Y-channel mode)")
+        pin_current_thread('nlm')
+        log.info("NLM worker thread started (Y-channel mode)")
         
         while self.nlm_running:
             input_copy = None
             
-            # Get latest input (C# style)
+            # Take the latest input; each submitted frame is denoised once
             with self.nlm_lock:
                 if self.latest_nlm_input is not None:
-                    input_copy = self.latest_nlm_input.copy()
+                    input_copy = self.latest_nlm_input
+                    self.latest_nlm_input = None
             
             if input_copy is not None:
+                start = time.perf_counter()
                 try:
                     # Convert BGR to YCrCb
                     ycrcb = cv2.cvtColor(input_copy, cv2.COLOR_BGR2YCrCb)
@@ -118,13 +221,7 @@ class CorrectionEngine:
                     y_channel, cr_channel, cb_channel = cv2.split(ycrcb)
                     
                     # Denoise ONLY Y (luminance) channel
-                    y_denoised = cv2.fastNlMeansDenoising(
-                        y_channel,
-                        None,
-                        h=self.nlm_h_luma,
-                        templateWindowSize=self.nlm_template,
-                        searchWindowSize=self.nlm_search
-                    )
+                    y_denoised = self._denoise_luma(y_channel)
                     
                     # Merge back with original Cr, Cb
                     ycrcb_denoised = cv2.merge([y_denoised, cr_channel, cb_channel])
@@ -135,19 +232,28 @@ class CorrectionEngine:
                     # Store output (C# style)
                     with self.nlm_lock:
                         self.latest_nlm_output = denoised_bgr
+                    
+                    if self.timing_hook is not None:
+                        self.timing_hook('nlm', (time.perf_counter() - start) * 1000)
                 
                 except Exception as e:
-                    print(f"⚠️ NLM worker error: {e}")
+                    log.warning("NLM worker error: %s", e, extra={'stage': 'nlm'})
             
             else:
                 # No input, sleep briefly
                 time.sleep(0.001)
         
-        print("NLM worker thread stopped")
+        log.info("NLM worker thread stopped")
     
     def load_calibration(self, filepath):
         """Load calibration file (fixed 18-byte header)"""
-        print(f"Loading calibration: {filepath}")
+        self.set_calibration(self.read_calibration(filepath))
+        return True
+    
+    @staticmethod
+    def read_calibration(filepath):
+        """Read a calibration file into a calibration dict without installing it"""
+        log.info("Loading calibration: %s", filepath)
         
         with open(filepath, 'rb') as f:
             w = struct.unpack('<I', f.read(4))[0]
@@ -194,7 +300,7 @@ class CorrectionEngine:
                 dark_glc_g = dark_glc_data[:, :, 1].astype(np.int32).copy()
                 dark_glc_b = dark_glc_data[:, :, 2].astype(np.int32).copy()
             
-            self.calibration = {
+            calibration = {
                 'width': w,
                 'height': h,
                 'blc_r': blc_r,
@@ -213,16 +319,43 @@ class CorrectionEngine:
                 'has_dark_glc': dark_glc_flag
             }
             
-            self.is_loaded = True
-            
-            print(f"  ✓ Dimensions: {w} × {h}")
-            print(f"  ✓ BLC/SLC: Loaded")
-            print(f"  ✓ GLC: {'Loaded' if glc_flag else 'Not available'}")
-            print(f"  ✓ Dark GLC: {'Loaded' if dark_glc_flag else 'Not available'}")
+            log.info("Calibration %s: %d × %d, BLC/SLC loaded, GLC %s, Dark GLC %s", Path(filepath).name, w, h,
+                     'loaded' if glc_flag else 'not available', 'loaded' if dark_glc_flag else 'not available')
             
-            return True
+            return calibration
+    
+    def set_calibration(self, calibration):
+        """Install an already-built calibration dict (same keys as load_calibration)"""
+        # The defect map is built once and travels with the calibration (and its caches)
+        if calibration.get('defects') is None:
+            calibration['defects'] = DefectMap.from_calibration(calibration)
+            log.info("Defect map: %d pixels", len(calibration['defects']))
+        self.calibration = calibration
+        self.is_loaded = True
+    
+    PLANE_KEYS = (
+        'blc_r', 'blc_g', 'blc_b',
+        'slc_diff_r', 'slc_diff_g', 'slc_diff_b',
+        'glc_r', 'glc_g', 'glc_b',
+        'dark_glc_r', 'dark_glc_g', 'dark_glc_b'
+    )
     
-    def apply_corrections(self, frame, enable_blc_slc=True, enable_glc=True, enable_dark_glc=True, enable_nlm=False):
+    def _calibration_view(self, roi):
+        """Calibration with every plane sliced to roi=(x, y, w, h) (views, no copies)"""
+        calib = self.calibration
+        if roi is None:
+            return calib
+        
+        x, y, w, h = roi
+        view = dict(calib)
+        for key in self.PLANE_KEYS:
+            plane = calib[key]
+            if plane is not None:
+                view[key] = plane[y:y + h, x:x + w]
+        return view
+    
+    def apply_corrections(self, frame, enable_blc_slc=True, enable_glc=True, enable_dark_glc=True, enable_nlm=False, roi=None,
+                          enable_defects=True):
         """
         Apply corrections to frame (in-place modification for speed)
         
@@ -232,6 +365,8 @@ class CorrectionEngine:
             enable_glc: Enable GLC correction
             enable_dark_glc: Enable Dark GLC correction
             enable_nlm: Enable NLM denoising (Y-channel, threaded)
+            roi: (x, y, w, h) when frame is a crop of the full sensor frame
+            enable_defects: Replace hot/dead pixels (after BLC/SLC)
             
         Returns:
             frame: Corrected frame
@@ -239,14 +374,15 @@ class CorrectionEngine:
         if not self.is_loaded:
             return frame
         
-        calib = self.calibration
+        fast = _ensure_kernels()
+        calib = self._calibration_view(roi)
         
         if not frame.flags['C_CONTIGUOUS']:
             frame = np.ascontiguousarray(frame)
         
         # Stage 1: BLC/SLC
         if enable_blc_slc:
-            if FAST_MODE:
+            if fast:
                 apply_blc_slc_fast(
                     frame,
                     calib['blc_r'],
@@ -267,8 +403,12 @@ class CorrectionEngine:
                     calib['slc_diff_b']
                 )
         
+        # Stage 1b: hot/dead pixels (sparse, cost ~ number of defects)
+        if enable_defects and calib.get('defects') is not None:
+            calib['defects'].apply(frame, roi)
+        
         # Stage 2: GLC
-        if enable_glc and calib['has_glc'] and FAST_MODE:
+        if enable_glc and calib['has_glc'] and fast:
             apply_glc_fast(
                 frame,
                 calib['glc_r'],
@@ -277,7 +417,7 @@ class CorrectionEngine:
             )
         
         # Stage 3: Dark GLC
-        if enable_dark_glc and calib['has_dark_glc'] and FAST_MODE:
+        if enable_dark_glc and calib['has_dark_glc'] and fast:
             apply_dark_glc_fast(
                 frame,
                 calib['dark_glc_r'],
@@ -292,8 +432,10 @@ class CorrectionEngine:
                 self.start_nlm_thread()
             
             # Send frame to NLM thread (C# style - just update latest)
-            with self.nlm_lock:
-                self.latest_nlm_input = frame.copy()
+            self.nlm_frame_counter += 1
+            if self.nlm_frame_counter % self.nlm_interval == 0:
+                with self.nlm_lock:
+                    self.latest_nlm_input = frame.copy()
             
             # Get latest denoised output (C# style - if available)
             with self.nlm_lock:
@@ -308,16 +450,47 @@ class CorrectionEngine:
         return frame
 
 
+def interpolate_calibration(low, high, t):
+    """
+    Per-pixel linear blend of two calibrations: low + (high - low) * t, t in [0, 1]
+    GLC / Dark GLC are only kept when both sides have them.
+    """
+    calibration = {
+        'width': low['width'],
+        'height': low['height'],
+        'has_glc': bool(low['has_glc'] and high['has_glc']),
+        'has_dark_glc': bool(low['has_dark_glc'] and high['has_dark_glc'])
+    }
+    
+    for key in CorrectionEngine.PLANE_KEYS:
+        a, b = low[key], high[key]
+        if a is None or b is None:
+            calibration[key] = None
+            continue
+        blend = b.astype(np.float32)
+        blend -= a
+        blend *= t
+        blend += a
+        calibration[key] = np.rint(blend, out=blend).astype(np.int32)
+    
+    # Keep the divisor valid, as load_calibration does
+    for ch in 'rgb':
+        np.maximum(calibration[f'slc_diff_{ch}'], 1, out=calibration[f'slc_diff_{ch}'])
+    return calibration
+
+
 correction_engine = CorrectionEngine()
 
 def load_calibration(filepath):
     """Load calibration file"""
     return correction_engine.load_calibration(filepath)
 
-def apply_corrections(frame, enable_blc_slc=True, enable_glc=True, enable_dark_glc=True, enable_nlm=False):
+def apply_corrections(frame, enable_blc_slc=True, enable_glc=True, enable_dark_glc=True, enable_nlm=False, roi=None,
+                      enable_defects=True):
     """Apply corrections to frame"""
-    return correction_engine.apply_corrections(frame, enable_blc_slc, enable_glc, enable_dark_glc, enable_nlm)
+    return correction_engine.apply_corrections(frame, enable_blc_slc, enable_glc, enable_dark_glc, enable_nlm, roi,
+                                               enable_defects)
 
 def is_fast_mode():
-    """Check if fast mode is available"""
-    return FAST_MODE
\ No newline at end of file
+    """Check if fast mode is available (loads the kernels if not yet loaded)"""
+    return _ensure_kernels()
\ No newline at end of file
@@ -0,0 +1,117 @@
+"""
+Defect map - sparse hot/dead pixel correction
+Defective pixels are found once per calibration from the BLC/SLC planes:
+
+  hot  - dark level (BLC) far above its 3x3 neighbourhood (stuck/saturating)
+  dead - flat response (SLC - BLC) far below its 3x3 neighbourhood
+
+A pixel is defective in all channels if any channel is flagged. Only the
+coordinates are kept; per frame, each defect is replaced by the median of
+its valid (in-frame, non-defective) 8-neighbours. Defects are grouped by
+neighbour count, so the work is a few gathers proportional to the number
+of defects, not the frame area. Which neighbours are themselves defective
+is looked up once from the coordinates, so a new ROI (every digital zoom or
+pan tick) only re-filters the defects, without any full-frame buffer.
+"""
+import cv2
+import numpy as np
+from config import *
+from app_logging import get_logger
+
+log = get_logger('corrections')
+
+NEIGHBOUR_DY = np.array([-1, -1, -1, 0, 0, 1, 1, 1], dtype=np.int64)
+NEIGHBOUR_DX = np.array([-1, 0, 1, -1, 1, -1, 0, 1], dtype=np.int64)
+
+
+def _local_median(plane):
+    return cv2.medianBlur(np.clip(plane, 0, 65535).astype(np.uint16), 3).astype(np.int32)
+
+
+def find_defects(calibration):
+    """(ys, xs) of defective pixels from the calibration's BLC/SLC planes"""
+    height, width = calibration['height'], calibration['width']
+    mask = np.zeros((height, width), dtype=bool)
+    for ch in 'rgb':
+        blc = calibration[f'blc_{ch}']
+        response = calibration[f'slc_diff_{ch}']
+        mask |= (blc - _local_median(blc)) > DEFECT_HOT_THRESHOLD
+        mask |= response < _local_median(response) * DEFECT_MIN_RESPONSE
+    ys, xs = np.nonzero(mask)
+    return ys.astype(np.int64), xs.astype(np.int64)
+
+
+class DefectMap:
+    def __init__(self, ys, xs):
+        self.ys = ys
+        self.xs = xs
+        self._groups_key = None
+        self._groups = []
+        self.unfixable = 0   # defects without a single valid neighbour
+        self.neighbour_defective = self._neighbour_defects()
+
+    @classmethod
+    def from_calibration(cls, calibration):
+        ys, xs = find_defects(calibration)
+        total = calibration['height'] * calibration['width']
+        if len(ys) > total * DEFECT_MAX_FRACTION:
+            log.warning("Defect map: %d defects (%.1f%%) - calibration looks wrong, map disabled",
+                        len(ys), 100 * len(ys) / total)
+            ys = xs = np.zeros(0, dtype=np.int64)
+        return cls(ys, xs)
+
+    def __len__(self):
+        return len(self.ys)
+
+    def _neighbour_defects(self):
+        """(N, 8) bool: which 8-neighbours of each defect are defective themselves"""
+        if not len(self.ys):
+            return np.zeros((0, 8), dtype=bool)
+        # Padded flat keys (x + 1 < stride), so -1 / +1 neighbours never wrap into another row
+        stride = int(self.xs.max()) + 3
+        keys = np.sort((self.ys + 1) * stride + (self.xs + 1))
+        neighbour_keys = (self.ys[:, None] + NEIGHBOUR_DY + 1) * stride + (self.xs[:, None] + NEIGHBOUR_DX + 1)
+        pos = np.minimum(np.searchsorted(keys, neighbour_keys), len(keys) - 1)
+        return keys[pos] == neighbour_keys
+
+    def _build_groups(self, shape, roi):
+        """Flat target / neighbour indices for a frame of `shape` at `roi` offset"""
+        height, width = shape[:2]
+        x0, y0 = (roi[0], roi[1]) if roi is not None else (0, 0)
+        ys = self.ys - y0
+        xs = self.xs - x0
+        inside = (ys >= 0) & (ys < height) & (xs >= 0) & (xs < width)
+        ys, xs = ys[inside], xs[inside]
+
+        ny = ys[:, None] + NEIGHBOUR_DY
+        nx = xs[:, None] + NEIGHBOUR_DX
+        valid = (ny >= 0) & (ny < height) & (nx >= 0) & (nx < width) & ~self.neighbour_defective[inside]
+        neighbours = ny * width + nx
+        targets = ys * width + xs
+
+        counts = valid.sum(axis=1)
+        groups = []
+        for k in range(1, 9):
+            selected = counts == k
+            if selected.any():
+                groups.append((targets[selected], neighbours[selected][valid[selected]].reshape(-1, k)))
+        self.unfixable = int(np.count_nonzero(counts == 0))
+        return groups
+
+    def apply(self, frame, roi=None):
+        """Replace defects in `frame` (in place; C-contiguous BGR) with the median of valid neighbours"""
+        if not len(self.ys):
+            return frame
+
+        key = (frame.shape, roi)
+        if key != self._groups_key:
+            self._groups = self._build_groups(frame.shape, roi)
+            self._groups_key = key
+
+        pixels = frame.reshape(-1, frame.shape[2])
+        for targets, neighbours in self._groups:
+            pixels[targets] = np.rint(np.median(pixels[neighbours], axis=1))
+        return frame
+
+    def get_stats(self):
+        return {'defects': len(self.ys), 'unfixable': self.unfixable}
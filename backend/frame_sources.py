@@ -0,0 +1,327 @@
+"""
+Frame sources - pluggable inputs for CameraHandler
+Every source exposes the subset of the cv2.VideoCapture interface the pipeline
+uses (isOpened/grab/retrieve/read/get/set/release), so the whole
+correction -> normalization -> encode pipeline can run without a camera.
+
+  DeviceSource    - physical camera (V4L2 / DirectShow / auto)
+  FileSource      - video file or directory of images, looped
+  SyntheticSource - deterministic gradients + noise at any resolution
+"""
+import abc
+import cv2
+import numpy as np
+import platform
+import time
+from pathlib import Path
+from config import *
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff')
+
+
+class FrameSource(abc.ABC):
+    """Base class: property store + optional real-time pacing"""
+    name = "source"
+    
+    def __init__(self, fps=FPS, pacing=CAMERA_SOURCE_PACING):
+        self.fps = fps
+        self.pacing = pacing
+        self.frame_index = 0
+        self.opened = True
+        self.next_deadline = None
+        self.props = {
+            cv2.CAP_PROP_FPS: fps,
+            cv2.CAP_PROP_BRIGHTNESS: BRIGHTNESS_DEFAULT,
+            cv2.CAP_PROP_ZOOM: 5,
+            cv2.CAP_PROP_FOCUS: 150,
+            cv2.CAP_PROP_PAN: 0,
+            cv2.CAP_PROP_TILT: 0,
+            cv2.CAP_PROP_AUTOFOCUS: 0,
+        }
+    
+    def _pace(self):
+        """Sleep until the next frame is due (realtime pacing only)"""
+        if self.pacing != "realtime" or self.fps <= 0:
+            return
+        now = time.perf_counter()
+        if self.next_deadline is None or now - self.next_deadline > 1.0:
+            self.next_deadline = now
+        delay = self.next_deadline - now
+        if delay > 0:
+            time.sleep(delay)
+        self.next_deadline += 1.0 / self.fps
+    
+    def isOpened(self):
+        return self.opened
+    
+    @abc.abstractmethod
+    def grab(self):
+        """Capture the next frame; False when none is available"""
+    
+    @abc.abstractmethod
+    def retrieve(self):
+        """(success, frame) for the last grabbed frame"""
+    
+    def read(self):
+        if not self.grab():
+            return False, None
+        return self.retrieve()
+    
+    def get(self, prop):
+        return self.props.get(prop, 0)
+    
+    def set(self, prop, value):
+        self.props[prop] = value
+        return True
+    
+    def release(self):
+        self.opened = False
+
+
+class DeviceSource:
+    """Physical camera; thin wrapper over cv2.VideoCapture with the platform backend"""
+    name = "device"
+    
+    def __init__(self, index=CAMERA_INDEX):
+        if platform.system() == "Windows":
+            backend = cv2.CAP_DSHOW
+            self.backend_name = "DirectShow"
+        elif platform.system() == "Linux":
+            backend = cv2.CAP_V4L2
+            self.backend_name = "V4L2"
+        else:
+            backend = cv2.CAP_ANY
+            self.backend_name = "Auto"
+        
+        print(f"Opening camera with {self.backend_name} backend...")
+        self.index = index
+        self.cap = cv2.VideoCapture(index, backend)
+    
+    def __getattr__(self, name):
+        # isOpened/grab/retrieve/read/get/set/release go straight to VideoCapture
+        return getattr(self.cap, name)
+
+
+class FileSource(FrameSource):
+    """Video file or image directory, looped; pacing at the file's fps (or FPS)"""
+    name = "file"
+    
+    def __init__(self, path, fps=None, pacing=CAMERA_SOURCE_PACING, loop=True):
+        self.path = Path(path)
+        self.loop = loop
+        self.capture = None
+        self.images = None
+        self.current = None
+        
+        if self.path.is_dir():
+            self.images = sorted(p for p in self.path.iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS)
+            opened = len(self.images) > 0
+            native_fps = FPS
+        else:
+            self.capture = cv2.VideoCapture(str(self.path))
+            opened = self.capture.isOpened()
+            native_fps = self.capture.get(cv2.CAP_PROP_FPS) if opened else 0
+        
+        super().__init__(fps=fps or native_fps or FPS, pacing=pacing)
+        self.opened = opened
+        if not opened:
+            print(f"❌ File source has no readable frames: {self.path}")
+    
+    def grab(self):
+        if not self.opened:
+            return False
+        self._pace()
+        
+        if self.images is not None:
+            if self.frame_index >= len(self.images):
+                if not self.loop:
+                    return False
+                self.frame_index = 0
+            self.current = self.images[self.frame_index]
+            self.frame_index += 1
+            return True
+        
+        if not self.capture.grab():
+            if not self.loop:
+                return False
+            self.capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            if not self.capture.grab():
+                return False
+        self.frame_index += 1
+        return True
+    
+    def retrieve(self):
+        if self.images is not None:
+            frame = cv2.imread(str(self.current), cv2.IMREAD_COLOR)
+            return frame is not None, frame
+        return self.capture.retrieve()
+    
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FRAME_WIDTH or prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            if self.capture is not None:
+                return self.capture.get(prop)
+            if self.images:
+                frame = cv2.imread(str(self.images[0]), cv2.IMREAD_COLOR)
+                if frame is not None:
+                    return frame.shape[1] if prop == cv2.CAP_PROP_FRAME_WIDTH else frame.shape[0]
+            return 0
+        return super().get(prop)
+    
+    def set(self, prop, value):
+        if prop in (cv2.CAP_PROP_FRAME_WIDTH, cv2.CAP_PROP_FRAME_HEIGHT, cv2.CAP_PROP_FPS):
+            return False  # fixed by the file
+        return super().set(prop, value)
+    
+    def release(self):
+        super().release()
+        if self.capture is not None:
+            self.capture.release()
+
+
+class SyntheticSource(FrameSource):
+    """
+    Deterministic test pattern: diagonal RGB gradients scrolling one column per
+    frame, plus noise from a pre-generated bank (same seed = same frames).
+    With stamp=True the frame counter is drawn into the pixels (see
+    decode_stamp) and the capture time of each stamped frame is kept.
+    """
+    name = "synthetic"
+    NOISE_BANK = 8
+    STAMP_BITS = 24
+    STAMP_BLOCK = 16
+    STAMP_HISTORY = 4096
+    
+    def __init__(self, width=None, height=None, fps=None, pacing=CAMERA_SOURCE_PACING, seed=0, noise=8, stamp=False):
+        super().__init__(fps=fps or FPS, pacing=pacing)
+        # Size / fps given in the spec win over the pipeline's cap.set() calls
+        self.fixed_size = width is not None and height is not None
+        self.fixed_fps = fps is not None
+        self.width = width or VIDEO_WIDTH
+        self.height = height or VIDEO_HEIGHT
+        self.seed = seed
+        self.noise = noise
+        self.stamp = stamp
+        self.stamp_times = {}
+        self.base = None
+        self.noise_bank = None
+        self.frame = None
+    
+    def _build_pattern(self):
+        h, w = self.height, self.width
+        ys = np.linspace(0, 1, h, dtype=np.float32)[:, None]
+        xs = np.linspace(0, 1, w, dtype=np.float32)[None, :]
+        base = np.empty((h, w, 3), dtype=np.uint8)
+        base[:, :, 0] = (255 * (1 - xs) * ys).astype(np.uint8)          # B
+        base[:, :, 1] = (255 * (0.5 + 0.5 * np.sin(6.283 * (xs + ys)))).astype(np.uint8)  # G
+        base[:, :, 2] = (255 * xs * np.ones_like(ys)).astype(np.uint8)   # R
+        self.base = base
+        
+        rng = np.random.default_rng(self.seed)
+        self.noise_bank = [
+            rng.integers(0, self.noise + 1, size=(h, w, 3), dtype=np.uint8)
+            for _ in range(self.NOISE_BANK)
+        ]
+    
+    def grab(self):
+        if not self.opened:
+            return False
+        if self.base is None or self.base.shape[:2] != (self.height, self.width):
+            self._build_pattern()
+        self._pace()
+        
+        shift = self.frame_index % self.width
+        frame = np.roll(self.base, shift, axis=1)
+        cv2.add(frame, self.noise_bank[self.frame_index % self.NOISE_BANK], dst=frame)
+        if self.stamp:
+            self._draw_stamp(frame, self.frame_index)
+        self.frame = frame
+        self.frame_index += 1
+        return True
+    
+    def _draw_stamp(self, frame, counter):
+        """Frame counter as a row of black/white blocks (JPEG- and LUT-safe)"""
+        block = self.STAMP_BLOCK
+        for bit in range(self.STAMP_BITS):
+            x = block * (bit + 1)
+            value = 255 if (counter >> bit) & 1 else 0
+            frame[block:2 * block, x:x + block] = value
+        
+        self.stamp_times[counter] = time.time()
+        if len(self.stamp_times) > self.STAMP_HISTORY:
+            self.stamp_times.pop(counter - self.STAMP_HISTORY, None)
+    
+    def retrieve(self):
+        if self.frame is None:
+            return False, None
+        frame, self.frame = self.frame, None
+        return True, frame
+    
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return self.width
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return self.height
+        return super().get(prop)
+    
+    def set(self, prop, value):
+        if prop == cv2.CAP_PROP_FRAME_WIDTH or prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            if self.fixed_size:
+                return False
+            if prop == cv2.CAP_PROP_FRAME_WIDTH:
+                self.width = int(value)
+            else:
+                self.height = int(value)
+            return True
+        if prop == cv2.CAP_PROP_FPS:
+            if self.fixed_fps:
+                return False
+            self.fps = float(value)
+        if prop == cv2.CAP_PROP_FOURCC or prop == cv2.CAP_PROP_CONVERT_RGB:
+            return False  # always delivers BGR
+        return super().set(prop, value)
+
+
+def open_source(spec=CAMERA_SOURCE, pacing=CAMERA_SOURCE_PACING):
+    """
+    Create a frame source from a spec string:
+      device | device:<index> | file:<path> | synthetic | synthetic:<W>x<H>[@fps][,stamp]
+    """
+    kind, _, arg = spec.partition(":")
+    
+    if kind == "device":
+        return DeviceSource(int(arg) if arg else CAMERA_INDEX)
+    
+    if kind == "file":
+        if not arg:
+            raise ValueError("file source needs a path: file:<video or image dir>")
+        return FileSource(arg, pacing=pacing)
+    
+    if kind == "synthetic":
+        width = height = fps = None
+        arg, *flags = arg.split(",")
+        if arg:
+            size, _, rate = arg.partition("@")
+            if size:
+                width, height = (int(v) for v in size.lower().split("x"))
+            if rate:
+                fps = float(rate)
+        return SyntheticSource(width, height, fps=fps, pacing=pacing, stamp="stamp" in flags)
+    
+    raise ValueError(f"Unknown camera source: {spec}")
+
+
+def decode_stamp(frame, flipped=False):
+    """Read the SyntheticSource frame counter back out of a (decoded) frame"""
+    block = SyntheticSource.STAMP_BLOCK
+    width = frame.shape[1]
+    gray = frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    
+    counter = 0
+    for bit in range(SyntheticSource.STAMP_BITS):
+        x = block * (bit + 1)
+        if flipped:
+            x = width - x - block
+        cell = gray[block + 4:2 * block - 4, x + 4:x + block - 4]
+        if cell.mean() > 127:
+            counter |= 1 << bit
+    return counter
@@ -0,0 +1,166 @@
+"""
+Frame stacker - low-light noise reduction by stacking corrected frames
+Frames are added into a preallocated uint16 accumulator; every frame costs
+one add (plus one subtract and one copy into the ring buffer in sliding
+mode), however deep the stack is.
+
+Modes:
+  sliding - window over the last N frames, output every STACK_OUTPUT_INTERVAL frames
+  block   - N frames per output, then start over (output rate = fps / N)
+
+Combine:
+  mean    - accumulator / N (noise drops by ~sqrt(N), brightness unchanged)
+  sum     - accumulator scaled so mean brightness reaches STACK_SUM_TARGET
+            (gain between 1/N and 1, i.e. never darker than the mean and
+            never brighter than the plain sum)
+"""
+import threading
+import numpy as np
+from config import *
+from app_logging import get_logger
+
+log = get_logger('pipeline')
+
+MODES = ('sliding', 'block')
+COMBINES = ('mean', 'sum')
+
+
+class FrameStacker:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.enabled = False
+        self.depth = STACK_DEPTH
+        self.mode = STACK_MODE
+        self.combine = STACK_COMBINE
+        self.output_interval = STACK_OUTPUT_INTERVAL
+
+        # Buffers (allocated for the current frame shape)
+        self.shape = None
+        self.accumulator = None   # uint16 running sum
+        self.ring = None          # last N frames (sliding mode)
+        self.scratch = None       # float32 for the combine step
+        self.count = 0            # frames currently in the accumulator
+        self.position = 0         # next ring slot
+        self.since_output = 0
+        self.gain = None          # smoothed sum-mode gain
+
+        # Stats
+        self.frames_in = 0
+        self.frames_out = 0
+
+    def configure(self, enabled=None, depth=None, mode=None, combine=None, output_interval=None):
+        if mode is not None and mode not in MODES:
+            raise ValueError(f"Unknown stacking mode: {mode} (use {', '.join(MODES)})")
+        if combine is not None and combine not in COMBINES:
+            raise ValueError(f"Unknown stacking combine: {combine} (use {', '.join(COMBINES)})")
+
+        with self.lock:
+            if enabled is not None:
+                self.enabled = enabled
+            if depth is not None:
+                self.depth = max(2, min(STACK_MAX_DEPTH, int(depth)))
+            if mode is not None:
+                self.mode = mode
+            if combine is not None:
+                self.combine = combine
+            if output_interval is not None:
+                self.output_interval = max(1, int(output_interval))
+            self.shape = None   # reallocate / restart on the next frame
+
+        state = f"{self.mode} {self.combine} x{self.depth}" if self.enabled else "off"
+        log.info("Frame stacking: %s", state)
+        return self.get_status()
+
+    def reset(self):
+        """Drop the stacked history (e.g. after a brightness change)"""
+        with self.lock:
+            self.shape = None
+
+    def _allocate(self, shape):
+        self.shape = shape
+        self.accumulator = np.zeros(shape, dtype=np.uint16)
+        self.scratch = np.empty(shape, dtype=np.float32)
+        self.ring = np.empty((self.depth,) + shape, dtype=np.uint8) if self.mode == 'sliding' else None
+        self.count = 0
+        self.position = 0
+        self.since_output = 0
+        self.gain = None
+
+    def add(self, frame):
+        """Add a corrected frame; returns the stacked frame when one is due, else None"""
+        with self.lock:
+            if frame.shape != self.shape:
+                self._allocate(frame.shape)
+            self.frames_in += 1
+
+            np.add(self.accumulator, frame, out=self.accumulator, casting='unsafe')
+            if self.mode == 'sliding':
+                if self.count == self.depth:
+                    # Window full: the oldest frame leaves as the new one enters
+                    np.subtract(self.accumulator, self.ring[self.position], out=self.accumulator, casting='unsafe')
+                else:
+                    self.count += 1
+                np.copyto(self.ring[self.position], frame)
+                self.position = (self.position + 1) % self.depth
+
+                self.since_output += 1
+                if self.count < self.depth or self.since_output < self.output_interval:
+                    return None
+                self.since_output = 0
+                output = self._combine()
+            else:
+                self.count += 1
+                if self.count < self.depth:
+                    return None
+                output = self._combine()
+                self.accumulator.fill(0)
+                self.count = 0
+
+            self.frames_out += 1
+            return output
+
+    def _combine(self):
+        if self.combine == 'mean':
+            scale = 1.0 / self.count
+        else:
+            # Mean brightness from a sparse grid of the accumulator
+            level = float(self.accumulator[::8, ::8].mean()) or 1.0
+            target = min(1.0, max(1.0 / self.count, STACK_SUM_TARGET / level))
+            self.gain = target if self.gain is None else self.gain + 0.2 * (target - self.gain)
+            scale = self.gain
+
+        np.multiply(self.accumulator, scale, out=self.scratch)
+        np.minimum(self.scratch, 255, out=self.scratch)
+        np.rint(self.scratch, out=self.scratch)
+        output = np.empty(self.shape, dtype=np.uint8)
+        np.copyto(output, self.scratch, casting='unsafe')
+        return output
+
+    def output_divisor(self):
+        """Captured frames per stacked output (1 when stacking is off)"""
+        if not self.enabled:
+            return 1
+        return self.output_interval if self.mode == 'sliding' else self.depth
+
+    def get_summary(self):
+        """Settings only, for /status (changes only on configure)"""
+        return {
+            'enabled': self.enabled,
+            'depth': self.depth,
+            'mode': self.mode,
+            'combine': self.combine,
+            'output_interval': self.output_interval if self.mode == 'sliding' else self.depth,
+        }
+
+    def get_status(self):
+        return {
+            'enabled': self.enabled,
+            'depth': self.depth,
+            'mode': self.mode,
+            'combine': self.combine,
+            'output_interval': self.output_interval if self.mode == 'sliding' else self.depth,
+            'stacked': self.count,
+            'gain': round(self.gain, 3) if self.gain is not None else None,
+            'frames_in': self.frames_in,
+            'frames_out': self.frames_out,
+        }
@@ -1,85 +1,62 @@
 import cv2
 import numpy as np
 import threading
-import time
+
+# Band size for the fused LUT + flip pass (fits in L2 on the Pi and desktop CPUs)
+POST_PROCESS_BAND_BYTES = 256 * 1024
+
+
+def histogram_rgb(frame):
+    """(3, 256) uint32 bin counts in R, G, B order for a BGR frame"""
+    return np.stack([
+        cv2.calcHist([frame], [2], None, [256], [0, 256]).ravel(),
+        cv2.calcHist([frame], [1], None, [256], [0, 256]).ravel(),
+        cv2.calcHist([frame], [0], None, [256], [0, 256]).ravel()
+    ]).astype(np.uint32)
+
 
 class HistogramProcessor:
     def __init__(self):
         self.min_value = 0
         self.max_value = 255
+        self.gamma = 1.0
+        self.contrast = 1.0
         self.nlm_enabled = False
-        
-        # Threading for histogram normalization (similar to NLM approach)
-        self.hist_lock = threading.Lock()
-        self.hist_thread = None
-        self.hist_running = False
         self.hist_normalization_enabled = False
         
-        # Latest frame buffers
-        self.latest_hist_input = None
-        self.latest_hist_output = None
-        
-    def start_hist_thread(self):
-        """Start the histogram normalization thread"""
-        if self.hist_thread is not None and self.hist_thread.is_alive():
-            return
-        
-        self.hist_running = True
-        self.hist_thread = threading.Thread(target=self._hist_worker_loop, daemon=True)
-        self.hist_thread.start()
-        print("✓ Histogram normalization thread started")
+        # Composed 256-entry LUT, rebuilt only when the tone settings change
+        self.lut_lock = threading.Lock()
+        self.lut = None
+        self.lut_key = None
     
-    def stop_hist_thread(self):
-        """Stop the histogram normalization thread"""
-        self.hist_running = False
-        if self.hist_thread is not None:
-            self.hist_thread.join(timeout=1.0)
-        
-        with self.hist_lock:
-            self.latest_hist_input = None
-            self.latest_hist_output = None
-        
-        print("✓ Histogram normalization thread stopped")
+    def _tone_key(self):
+        return (self.min_value, self.max_value, self.gamma, self.contrast)
     
-    def _hist_worker_loop(self):
-        """Worker thread for histogram normalization (async processing)"""
-        print("Histogram normalization worker thread started")
-        
-        while self.hist_running:
-            input_copy = None
-            
-            # Get latest input
-            with self.hist_lock:
-                if self.latest_hist_input is not None:
-                    input_copy = self.latest_hist_input.copy()
-            
-            if input_copy is not None:
-                try:
-                    # Apply normalization
-                    normalized = self._apply_normalization_internal(input_copy)
-                    
-                    # Store output
-                    with self.hist_lock:
-                        self.latest_hist_output = normalized
-                
-                except Exception as e:
-                    print(f"⚠️ Histogram worker error: {e}")
-            
-            else:
-                # No input, sleep briefly
-                time.sleep(0.001)
-        
-        print("Histogram normalization worker thread stopped")
+    def _build_lut(self, key):
+        """Compose stretch (min/max), gamma and contrast into one uint8 table"""
+        min_value, max_value, gamma, contrast = key
+        if key == (0, 255, 1.0, 1.0):
+            return None
+        
+        x = np.arange(256, dtype=np.float32)
+        y = (x - min_value) * 255.0 / (max_value - min_value)
+        y = np.clip(y, 0, 255)
+        
+        if gamma != 1.0:
+            y = 255.0 * np.power(y / 255.0, 1.0 / gamma)
+        if contrast != 1.0:
+            y = np.clip((y - 127.5) * contrast + 127.5, 0, 255)
+        
+        return y.astype(np.uint8)
     
-    def _apply_normalization_internal(self, frame):
-        """Internal normalization function (called by worker thread)"""
-        if self.min_value == 0 and self.max_value == 255:
-            return frame
-        
-        frame = frame.astype(np.float32)
-        frame = (frame - self.min_value) * 255.0 / (self.max_value - self.min_value)
-        frame = np.clip(frame, 0, 255).astype(np.uint8)
-        return frame
+    def get_lut(self):
+        """Current LUT (None = identity); rebuilt lazily after a settings change"""
+        key = self._tone_key()
+        with self.lut_lock:
+            if key != self.lut_key:
+                self.lut = self._build_lut(key)
+                self.lut_key = key
+            return self.lut
     
     def set_min_max(self, min_val, max_val):
         self.min_value = max(0, min(255, min_val))
@@ -87,9 +64,19 @@ class HistogramProcessor:
         if self.min_value >= self.max_value:
             self.max_value = self.min_value + 1
         
-        # Enable threading if non-default range
         self.hist_normalization_enabled = (self.min_value != 0 or self.max_value != 255)
     
+    def set_tone(self, gamma=None, contrast=None):
+        """Gamma / contrast adjustments, folded into the same LUT"""
+        if gamma is not None:
+            self.gamma = max(0.1, min(10.0, float(gamma)))
+        if contrast is not None:
+            self.contrast = max(0.0, min(4.0, float(contrast)))
+    
+    def is_identity(self):
+        """True when post-processing would not change pixel values"""
+        return self.get_lut() is None
+    
     def set_nlm(self, enabled):
         self.nlm_enabled = enabled
     
@@ -98,48 +85,58 @@ class HistogramProcessor:
             return frame
         return cv2.fastNlMeansDenoisingColored(frame, None, 10, 10, 7, 21)
     
-    def apply_normalization(self, frame):
-        """Apply normalization (threaded if enabled, otherwise instant)"""
-        
-        # Check if normalization is needed
-        if not self.hist_normalization_enabled:
+    def apply_post_processing(self, frame, flip=False):
+        """
+        Single post-processing stage: LUT (stretch/gamma/contrast) + optional
+        horizontal flip, once per frame. Works in-place on the frame buffer.
+        With both active the frame is walked once in bands of rows: each band
+        is looked up and then flipped while it is still in cache (the flip is
+        row-local), instead of two full-frame passes.
+        """
+        lut = self.get_lut()
+        
+        if lut is None:
+            if flip:
+                cv2.flip(frame, 1, dst=frame)
             return frame
         
-        # Start thread if not running
-        if not self.hist_running:
-            self.start_hist_thread()
-        
-        # Send frame to worker thread
-        with self.hist_lock:
-            self.latest_hist_input = frame.copy()
+        if not flip:
+            cv2.LUT(frame, lut, dst=frame)
+            return frame
         
-        # Get latest normalized output (if available)
-        with self.hist_lock:
-            if self.latest_hist_output is not None:
-                return self.latest_hist_output.copy()
+        rows = max(1, POST_PROCESS_BAND_BYTES // max(1, frame[0].nbytes))
+        for y in range(0, frame.shape[0], rows):
+            band = frame[y:y + rows]
+            cv2.LUT(band, lut, dst=band)
+            cv2.flip(band, 1, dst=band)
         
-        # No output yet, return original frame
         return frame
     
+    def apply_normalization(self, frame):
+        """Apply min/max normalization (LUT) without flip"""
+        return self.apply_post_processing(frame, flip=False)
+    
     def apply_normalization_sync(self, frame):
-        """Synchronous normalization (for when you need guaranteed processing)"""
-        return self._apply_normalization_internal(frame)
+        """Kept for callers of the old threaded API; normalization is now always synchronous"""
+        return self.apply_normalization(frame)
     
-    def calculate_histogram(self, frame):
-        hist_r = cv2.calcHist([frame], [2], None, [256], [0, 256])
-        hist_g = cv2.calcHist([frame], [1], None, [256], [0, 256])
-        hist_b = cv2.calcHist([frame], [0], None, [256], [0, 256])
-        
-        hist_r = hist_r.flatten().tolist()
-        hist_g = hist_g.flatten().tolist()
-        hist_b = hist_b.flatten().tolist()
+    def calculate_histogram(self, frame, hist=None):
+        """Histogram as R/G/B lists; pass `hist` (from histogram_rgb) to skip the frame pass"""
+        if hist is None:
+            hist = histogram_rgb(frame)
         
         return {
-            'r': hist_r,
-            'g': hist_g,
-            'b': hist_b
+            'r': hist[0].tolist(),
+            'g': hist[1].tolist(),
+            'b': hist[2].tolist()
         }
     
+    def calculate_histogram_packed(self, frame, hist=None):
+        """Histogram as 768 little-endian uint32 (R, G, B bins) for binary push"""
+        if hist is None:
+            hist = histogram_rgb(frame)
+        return hist.astype('<u4').tobytes()
+    
     def process_frame(self, frame):
         if self.nlm_enabled:
             frame = self.apply_nlm(frame)
@@ -147,4 +144,4 @@ class HistogramProcessor:
         if self.hist_normalization_enabled:
             frame = self.apply_normalization(frame)
         
-        return frame
\ No newline at end of file
+        return frame
@@ -0,0 +1,298 @@
+"""
+Load governor - hold the target FPS by degrading in steps instead of lagging
+Pipeline stages report their per-frame time and every published frame reports
+its age (publish time - capture time). The governor only steps down when the
+output is actually behind: frames older than GOVERNOR_MAX_FRAME_AGE_MS, or
+output FPS below GOVERNOR_MIN_FPS_RATIO of what the camera delivers. It then
+activates the first inactive rung of GOVERNOR_LADDER that relieves a stage
+over its budget; when no rung addresses the slow stage nothing is degraded.
+With clear headroom for long enough the most recent rung is restored.
+Decisions are taken per published frame and, so that a complete output stall
+is still noticed, by a watchdog thread every GOVERNOR_INTERVAL while the
+pipeline runs.
+
+Rungs (and the stage each relieves):
+  nlm_rate              - fraction of frames sent to NLM (0.5 = every 2nd)  [nlm]
+  histogram_decimation  - divide histogram push/compute rate by N          [histogram]
+  jpeg_quality          - stream JPEG quality                              [encode]
+  stream_scale          - stream resolution factor                         [encode]
+
+Stage budgets: the frame budget (1000 / target FPS), except NLM. The NLM
+worker is asynchronous and always picks up the latest frame, so it never
+holds back the output by itself; it has its own GOVERNOR_NLM_BUDGET_MS.
+"""
+import threading
+import time
+from collections import deque
+from config import *
+from app_logging import get_logger
+
+log = get_logger('governor')
+
+STAGES = ('processing', 'post', 'encode', 'histogram', 'nlm')
+RUNG_STAGES = {
+    'nlm_rate': ('nlm',),
+    'histogram_decimation': ('histogram',),
+    'jpeg_quality': ('encode',),
+    'stream_scale': ('encode',),
+}
+
+
+class LoadGovernor:
+    def __init__(self, target_fps=GOVERNOR_TARGET_FPS, ladder=GOVERNOR_LADDER):
+        self.enabled = GOVERNOR_ENABLED
+        self.target_fps = target_fps
+        self.budget_ms = 1000.0 / target_fps
+        self.stage_budget_ms = {stage: self.budget_ms for stage in STAGES}
+        self.stage_budget_ms['nlm'] = GOVERNOR_NLM_BUDGET_MS
+        self.ladder = list(ladder)
+        self.active = []            # ladder indices, in activation order
+        self.lock = threading.Lock()
+
+        # Smoothed measurements
+        self.stage_ms = {stage: 0.0 for stage in STAGES}
+        self.frame_age_ms = 0.0
+        self.output_fps = 0.0
+        self.last_output = None
+        self.output_divisor = 1     # outputs per captured frame drop by design (stacking)
+        self.captured = 0           # frames grabbed, counted by the camera thread
+        self.capture_fps = 0.0
+        self.last_captured = (None, 0)
+
+        # Hysteresis state
+        self.over_since = None
+        self.headroom_since = None
+        self.last_evaluation = 0.0
+        self.decisions = deque(maxlen=20)
+        self.watchdog = None
+        self.watching = False
+
+    @property
+    def level(self):
+        return len(self.active)
+
+    # ------------------------------------------------------------------
+    # Measurements (called from pipeline threads)
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _ema(old, new):
+        return new if old == 0.0 else old + GOVERNOR_SMOOTHING * (new - old)
+
+    def record(self, stage, ms):
+        with self.lock:
+            self.stage_ms[stage] = self._ema(self.stage_ms[stage], ms)
+
+    def record_output(self, capture_timestamp):
+        """Called once per published frame (before static-scene suppression)"""
+        now = time.time()
+        with self.lock:
+            self.frame_age_ms = self._ema(self.frame_age_ms, (now - capture_timestamp) * 1000)
+            if self.last_output is not None and now > self.last_output:
+                self.output_fps = self._ema(self.output_fps, 1.0 / (now - self.last_output))
+            self.last_output = now
+
+        if now - self.last_evaluation >= GOVERNOR_INTERVAL:
+            self.last_evaluation = now
+            self.evaluate(now)
+
+    def start(self):
+        """Pipeline started: begin watching for output stalls"""
+        with self.lock:
+            self.last_output = None
+            self.last_captured = (None, 0)
+        self.watching = True
+        if self.watchdog is None or not self.watchdog.is_alive():
+            self.watchdog = threading.Thread(target=self._watch, name="governor", daemon=True)
+            self.watchdog.start()
+
+    def stop(self):
+        self.watching = False
+
+    def _watch(self):
+        while self.watching:
+            time.sleep(GOVERNOR_INTERVAL)
+            now = time.time()
+            # record_output evaluates while frames flow; this covers the gaps
+            if now - self.last_evaluation >= GOVERNOR_INTERVAL:
+                self.last_evaluation = now
+                self.evaluate(now)
+
+    # ------------------------------------------------------------------
+    # Decisions
+    # ------------------------------------------------------------------
+
+    def stage_load(self):
+        """Each stage's time as a fraction of its own budget"""
+        return {stage: self.stage_ms[stage] / self.stage_budget_ms[stage] for stage in STAGES}
+
+    def load(self):
+        """Slowest stage as a fraction of its budget"""
+        return max(self.stage_load().values())
+
+    def expected_fps(self):
+        """Output rate the pipeline should reach (camera rate, target and stacking permitting)"""
+        fps = self.target_fps
+        if self.capture_fps > 0:
+            fps = min(fps, self.capture_fps)
+        return fps / max(1, self.output_divisor)
+
+    def _update_capture_fps(self, now):
+        """Refresh the capture rate; True if the camera delivered frames since the last call"""
+        last_time, last_count = self.last_captured
+        count = self.captured
+        if last_time is not None and now > last_time:
+            self.capture_fps = self._ema(self.capture_fps, (count - last_count) / (now - last_time))
+        self.last_captured = (now, count)
+        return count > last_count
+
+    def _stall_ms(self, now, capturing):
+        """Time since the last output when frames are captured but none come out, else 0"""
+        if not capturing or self.last_output is None:
+            return 0.0
+        gap_ms = (now - self.last_output) * 1000
+        expected = self.expected_fps()
+        limit = max(GOVERNOR_MAX_FRAME_AGE_MS, 2000.0 / expected if expected > 0 else 0.0)
+        return gap_ms if gap_ms > limit else 0.0
+
+    def evaluate(self, now=None):
+        if not self.enabled:
+            return
+        now = now if now is not None else time.time()
+
+        with self.lock:
+            capturing = self._update_capture_fps(now)
+            stall_ms = self._stall_ms(now, capturing)
+            age = max(self.frame_age_ms, stall_ms)
+            min_fps = self.expected_fps() * GOVERNOR_MIN_FPS_RATIO
+            behind = stall_ms > 0 or age > GOVERNOR_MAX_FRAME_AGE_MS or self.output_fps < min_fps
+            healthy = age < GOVERNOR_MAX_FRAME_AGE_MS * GOVERNOR_HEADROOM and self.output_fps >= min_fps
+
+            if behind:
+                self.headroom_since = None
+                if self.over_since is None:
+                    self.over_since = now
+                elif now - self.over_since >= GOVERNOR_STEP_DOWN_AFTER:
+                    rung = self._next_rung()
+                    if rung is not None:
+                        self._activate(rung, age)
+                    self.over_since = now
+            elif healthy and self.active:
+                self.over_since = None
+                if self.headroom_since is None:
+                    self.headroom_since = now
+                elif now - self.headroom_since >= GOVERNOR_STEP_UP_AFTER and self._can_restore():
+                    self._restore(age)
+                    self.headroom_since = now
+            else:
+                self.over_since = None
+                self.headroom_since = None
+
+    def over_budget(self):
+        return [stage for stage, load in self.stage_load().items() if load > 1.0]
+
+    def _next_rung(self):
+        """First inactive rung that relieves a stage over its budget (None if there is none)"""
+        over = set(self.over_budget())
+        for index, (name, _) in enumerate(self.ladder):
+            if index not in self.active and over.intersection(RUNG_STAGES.get(name, ())):
+                return index
+        return None
+
+    def _can_restore(self):
+        """The stages the last rung relieves have room to take the load back"""
+        name, _ = self.ladder[self.active[-1]]
+        loads = self.stage_load()
+        return all(loads[stage] < GOVERNOR_HEADROOM for stage in RUNG_STAGES.get(name, ()))
+
+    def _activate(self, index, age):
+        self.active.append(index)
+        self._decide('down', index, age)
+
+    def _restore(self, age):
+        index = self.active.pop()
+        self._decide('up', index, age)
+
+    def _decide(self, direction, index, age):
+        rung, value = self.ladder[index]
+        stages = RUNG_STAGES.get(rung, ())
+        loads = self.stage_load()
+        decision = {
+            'time': round(time.time(), 3),
+            'level': self.level,
+            'direction': direction,
+            'rung': rung,
+            'value': value,
+            'stage_load': {stage: round(loads[stage], 2) for stage in stages},
+            'frame_age_ms': round(age, 1),
+            'output_fps': round(self.output_fps, 1),
+        }
+        self.decisions.append(decision)
+        arrow = "↓" if direction == 'down' else "↑"
+        action = f"{rung}={value}" if direction == 'down' else f"{rung} restored"
+        load = ", ".join(f"{stage} {loads[stage]:.0%}" for stage in stages)
+        log.info("%s level %d: %s (%s of budget, frame age %.0fms, %.1f fps)",
+                 arrow, self.level, action, load, age, self.output_fps)
+
+    def set_enabled(self, enabled):
+        with self.lock:
+            self.enabled = enabled
+            if not enabled and self.active:
+                self.active = []
+                log.info("Disabled, all rungs restored")
+            self.over_since = None
+            self.headroom_since = None
+
+    # ------------------------------------------------------------------
+    # Effective settings
+    # ------------------------------------------------------------------
+
+    def get(self, rung, default):
+        """Value of `rung` if it is active, else `default`"""
+        for index in self.active:
+            name, value = self.ladder[index]
+            if name == rung:
+                return value
+        return default
+
+    def nlm_interval(self):
+        return max(1, int(round(1.0 / self.get('nlm_rate', 1.0))))
+
+    def histogram_divisor(self):
+        return max(1, int(self.get('histogram_decimation', 1)))
+
+    def jpeg_quality(self):
+        return int(self.get('jpeg_quality', JPEG_QUALITY))
+
+    def stream_scale(self):
+        return float(self.get('stream_scale', 1.0))
+
+    def active_rungs(self):
+        return {name: value for name, value in (self.ladder[index] for index in self.active)}
+
+    def get_summary(self):
+        """Compact state for /status (changes only on decisions)"""
+        return {
+            'enabled': self.enabled,
+            'level': self.level,
+            'active': self.active_rungs(),
+        }
+
+    def get_status(self):
+        with self.lock:
+            return {
+                **self.get_summary(),
+                'target_fps': self.target_fps,
+                'budget_ms': round(self.budget_ms, 1),
+                'stage_budget_ms': {stage: round(ms, 1) for stage, ms in self.stage_budget_ms.items()},
+                'load': round(self.load(), 2),
+                'over_budget': self.over_budget(),
+                'stage_ms': {stage: round(ms, 2) for stage, ms in self.stage_ms.items()},
+                'frame_age_ms': round(self.frame_age_ms, 1),
+                'output_fps': round(self.output_fps, 1),
+                'expected_fps': round(self.expected_fps(), 1),
+                'capture_fps': round(self.capture_fps, 1),
+                'ladder': [{'rung': name, 'value': value, 'stages': list(RUNG_STAGES.get(name, ()))}
+                           for name, value in self.ladder],
+                'decisions': list(self.decisions),
+            }
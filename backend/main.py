@@ -1,5 +1,5 @@
-from fastapi import FastAPI, WebSocket, Response, HTTPException
-from fastapi.responses import StreamingResponse, HTMLResponse, RedirectResponse, FileResponse
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Response, HTTPException, Request
+from fastapi.responses import StreamingResponse, HTMLResponse, RedirectResponse, FileResponse, PlainTextResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 import cv2
@@ -9,6 +9,11 @@ import time
 from pathlib import Path
 from camera_handler import CameraHandler
 from histogram_processor import HistogramProcessor
+from sampling_profiler import profiler, ProfilerBusy
+from ptz_actor import PTZActor
+from static_cache import StaticAssetCache
+import app_logging
+from app_logging import get_logger
 from config import *
 from fastapi import UploadFile, File
 import base64
@@ -20,6 +25,7 @@ import asyncio
 app = FastAPI()
 #robot_ai = RobotAI()
 frontend_path = Path(__file__).parent.parent / "frontend"
+static_assets = StaticAssetCache(frontend_path)
 
 app.add_middleware(
     CORSMiddleware,
@@ -32,147 +38,10 @@ app.add_middleware(
 camera = CameraHandler()
 histogram_proc = HistogramProcessor()
 camera.histogram_proc = histogram_proc
-# PTZ continuous control state
-zoom_moving = False
-focus_moving = False
-pan_moving = False
-zoom_speed = 0
-focus_speed = 0
-pan_speed = 0
-ptz_thread_running = False
-# Image flip state
-horizontal_flip_enabled = False
-
-def apply_zoom_step(speed):
-    """Apply zoom control with speed"""
-    if camera.cap is None or not camera.cap.isOpened():
-        return False
-    
-    try:
-        current = camera.cap.get(cv2.CAP_PROP_ZOOM)
-        if current is None:
-            return False
-        
-        if speed == 0:
-            return True
-        
-        step_size = 0.5
-        new_value = current + (speed * step_size)
-        new_value = max(1, min(10, round(new_value, 1)))
-        
-        if (current >= 10 and speed > 0) or (current <= 1 and speed < 0):
-            return False
-        
-        result = camera.cap.set(cv2.CAP_PROP_ZOOM, new_value)
-        if result:
-            camera.zoom = new_value
-            print(f"[ZOOM] {current:.1f} → {new_value:.1f}")
-        return result
-    except Exception as e:
-        print(f"[ZOOM] Error: {e}")
-        return False
-
-def apply_focus_step(speed):
-    """Apply focus control with speed - RANGE: 0-300"""
-    if camera.cap is None or not camera.cap.isOpened():
-        return False
-    
-    try:
-        # CRITICAL: Disable autofocus for manual control
-        camera.cap.set(cv2.CAP_PROP_AUTOFOCUS, 0)
-        
-        current = camera.cap.get(cv2.CAP_PROP_FOCUS)
-        if current is None:
-            current = 150  # Default fallback
-        
-        if speed == 0:
-            # Stop - just hold current position
-            camera.cap.set(cv2.CAP_PROP_FOCUS, current)
-            return True
-        
-        step_size = 3.0  # Increased for better visibility
-        new_value = current + (speed * step_size)
-        new_value = max(0, min(1000, round(new_value)))  # CORRECT RANGE: 0-300
-        
-        if (current >= 500 and speed > 0) or (current <= 0 and speed < 0):
-            print(f"[FOCUS] At limit {current:.1f}")
-            return False
-        
-        result = camera.cap.set(cv2.CAP_PROP_FOCUS, new_value)
-        if result:
-            camera.focus = new_value
-            print(f"[FOCUS] {current:.1f} → {new_value:.1f}")
-        else:
-            print(f"[FOCUS] ⚠️ Failed to set focus to {new_value}")
-        return result
-    except Exception as e:
-        print(f"[FOCUS] Error: {e}")
-        return False
+# PTZ device actor: owns all zoom/focus/pan control I/O
+ptz = PTZActor(camera)
+robot_log = get_logger('robot')
 
-def apply_pan_step(speed):
-    """Apply pan control with speed"""
-    if camera.cap is None or not camera.cap.isOpened():
-        return False
-    
-    try:
-        current = camera.cap.get(cv2.CAP_PROP_PAN)
-        if current is None:
-            current = 0
-        
-        if speed == 0:
-            # Stop: just maintain current position
-            safe_current = max(-10, min(10, current))
-            camera.cap.set(cv2.CAP_PROP_PAN, safe_current)
-            return True
-        
-        step_size = 0.5
-        new_value = current + (speed * step_size)
-        
-        if (current >= 9.5 and speed > 0) or (current <= -9.5 and speed < 0):
-            print(f"[PAN] At limit {current:.1f}")
-            return False
-        
-        new_value = max(-10, min(10, round(new_value, 1)))
-        
-        result = camera.cap.set(cv2.CAP_PROP_PAN, new_value)
-        if result:
-            camera.pan = new_value
-            print(f"[PAN] {current:.1f} → {new_value:.1f}")
-        return result
-    except Exception as e:
-        print(f"[PAN] Error: {e}")
-        return False
-
-def ptz_controller_thread():
-    """Continuous PTZ control loop"""
-    global zoom_speed, focus_speed, pan_speed
-    global zoom_moving, focus_moving, pan_moving
-    global ptz_thread_running
-    
-    print("[PTZ] Controller thread started")
-    ptz_thread_running = True
-    
-    while ptz_thread_running:
-        try:
-            
-            if zoom_moving and abs(zoom_speed) > 0:
-                apply_zoom_step(zoom_speed)
-            
-            
-            if focus_moving and abs(focus_speed) > 0:
-                apply_focus_step(focus_speed)
-            
-            
-            if pan_moving and abs(pan_speed) > 0:
-                apply_pan_step(pan_speed)
-            
-            time.sleep(0.15) 
-        
-        except Exception as e:
-            print(f"[PTZ] Error: {e}")
-            time.sleep(0.15)
-    
-    print("[PTZ] Controller thread stopped")
 def process(self, frame):
     """Return histogram data (for /histogram endpoint)"""
     hist_data = self.calculate_histogram(frame)
@@ -182,154 +51,290 @@ def process(self, frame):
         'max': self.max_value,
         'nlm_enabled': self.nlm_enabled
     }
-@app.on_event("startup")
-async def startup():
-    global ptz_thread_running
+def bring_up():
+    """Background start-up: camera, kernels and calibration, then attach the PTZ actor"""
     if camera.start():
-        # Disable autofocus on startup
-        if camera.cap and camera.cap.isOpened():
-            camera.cap.set(cv2.CAP_PROP_AUTOFOCUS, 0)
-            print("✅ Autofocus disabled for manual control")
-        
-        # Start PTZ controller thread
-        threading.Thread(target=ptz_controller_thread, daemon=True).start()
+        # The actor reads the device and switches autofocus off once
+        camera.readiness.begin('ptz')
+        ptz.attach(on_done=lambda: camera.readiness.done('ptz'))
         print("Application started successfully")
     else:
+        camera.readiness.skip('ptz', "camera not started")
         print(" Failed to start camera")
 
-# ============================================================================
-# STATIC FILE SERVING
-# ============================================================================
+@app.on_event("startup")
+async def startup():
+    static_assets.load()
+    # Running from the start: PTZ commands are acked as no-ops until the camera is up
+    ptz.start()
+    # Don't hold up the first request on device I/O and kernel warm-up
+    threading.Thread(target=bring_up, name="startup", daemon=True).start()
+
+@app.get("/ready")
+async def ready():
+    """Start-up progress per phase; 503 until the first frame is published"""
+    status = camera.readiness.get_status()
+    return JSONResponse(status, status_code=200 if status['ready'] else 503)
 
-@app.get("/style.css")
-async def serve_css():
-    """Serve CSS file"""
-    css_file = frontend_path / "style.css"
-    if css_file.exists():
-        return FileResponse(css_file, media_type="text/css")
-    raise HTTPException(status_code=404, detail="CSS file not found")
-
-@app.get("/app.js")
-async def serve_app_js():
-    """Serve app.js file"""
-    js_file = frontend_path / "app.js"
-    if js_file.exists():
-        return FileResponse(js_file, media_type="application/javascript")
-    raise HTTPException(status_code=404, detail="app.js not found")
-
-@app.get("/histogram.js")
-async def serve_histogram_js():
-    """Serve histogram.js file"""
-    js_file = frontend_path / "histogram.js"
-    if js_file.exists():
-        return FileResponse(js_file, media_type="application/javascript")
-    raise HTTPException(status_code=404, detail="histogram.js not found")
-@app.get("/robot-assistant.css")
-async def serve_robot_css():
-    """Serve robot-assistant.css file"""
-    css_file = frontend_path / "robot-assistant.css"
-    if css_file.exists():
-        return FileResponse(css_file, media_type="text/css")
-    raise HTTPException(status_code=404, detail="robot-assistant.css not found")
-
-@app.get("/robot-assistant.js")
-async def serve_robot_js():
-    """Serve robot-assistant.js file"""
-    js_file = frontend_path / "robot-assistant.js"
-    if js_file.exists():
-        return FileResponse(js_file, media_type="application/javascript")
-    raise HTTPException(status_code=404, detail="robot-assistant.js not found")
-@app.get("/voicei.js")
-async def serve_voice_js():
-    """Serve voice.js file"""
-    js_file = frontend_path / "voicei.js"
-    if js_file.exists():
-        return FileResponse(js_file, media_type="application/javascript")
-    raise HTTPException(status_code=404, detail="voicei.js not found")
-
-@app.get("/favicon.ico")
-async def serve_favicon():
-    """Serve favicon"""
-    favicon_file = frontend_path / "favicon.ico"
-    if favicon_file.exists():
-        return FileResponse(favicon_file, media_type="image/x-icon")
-    # Return 204 No Content if favicon doesn't exist
-    return Response(status_code=204)
+# All frontend files are served from memory by one generic handler, registered
+# last (see serve_static) so it never shadows an API route.
 
 @app.on_event("shutdown")
 async def shutdown():
-    global ptz_thread_running, zoom_moving, focus_moving, pan_moving
-    
-    # Stop PTZ movements
-    ptz_thread_running = False
-    zoom_moving = False
-    focus_moving = False
-    pan_moving = False
-    
+    ptz.stop()
     camera.stop()
     print("Application stopped")
 
 @app.get("/")
-async def root():
-    frontend_file = Path(__file__).parent.parent / "frontend" / "index.html"
-    if frontend_file.exists():
-        with open(frontend_file, 'r', encoding='utf-8') as f:
-            html_content = f.read()
-        return HTMLResponse(content=html_content)
+async def root(request: Request):
+    response = static_assets.response("index.html", request)
+    if response is not None:
+        return response
     return {"app": "SeeDevice", "status": "running", "message": "Frontend not found. Open frontend/index.html manually"}
 
+def record_encode(ms):
+    camera.governor.record('encode', ms)
+
+def record_histogram(ms):
+    camera.governor.record('histogram', ms)
+
 @app.get("/video_feed")
 async def video_feed():
     def generate():
-        while True:
-            frame = camera.get_frame()
-            if frame is None:
-                continue
-            
-            # Apply horizontal flip if enabled
-            if horizontal_flip_enabled:
-                frame = cv2.flip(frame, 1)  # 1 = horizontal flip
-            
-            # Process histogram
-            ##frame = histogram_proc.process_frame(frame)
-            
-            # Encode to JPEG
-            ret, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 60])
-            if ret:
-                yield (b'--frame\r\n'
-                       b'Content-Type: image/jpeg\r\n\r\n' + buffer.tobytes() + b'\r\n')
+        camera.add_viewer()
+        last_seq = 0
+        try:
+            while True:
+                # Packets arrive already normalized and flipped by the pipeline;
+                # passthrough packets carry the camera's own JPEG (no re-encode).
+                # Static frames are never published, so nothing is encoded or sent.
+                seq, packet = camera.wait_for_packet(last_seq)
+                if packet is None:
+                    continue
+                last_seq = seq
+                
+                # Encoded once per packet and shared by all viewers; quality and
+                # size follow the load governor
+                jpeg = packet.get_jpeg(camera.governor.jpeg_quality(), camera.governor.stream_scale(),
+                                       on_encode=record_encode)
+                if jpeg is not None:
+                    yield (b'--frame\r\n'
+                           b'Content-Type: image/jpeg\r\n\r\n' + jpeg + b'\r\n')
+        finally:
+            camera.remove_viewer()
     
     return StreamingResponse(generate(), media_type="multipart/x-mixed-replace; boundary=frame")
 
-@app.get("/status")
-async def get_status():
+def build_status():
+    """Full status dict shared by /status and the push stream"""
     status = camera.get_status()
     status['histogram_min'] = histogram_proc.min_value
     status['histogram_max'] = histogram_proc.max_value
     status['nlm_enabled'] = histogram_proc.nlm_enabled
-    status['zoom_moving'] = zoom_moving
-    status['focus_moving'] = focus_moving
-    status['pan_moving'] = pan_moving
-    status['horizontal_flip'] = horizontal_flip_enabled
+    ptz_state = ptz.get_state()
+    status['zoom_moving'] = ptz_state['zoom_moving']
+    status['focus_moving'] = ptz_state['focus_moving']
+    status['pan_moving'] = ptz_state['pan_moving']
     return status
 
+def build_stats():
+    """Running counters; served on request, kept out of the pushed status diff"""
+    stats = camera.get_stats()
+    stats['ptz'] = ptz.get_stats()
+    return stats
+
+@app.get("/status")
+async def get_status():
+    return {**build_status(), **build_stats()}
+
+@app.get("/stats")
+async def get_stats():
+    """Frame, recording, stacking, static-scene and PTZ counters"""
+    return build_stats()
+
+@app.get("/snapshot")
+async def snapshot():
+    """Latest output frame as a high-quality JPEG (stacked when stacking is on)"""
+    packet = camera.get_packet()
+    if packet is None:
+        raise HTTPException(status_code=503, detail="No frame available")
+    
+    if packet.passthrough:
+        jpeg = packet.get_jpeg()
+    else:
+        ok, buffer = await asyncio.to_thread(
+            cv2.imencode, '.jpg', packet.frame, [cv2.IMWRITE_JPEG_QUALITY, SNAPSHOT_JPEG_QUALITY])
+        if not ok:
+            raise HTTPException(status_code=500, detail="Encoding failed")
+        jpeg = buffer.tobytes()
+    
+    name = time.strftime("snapshot_%Y%m%d_%H%M%S.jpg", time.localtime(packet.timestamp))
+    return Response(content=jpeg, media_type="image/jpeg",
+                    headers={"Content-Disposition": f'inline; filename="{name}"', "Cache-Control": "no-store"})
+
+# Last /histogram result, reused while the governor decimates histograms
+histogram_cache = {'time': 0.0, 'data': None}
+
 @app.get("/histogram")
 async def get_histogram():
     """Get histogram of RAW frame (before normalization)"""
-    frame = camera.get_frame()
-    if frame is None:
-        return {"error": "No frame available"}
-    
-   
-    hist_data = histogram_proc.calculate_histogram(frame)
+    divisor = camera.governor.histogram_divisor()
+    now = time.time()
+    if divisor > 1 and histogram_cache['data'] is not None \
+            and now - histogram_cache['time'] < (divisor - 1) * HISTOGRAM_POLL_INTERVAL:
+        hist_data = histogram_cache['data']
+    else:
+        packet = camera.get_packet()
+        hist = packet.get_histogram(on_compute=record_histogram) if packet is not None else None
+        if hist is None:
+            return {"error": "No frame available"}
+        
+        hist_data = histogram_proc.calculate_histogram(None, hist)
+        histogram_cache['time'] = now
+        histogram_cache['data'] = hist_data
     
     return {
         'histogram': hist_data,
         'min': histogram_proc.min_value,
         'max': histogram_proc.max_value
     }
+def get_histogram_packed():
+    """Packed uint32 histogram of the latest frame (or None); shared with /histogram and auto-exposure"""
+    packet = camera.get_packet()
+    hist = packet.get_histogram(on_compute=record_histogram) if packet is not None else None
+    if hist is None:
+        return None
+    return histogram_proc.calculate_histogram_packed(None, hist)
+
+@app.websocket("/ws/stream")
+async def stream_socket(websocket: WebSocket):
+    """
+    Push channel for the dashboard
+    - text frames: {"type": "status", "changes": {...}} sent only when values change
+      (state only; running counters are on GET /stats)
+    - binary frames: 768 uint32 histogram bins (R, G, B) at the client-set rate
+    Client sends {"histogram_fps": N} to set the histogram rate (0 = off)
+    """
+    await websocket.accept()
+    settings = {'histogram_fps': 0}
+    
+    async def receive_settings():
+        try:
+            while True:
+                message = await websocket.receive_json()
+                if 'histogram_fps' in message:
+                    fps = float(message['histogram_fps'])
+                    settings['histogram_fps'] = max(0, min(HISTOGRAM_PUSH_MAX_FPS, fps))
+        except (WebSocketDisconnect, ValueError, TypeError, KeyError):
+            pass
+    
+    receiver = asyncio.create_task(receive_settings())
+    last_status = {}
+    last_histogram = 0.0
+    
+    try:
+        while not receiver.done():
+            status = build_status()
+            changes = {k: v for k, v in status.items() if k not in last_status or last_status[k] != v}
+            if changes:
+                await websocket.send_json({'type': 'status', 'changes': changes})
+                last_status = status
+            
+            fps = settings['histogram_fps'] / camera.governor.histogram_divisor()
+            now = time.time()
+            if fps > 0 and now - last_histogram >= 1.0 / fps:
+                last_histogram = now
+                payload = await asyncio.to_thread(get_histogram_packed)
+                if payload is not None:
+                    await websocket.send_bytes(payload)
+            
+            wait = STATUS_PUSH_INTERVAL
+            if fps > 0:
+                wait = min(wait, max(0.0, last_histogram + 1.0 / fps - time.time()))
+            await asyncio.sleep(wait)
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        receiver.cancel()
+
+def control_state():
+    """Device/settings state returned with every control ack"""
+    return {
+        **ptz.get_state(),
+        'brightness': camera.brightness,
+        'profile': camera.current_profile if camera.calibration_loaded else None,
+        'horizontal_flip': camera.horizontal_flip,
+        'histogram_min': histogram_proc.min_value,
+        'histogram_max': histogram_proc.max_value,
+    }
+
+async def ptz_applied(submit, *args, **kwargs):
+    """Queue a PTZ actor command and wait until the actor has applied it"""
+    loop = asyncio.get_running_loop()
+    applied = loop.create_future()
+    
+    def done():
+        loop.call_soon_threadsafe(lambda: applied.done() or applied.set_result(None))
+    
+    submit(*args, on_done=done, **kwargs)
+    try:
+        await asyncio.wait_for(applied, timeout=1.0)
+    except asyncio.TimeoutError:
+        pass  # actor stopped - ack with the cached state
+
+async def apply_control(message):
+    """Apply one control-channel message (raises ValueError/KeyError on bad input)"""
+    kind = message['type']
+    
+    if kind == 'ptz_start':
+        # Starting one axis stops the others, so clients need no stop-all first
+        await ptz_applied(ptz.start_move, message['axis'], 1 if message['direction'] > 0 else -1, exclusive=True)
+    elif kind == 'ptz_stop':
+        await ptz_applied(ptz.stop_move, message['axis'])
+    elif kind == 'ptz_stop_all':
+        await ptz_applied(ptz.stop_all)
+    elif kind == 'ptz_step':
+        await ptz_applied(ptz.step, message['axis'], 1 if message['direction'] > 0 else -1)
+    elif kind == 'brightness':
+        # Loads a calibration file - keep it off the event loop
+        camera.auto_exposure.manual_override()
+        await asyncio.to_thread(camera.set_brightness, int(message['value']))
+    elif kind == 'flip':
+        camera.set_horizontal_flip(bool(message['enabled']))
+    elif kind == 'histogram_min':
+        histogram_proc.set_min_max(int(message['value']), histogram_proc.max_value)
+    elif kind == 'histogram_max':
+        histogram_proc.set_min_max(histogram_proc.min_value, int(message['value']))
+    else:
+        raise ValueError(f"Unknown control message: {kind}")
+
+@app.websocket("/ws/control")
+async def control_socket(websocket: WebSocket):
+    """
+    Persistent control channel (replaces one HTTP round trip per action)
+    Client sends {"seq": N, "type": ..., ...}; messages are applied strictly
+    in order and each is answered with
+    {"type": "ack", "seq": N, "ok": true, "state": {...}} or
+    {"type": "ack", "seq": N, "ok": false, "error": "..."}
+    """
+    await websocket.accept()
+    try:
+        while True:
+            text = await websocket.receive_text()
+            seq = None
+            try:
+                message = json.loads(text)
+                seq = message.get('seq')
+                await apply_control(message)
+                await websocket.send_json({'type': 'ack', 'seq': seq, 'ok': True, 'state': control_state()})
+            except (ValueError, KeyError, TypeError, AttributeError) as e:
+                await websocket.send_json({'type': 'ack', 'seq': seq, 'ok': False, 'error': str(e)})
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+
 @app.post("/brightness/{value}")
 async def set_brightness(value: int):
+    camera.auto_exposure.manual_override()
     camera.set_brightness(value)
     return {"brightness": camera.brightness, "profile": camera.current_profile}
 
@@ -341,6 +346,10 @@ async def set_auto_corrections(enabled: bool):
 async def toggle_nlm():
     state = camera.toggle_nlm()
     return {"nlm": state}
+@app.post("/corrections/toggle/defects")
+async def toggle_defects():
+    state = camera.toggle_defects()
+    return {"defects": state}
 @app.post("/histogram/min/{value}")
 async def set_histogram_min(value: int):
     histogram_proc.set_min_max(value, histogram_proc.max_value)
@@ -358,153 +367,227 @@ async def set_nlm(enabled: bool):
 
 @app.post("/horizontal_flip/{enabled}")
 async def set_horizontal_flip(enabled: bool):
-    """Toggle horizontal flip of video feed"""
-    global horizontal_flip_enabled
-    horizontal_flip_enabled = enabled
-    print(f"[FLIP] Horizontal flip: {'ENABLED' if enabled else 'DISABLED'}")
-    return {"horizontal_flip": horizontal_flip_enabled, "success": True}
+    """Toggle horizontal flip of video feed (applied once per frame in the pipeline)"""
+    camera.set_horizontal_flip(enabled)
+    return {"horizontal_flip": camera.horizontal_flip, "success": True}
+
+@app.post("/roi/{enabled}")
+async def set_software_roi(enabled: bool):
+    """Software ROI zoom/pan (for cameras without CAP_PROP_ZOOM / CAP_PROP_PAN)"""
+    camera.set_software_roi(enabled)
+    return {"software_roi": camera.software_roi, "digital_zoom": camera.digital_zoom, "success": True}
+
+# ============================================================================
+# RECORDING
+# ============================================================================
+
+@app.post("/recording/start/{target}")
+async def recording_start(target: str):
+    """Start recording: 'corrected' (MJPEG) or 'raw' (frames + metadata)"""
+    try:
+        started = camera.recorder.start(target)
+    except (ValueError, RuntimeError) as e:
+        return {"error": str(e), "success": False}
+    if not started:
+        return {"error": "Already recording", "success": False, **camera.recorder.get_stats()}
+    return {"success": True, **camera.recorder.get_stats()}
+
+@app.post("/recording/stop")
+async def recording_stop():
+    """Stop recording (flushes queued frames in the writer thread)"""
+    await asyncio.to_thread(camera.recorder.stop)
+    return {"success": True, **camera.recorder.get_stats()}
+
+@app.get("/recording")
+async def recording_status():
+    return camera.recorder.get_stats()
+
+# ============================================================================
+# AUTO-EXPOSURE
+# ============================================================================
+
+@app.get("/auto_exposure")
+async def auto_exposure_status():
+    return camera.auto_exposure.get_status()
+
+@app.post("/auto_exposure/{enabled}")
+async def set_auto_exposure(enabled: bool):
+    """Closed-loop brightness from the output histogram (manual brightness turns it off)"""
+    camera.auto_exposure.set_enabled(enabled)
+    return camera.auto_exposure.get_status()
+
+# ============================================================================
+# LOW-LIGHT FRAME STACKING
+# ============================================================================
+
+@app.get("/stacking")
+async def stacking_status():
+    return camera.stacker.get_status()
+
+@app.post("/stacking/{enabled}")
+async def set_stacking(enabled: bool, depth: int = None, mode: str = None, combine: str = None,
+                       interval: int = None):
+    """Stack the last `depth` frames: mode 'sliding'/'block', combine 'mean'/'sum'"""
+    try:
+        return {"success": True, **camera.stacker.configure(enabled, depth, mode, combine, interval)}
+    except ValueError as e:
+        return {"error": str(e), "success": False}
+
+# ============================================================================
+# CALIBRATION CAPTURE
+# ============================================================================
+
+@app.get("/calibration/capture")
+async def calibration_capture_status():
+    return camera.calibration_generator.get_status()
+
+@app.post("/calibration/capture/cancel")
+async def calibration_capture_cancel():
+    await asyncio.to_thread(camera.calibration_generator.cancel)
+    return camera.calibration_generator.get_status()
+
+@app.post("/calibration/capture/{mode}")
+async def calibration_capture_start(mode: str, start: int = BRIGHTNESS_MIN, end: int = BRIGHTNESS_MAX,
+                                    frames: int = CALIBRATION_FRAMES):
+    """Unattended sweep: 'dark' (capped), 'flat' (white), 'gray', 'dark_gray' target"""
+    try:
+        started = camera.calibration_generator.start(mode, start, end, frames)
+    except ValueError as e:
+        return {"error": str(e), "success": False}
+    if not started:
+        return {"error": "Calibration capture already running", "success": False,
+                **camera.calibration_generator.get_status()}
+    return {"success": True, **camera.calibration_generator.get_status()}
+
+# ============================================================================
+# LOAD GOVERNOR
+# ============================================================================
+
+@app.get("/governor")
+async def governor_status():
+    """Current degradation level, stage timings and recent decisions"""
+    return camera.governor.get_status()
+
+@app.post("/governor/{enabled}")
+async def set_governor(enabled: bool):
+    camera.governor.set_enabled(enabled)
+    return camera.governor.get_summary()
+
+# ============================================================================
+# ADMIN - LOGGING
+# ============================================================================
+
+@app.get("/admin/logging")
+async def admin_logging():
+    """Log levels, queue backlog, dropped and rate-limited records"""
+    return app_logging.get_stats()
+
+@app.post("/admin/logging/{level}")
+async def admin_set_log_level(level: str, subsystem: str = ""):
+    """Change the log level at runtime, e.g. /admin/logging/debug?subsystem=ptz"""
+    try:
+        app_logging.set_level(subsystem, level)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return app_logging.get_stats()
+
+# ============================================================================
+# ADMIN - ON-DEMAND PROFILING
+# ============================================================================
+
+@app.get("/admin/profile")
+async def admin_profile(seconds: float = 5.0, interval_ms: float = PROFILER_INTERVAL_MS, threads: str = ""):
+    """
+    Sample all pipeline threads for `seconds` and return collapsed stacks
+    (flamegraph.pl / speedscope). `threads` optionally limits the capture,
+    e.g. ?threads=camera,processing,nlm
+    """
+    wanted = [name.strip() for name in threads.split(",") if name.strip()] or None
+    try:
+        collapsed = await asyncio.to_thread(profiler.sample, seconds, interval_ms, wanted)
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    return PlainTextResponse(
+        collapsed,
+        headers={"Content-Disposition": f'attachment; filename="profile-{int(time.time())}.folded"'}
+    )
+
+@app.get("/admin/profile/status")
+async def admin_profile_status():
+    return profiler.get_status()
 
 # ============================================================================
 # PTZ CONTINUOUS MOVEMENT CONTROLS (Hold-to-Move)
 # ============================================================================
 
+# Handlers only queue commands for the PTZ actor and return immediately;
+# responses carry the cached device state, not a fresh ioctl read.
+
 @app.post("/ptz/zoom/start/{direction}")
 async def zoom_start(direction: str):
     """Start continuous zoom movement"""
-    global zoom_moving, zoom_speed
-    
     if direction == "in":
-        zoom_speed = 2
-        zoom_moving = True
-        print(f"[ZOOM] Started continuous IN (speed={zoom_speed})")
-        return {"action": "zoom_in_start", "speed": zoom_speed}
+        ptz.start_move('zoom', 1)
+        return {"action": "zoom_in_start", **ptz.get_state()}
     elif direction == "out":
-        zoom_speed = -2
-        zoom_moving = True
-        print(f"[ZOOM] Started continuous OUT (speed={zoom_speed})")
-        return {"action": "zoom_out_start", "speed": zoom_speed}
+        ptz.start_move('zoom', -1)
+        return {"action": "zoom_out_start", **ptz.get_state()}
     else:
         return {"error": "Invalid direction. Use 'in' or 'out'"}
 
 @app.post("/ptz/zoom/stop")
 async def zoom_stop():
-    """Stop zoom movement - INSTANT"""
-    global zoom_moving, zoom_speed
-    zoom_moving = False
-    zoom_speed = 0
-    
-    # Force immediate position hold
-    if camera.cap and camera.cap.isOpened():
-        current = camera.cap.get(cv2.CAP_PROP_ZOOM)
-        if current is not None:
-            camera.cap.set(cv2.CAP_PROP_ZOOM, current)
-            print(f"[ZOOM] STOPPED at {current:.1f}")
-    
-    return {"action": "zoom_stop", "instant": True}
+    """Stop zoom movement - holds the last written position"""
+    ptz.stop_move('zoom')
+    return {"action": "zoom_stop", **ptz.get_state()}
 
 @app.post("/ptz/focus/start/{direction}")
 async def focus_start(direction: str):
-    """Start continuous focus movement - RANGE: 0-300"""
-    global focus_moving, focus_speed
-    
-    # CRITICAL: Ensure autofocus is OFF
-    if camera.cap and camera.cap.isOpened():
-        camera.cap.set(cv2.CAP_PROP_AUTOFOCUS, 0)
-        # Verify
-        af = camera.cap.get(cv2.CAP_PROP_AUTOFOCUS)
-        print(f"[FOCUS] Autofocus status: {af} (should be 0)")
-    
+    """Start continuous focus movement"""
     if direction == "in" or direction == "near":
-        focus_speed = 8  # Increased speed for better visibility
-        focus_moving = True
-        print(f"[FOCUS] Started continuous IN (speed={focus_speed}, range=0-300)")
-        return {"action": "focus_in_start", "speed": focus_speed, "autofocus": "disabled"}
+        ptz.start_move('focus', 1)
+        return {"action": "focus_in_start", **ptz.get_state()}
     elif direction == "out" or direction == "far":
-        focus_speed = -8
-        focus_moving = True
-        print(f"[FOCUS] Started continuous OUT (speed={focus_speed}, range=0-300)")
-        return {"action": "focus_out_start", "speed": focus_speed, "autofocus": "disabled"}
+        ptz.start_move('focus', -1)
+        return {"action": "focus_out_start", **ptz.get_state()}
     else:
         return {"error": "Invalid direction. Use 'in'/'near' or 'out'/'far'"}
 
 @app.post("/ptz/focus/stop")
 async def focus_stop():
-    """Stop focus movement - INSTANT"""
-    global focus_moving, focus_speed
-    focus_moving = False
-    focus_speed = 0
-    
-    # Force immediate position hold
-    if camera.cap and camera.cap.isOpened():
-        current = camera.cap.get(cv2.CAP_PROP_FOCUS)
-        if current is not None:
-            camera.cap.set(cv2.CAP_PROP_FOCUS, current)
-            print(f"[FOCUS] STOPPED at {current:.1f}")
-    
-    return {"action": "focus_stop", "instant": True}
+    """Stop focus movement - holds the last written position"""
+    ptz.stop_move('focus')
+    return {"action": "focus_stop", **ptz.get_state()}
 
 @app.post("/ptz/pan/start/{direction}")
 async def pan_start(direction: str):
     """Start continuous pan movement"""
-    global pan_moving, pan_speed
-    
     if direction == "left":
-        pan_speed = -2
-        pan_moving = True
-        print(f"[PAN] Started continuous LEFT (speed={pan_speed})")
-        return {"action": "pan_left_start", "speed": pan_speed}
+        ptz.start_move('pan', -1)
+        return {"action": "pan_left_start", **ptz.get_state()}
     elif direction == "right":
-        pan_speed = 2
-        pan_moving = True
-        print(f"[PAN] Started continuous RIGHT (speed={pan_speed})")
-        return {"action": "pan_right_start", "speed": pan_speed}
+        ptz.start_move('pan', 1)
+        return {"action": "pan_right_start", **ptz.get_state()}
     else:
         return {"error": "Invalid direction. Use 'left' or 'right'"}
 
 @app.post("/ptz/pan/stop")
 async def pan_stop():
-    """Stop pan movement - INSTANT"""
-    global pan_moving, pan_speed
-    pan_moving = False
-    pan_speed = 0
-    
-    # Force immediate position hold
-    if camera.cap and camera.cap.isOpened():
-        current = camera.cap.get(cv2.CAP_PROP_PAN)
-        if current is not None:
-            camera.cap.set(cv2.CAP_PROP_PAN, current)
-            print(f"[PAN] STOPPED at {current:.1f}")
-    
-    return {"action": "pan_stop", "instant": True}
+    """Stop pan movement - holds the last written position"""
+    ptz.stop_move('pan')
+    return {"action": "pan_stop", **ptz.get_state()}
 
 @app.post("/ptz/stop")
 async def ptz_stop_all():
-    """Emergency stop - stops ALL PTZ movements immediately"""
-    global zoom_moving, focus_moving, pan_moving
-    global zoom_speed, focus_speed, pan_speed
-    
-    zoom_moving = False
-    focus_moving = False
-    pan_moving = False
-    zoom_speed = 0
-    focus_speed = 0
-    pan_speed = 0
-    
-    # Force immediate position holds
-    if camera.cap and camera.cap.isOpened():
-        zoom_val = camera.cap.get(cv2.CAP_PROP_ZOOM)
-        focus_val = camera.cap.get(cv2.CAP_PROP_FOCUS)
-        pan_val = camera.cap.get(cv2.CAP_PROP_PAN)
-        
-        if zoom_val is not None:
-            camera.cap.set(cv2.CAP_PROP_ZOOM, zoom_val)
-        if focus_val is not None:
-            camera.cap.set(cv2.CAP_PROP_FOCUS, focus_val)
-        if pan_val is not None:
-            camera.cap.set(cv2.CAP_PROP_PAN, pan_val)
-    
-    print("[PTZ] ALL STOPPED (emergency)")
-    return {"action": "all_stopped"}
+    """Emergency stop - stops ALL PTZ movements"""
+    ptz.stop_all()
+    return {"action": "all_stopped", **ptz.get_state()}
+
+@app.get("/ptz")
+async def ptz_status():
+    """Cached PTZ state and actor counters (no device access)"""
+    return {**ptz.get_state(), **ptz.get_stats()}
 
 # ============================================================================
 # PTZ SINGLE STEP CONTROLS (Click-to-Step)
@@ -513,126 +596,38 @@ async def ptz_stop_all():
 @app.post("/zoom/in")
 async def zoom_in_step():
     """Single step zoom in"""
-    if not camera.cap or not camera.cap.isOpened():
-        return {"error": "Camera not available"}
-    
-    current = camera.cap.get(cv2.CAP_PROP_ZOOM)
-    if current is None:
-        current = 5
-    
-    new_val = min(15, current + 1)
-    result = camera.cap.set(cv2.CAP_PROP_ZOOM, new_val)
-    
-    if result:
-        camera.zoom = new_val
-        print(f"[ZOOM STEP] IN: {current:.1f} → {new_val:.1f}")
-        return {"action": "zoom_in", "zoom": new_val, "success": True}
-    return {"error": "Failed to set zoom", "success": False}
+    ptz.step('zoom', 1)
+    return {"action": "zoom_in", "queued": True, "success": True, **ptz.get_state()}
 
 @app.post("/zoom/out")
 async def zoom_out_step():
     """Single step zoom out"""
-    if not camera.cap or not camera.cap.isOpened():
-        return {"error": "Camera not available"}
-    
-    current = camera.cap.get(cv2.CAP_PROP_ZOOM)
-    if current is None:
-        current = 5
-    
-    new_val = max(1, current - 1)
-    result = camera.cap.set(cv2.CAP_PROP_ZOOM, new_val)
-    
-    if result:
-        camera.zoom = new_val
-        print(f"[ZOOM STEP] OUT: {current:.1f} → {new_val:.1f}")
-        return {"action": "zoom_out", "zoom": new_val, "success": True}
-    return {"error": "Failed to set zoom", "success": False}
+    ptz.step('zoom', -1)
+    return {"action": "zoom_out", "queued": True, "success": True, **ptz.get_state()}
 
 @app.post("/ptz/focus/step/in")
 async def focus_step_in():
-    """Single step focus in (near) - RANGE: 0-300"""
-    if not camera.cap or not camera.cap.isOpened():
-        return {"error": "Camera not available"}
-    
-    # CRITICAL: Disable autofocus
-    camera.cap.set(cv2.CAP_PROP_AUTOFOCUS, 0)
-    
-    current = camera.cap.get(cv2.CAP_PROP_FOCUS)
-    if current is None:
-        current = 150
-    
-    new_value = min(1000, round(current + 15))  # Larger step for visibility, 0-300 range
-    result = camera.cap.set(cv2.CAP_PROP_FOCUS, new_value)
-    
-    if result:
-        camera.focus = new_value
-        print(f"[FOCUS STEP] IN: {current:.1f} → {new_value:.1f}")
-        return {"action": "focus_step_in", "focus": new_value, "success": True}
-    
-    print(f"[FOCUS STEP] ⚠️ Failed to set focus to {new_value}")
-    return {"error": "Failed to set focus", "success": False}
+    """Single step focus in (near)"""
+    ptz.step('focus', 1)
+    return {"action": "focus_step_in", "queued": True, "success": True, **ptz.get_state()}
 
 @app.post("/ptz/focus/step/out")
 async def focus_step_out():
-    """Single step focus out (far) - RANGE: 0-300"""
-    if not camera.cap or not camera.cap.isOpened():
-        return {"error": "Camera not available"}
-    
-    # CRITICAL: Disable autofocus
-    camera.cap.set(cv2.CAP_PROP_AUTOFOCUS, 0)
-    
-    current = camera.cap.get(cv2.CAP_PROP_FOCUS)
-    if current is None:
-        current = 150
-    
-    new_value = max(0, round(current - 15))  # Larger step for visibility, 0-300 range
-    result = camera.cap.set(cv2.CAP_PROP_FOCUS, new_value)
-    
-    if result:
-        camera.focus = new_value
-        print(f"[FOCUS STEP] OUT: {current:.1f} → {new_value:.1f}")
-        return {"action": "focus_step_out", "focus": new_value, "success": True}
-    
-    print(f"[FOCUS STEP] ⚠️ Failed to set focus to {new_value}")
-    return {"error": "Failed to set focus", "success": False}
+    """Single step focus out (far)"""
+    ptz.step('focus', -1)
+    return {"action": "focus_step_out", "queued": True, "success": True, **ptz.get_state()}
 
 @app.post("/ptz/left")
 async def ptz_left_step():
     """Single step pan left"""
-    if not camera.cap or not camera.cap.isOpened():
-        return {"error": "Camera not available"}
-    
-    current = camera.cap.get(cv2.CAP_PROP_PAN)
-    if current is None:
-        current = 0
-    
-    new_val = max(-10, current - 1)
-    result = camera.cap.set(cv2.CAP_PROP_PAN, new_val)
-    
-    if result:
-        camera.pan = new_val
-        print(f"[PAN STEP] LEFT: {current:.1f} → {new_val:.1f}")
-        return {"action": "left", "pan": new_val, "success": True}
-    return {"error": "Failed to set pan", "success": False}
+    ptz.step('pan', -1)
+    return {"action": "left", "queued": True, "success": True, **ptz.get_state()}
 
 @app.post("/ptz/right")
 async def ptz_right_step():
     """Single step pan right"""
-    if not camera.cap or not camera.cap.isOpened():
-        return {"error": "Camera not available"}
-    
-    current = camera.cap.get(cv2.CAP_PROP_PAN)
-    if current is None:
-        current = 0
-    
-    new_val = min(10, current + 1)
-    result = camera.cap.set(cv2.CAP_PROP_PAN, new_val)
-    
-    if result:
-        camera.pan = new_val
-        print(f"[PAN STEP] RIGHT: {current:.1f} → {new_val:.1f}")
-        return {"action": "right", "pan": new_val, "success": True}
-    return {"error": "Failed to set pan", "success": False}
+    ptz.step('pan', 1)
+    return {"action": "right", "queued": True, "success": True, **ptz.get_state()}
 
 # ============================================================================
 # DIAGNOSTICS
@@ -655,7 +650,7 @@ async def robot_process_voice(audio: UploadFile = File(...)):
         result = await robot_ai.process_voice_command(audio_data)
         return result
     except Exception as e:
-        print(f"[ROBOT/VOICE] Error: {e}")
+        robot_log.error("Voice command failed: %s", e)
         return {"error": str(e)}
 
 @app.post("/robot/vision")
@@ -665,15 +660,11 @@ async def robot_analyze_vision(language: str = "en"):
     READ-ONLY: Just looks and describes, doesn't change anything!
     """
     try:
-        # Get current frame (WITH your corrections applied!)
+        # Get current frame (WITH your corrections and flip applied!)
         frame = camera.get_frame()
         if frame is None:
             return {"error": "No camera frame available"}
         
-        # Apply horizontal flip if enabled
-        if horizontal_flip_enabled:
-            frame = cv2.flip(frame, 1)
-        
         # Encode frame to base64
         ret, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 70])
         if not ret:
@@ -691,7 +682,7 @@ async def robot_analyze_vision(language: str = "en"):
         return result
         
     except Exception as e:
-        print(f"[ROBOT/VISION] Error: {e}")
+        robot_log.error("Vision analysis failed: %s", e)
         return {"error": str(e)}
 
 @app.post("/robot/execute")
@@ -771,9 +762,23 @@ async def robot_execute_action(command: dict):
             return {"success": False, "message": f"Unknown action: {action}"}
             
     except Exception as e:
-        print(f"[ROBOT/EXECUTE] Error: {e}")
+        robot_log.error("Execute failed: %s", e)
         return {"success": False, "message": str(e)}
 
+# ============================================================================
+# STATIC FILES (must stay the last route)
+# ============================================================================
+
+@app.get("/{asset_path:path}")
+async def serve_static(asset_path: str, request: Request):
+    """Serve a cached frontend file (gzip/br, ETag, 304)"""
+    response = static_assets.response(asset_path, request)
+    if response is not None:
+        return response
+    if asset_path == "favicon.ico":
+        return Response(status_code=204)
+    raise HTTPException(status_code=404, detail=f"{asset_path} not found")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host=HOST, port=PORT)
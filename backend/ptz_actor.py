@@ -0,0 +1,291 @@
+"""
+PTZ device actor - the only thread that talks to the zoom/focus/pan controls
+HTTP/WebSocket handlers submit commands and return immediately; the actor
+drains its queue, folds every queued step and start/stop into one target per
+axis, and issues at most one cap.set() per axis per pass. Reads are served
+from a cached mirror of the last values written, so status never costs an
+ioctl.
+
+The actor runs from application start-up. Until the camera is up (or if it
+never opens) commands are acknowledged as no-ops instead of piling up;
+attach() is sent once the device is open, which reads it into the mirror
+and switches autofocus off.
+
+With software ROI enabled, zoom and pan are routed to the digital crop
+instead of the device.
+"""
+import cv2
+import threading
+import time
+from queue import SimpleQueue, Empty
+from config import *
+from thread_budget import pin_current_thread
+from app_logging import get_logger
+
+log = get_logger('ptz')
+
+AXES = ('zoom', 'focus', 'pan')
+PROPS = {
+    'zoom': cv2.CAP_PROP_ZOOM,
+    'focus': cv2.CAP_PROP_FOCUS,
+    'pan': cv2.CAP_PROP_PAN,
+}
+
+
+class PTZActor:
+    def __init__(self, camera):
+        self.camera = camera
+        self.commands = SimpleQueue()
+        self.thread = None
+        self.running = False
+        self.attached = False      # device read into the mirror (set by the actor)
+
+        # Cached mirror of device state (written only by the actor thread)
+        self.mirror = {'zoom': camera.zoom, 'focus': camera.focus, 'pan': camera.pan, 'autofocus': None}
+        self.velocity = {axis: 0 for axis in AXES}
+        self.next_tick = 0.0
+        self.batch_latency_ms = None   # queue wait of the oldest command in this pass
+
+        # Stats
+        self.commands_received = 0
+        self.commands_coalesced = 0
+        self.device_writes = 0
+        self.write_failures = 0
+        self.commands_rejected = 0
+
+    # ------------------------------------------------------------------
+    # Public API (any thread, never blocks)
+    # ------------------------------------------------------------------
+
+    # on_done (optional) is called from the actor thread once the command
+    # has been applied to the device.
+
+    def start_move(self, axis, direction, exclusive=False, on_done=None):
+        """
+        Continuous move while held; direction is +1 / -1.
+        exclusive=True stops every other axis first, in the same pass.
+        """
+        self._submit('start_exclusive' if exclusive else 'start', axis, direction, on_done)
+
+    def stop_move(self, axis, on_done=None):
+        self._submit('stop', axis, on_done=on_done)
+
+    def stop_all(self, on_done=None):
+        self._submit('stop_all', on_done=on_done)
+
+    def step(self, axis, direction, on_done=None):
+        """Single click step; direction is +1 / -1"""
+        self._submit('step', axis, direction, on_done)
+
+    def attach(self, on_done=None):
+        """Camera device opened: wake the actor to read it into the mirror and accept moves"""
+        self._submit('attach', on_done=on_done)
+
+    def is_moving(self, axis):
+        return self.velocity[axis] != 0
+
+    def get_state(self):
+        # camera.zoom/pan follow the mirror, or the digital crop with software ROI
+        return {
+            'zoom': self.camera.zoom,
+            'focus': self.camera.focus,
+            'pan': self.camera.pan,
+            'autofocus': self.mirror['autofocus'],
+            'zoom_moving': self.is_moving('zoom'),
+            'focus_moving': self.is_moving('focus'),
+            'pan_moving': self.is_moving('pan'),
+            'ptz_ready': self.attached,
+        }
+
+    def get_stats(self):
+        return {
+            'commands': self.commands_received,
+            'coalesced': self.commands_coalesced,
+            'device_writes': self.device_writes,
+            'write_failures': self.write_failures,
+            'rejected': self.commands_rejected,
+        }
+
+    def _submit(self, kind, axis=None, value=None, on_done=None):
+        if axis is not None and axis not in AXES:
+            raise ValueError(f"Unknown PTZ axis: {axis}")
+        self.commands.put((kind, axis, value, on_done, time.perf_counter()))
+
+    # ------------------------------------------------------------------
+    # Actor thread
+    # ------------------------------------------------------------------
+
+    def start(self):
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="ptz", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        self.commands.put(('shutdown', None, None, None, time.perf_counter()))
+        if self.thread is not None:
+            self.thread.join(timeout=1.0)
+            self.thread = None
+
+    def _device(self):
+        cap = self.camera.cap
+        if cap is None or not cap.isOpened():
+            return None
+        return cap
+
+    def _read_device(self):
+        """One-time read of the device state into the mirror; autofocus off"""
+        cap = self._device()
+        if cap is None:
+            return
+
+        for axis in AXES:
+            value = cap.get(PROPS[axis])
+            if value is not None:
+                self.mirror[axis] = value
+
+        autofocus = cap.get(cv2.CAP_PROP_AUTOFOCUS)
+        if autofocus:
+            cap.set(cv2.CAP_PROP_AUTOFOCUS, 0)
+            autofocus = cap.get(cv2.CAP_PROP_AUTOFOCUS)
+        self.mirror['autofocus'] = autofocus
+
+        self._sync_camera()
+        log.info("Zoom: %.1f, Focus: %.1f, Pan: %.1f, Autofocus: %s",
+                 self.mirror['zoom'], self.mirror['focus'], self.mirror['pan'], autofocus)
+
+    def _sync_camera(self):
+        """Keep CameraHandler's zoom/focus/pan (used by /status) in step with the mirror"""
+        if not self.camera.software_roi:
+            self.camera.zoom = self.mirror['zoom']
+            self.camera.pan = self.mirror['pan']
+        self.camera.focus = self.mirror['focus']
+
+    def _run(self):
+        pin_current_thread('ptz')
+        log.info("Device actor started")
+
+        while self.running:
+            moving = any(self.velocity.values())
+            timeout = max(0.0, self.next_tick - time.perf_counter()) if moving else None
+
+            try:
+                batch = [self.commands.get(timeout=timeout)]
+            except Empty:
+                batch = []
+
+            # Drain everything that queued up meanwhile and fold it into one pass
+            while True:
+                try:
+                    batch.append(self.commands.get_nowait())
+                except Empty:
+                    break
+
+            self.batch_latency_ms = None
+            if batch:
+                self.batch_latency_ms = round((time.perf_counter() - min(c[4] for c in batch)) * 1000, 2)
+            
+            # (Re)attach whenever the device is open again, e.g. after a camera restart
+            device_open = self._device() is not None
+            if device_open and not self.attached:
+                self._read_device()
+                self.attached = True
+            elif self.attached and not device_open:
+                self.attached = False
+                log.warning("Camera device gone, PTZ commands ignored until it is back")
+
+            steps = {axis: 0 for axis in AXES}
+            for kind, axis, value, _, _ in batch:
+                if kind == 'shutdown':
+                    self.running = False
+                elif kind == 'attach':
+                    pass
+                elif not self.attached:
+                    # No device yet: acknowledge as a no-op, never queue up moves
+                    self.commands_rejected += 1
+                    for name in AXES:
+                        self.velocity[name] = 0
+                elif kind in ('start', 'start_exclusive'):
+                    if kind == 'start_exclusive':
+                        for name in AXES:
+                            if name != axis:
+                                self.velocity[name] = 0
+                    if not self.velocity[axis]:
+                        self.next_tick = time.perf_counter()  # first move right away
+                    self.velocity[axis] = value
+                elif kind == 'stop':
+                    self.velocity[axis] = 0
+                elif kind == 'stop_all':
+                    for name in AXES:
+                        self.velocity[name] = 0
+                elif kind == 'step':
+                    steps[axis] += value
+
+            writes_before = self.device_writes
+            try:
+                self._apply(steps)
+            except Exception as e:
+                log.error("Error: %s", e, extra={'stage': 'ptz'})
+
+            self.commands_received += len(batch)
+            self.commands_coalesced += max(0, len(batch) - (self.device_writes - writes_before))
+
+            for command in batch:
+                if command[3] is not None:
+                    command[3]()
+
+        log.info("Device actor stopped")
+
+    def _apply(self, steps):
+        """Turn clicked steps + due continuous ticks into one write per axis"""
+        now = time.perf_counter()
+        tick_due = any(self.velocity.values()) and now >= self.next_tick
+        if tick_due:
+            self.next_tick = now + PTZ_TICK
+
+        for axis in AXES:
+            moves = []
+            if steps[axis]:
+                moves.append(('step', steps[axis]))
+            if tick_due and self.velocity[axis]:
+                moves.append(('speed', self.velocity[axis]))
+            if not moves:
+                continue
+
+            if self.camera.software_roi and axis in PTZ_DIGITAL_STEP:
+                self._apply_digital(axis, moves)
+                continue
+
+            delta = sum(count * (PTZ_STEP[axis] if kind == 'step' else PTZ_SPEED[axis]) for kind, count in moves)
+            self._write(axis, self.mirror[axis] + delta)
+
+    def _apply_digital(self, axis, moves):
+        digital = sum(count * (PTZ_DIGITAL_STEP[axis] if kind == 'step' else PTZ_DIGITAL_SPEED[axis])
+                      for kind, count in moves)
+        if axis == 'zoom':
+            self.camera.step_digital_zoom(digital)
+        else:
+            self.camera.step_digital_pan(digital)
+
+    def _write(self, axis, target):
+        low, high = PTZ_LIMITS[axis]
+        target = max(low, min(high, round(target, 1)))
+        current = self.mirror[axis]
+        if target == current:
+            return
+
+        cap = self._device()
+        if cap is None:
+            return
+
+        if cap.set(PROPS[axis], target):
+            self.device_writes += 1
+            self.mirror[axis] = target
+            self._sync_camera()
+            log.info("%s %.1f → %.1f", axis, current, target,
+                     extra={'stage': 'ptz', 'latency_ms': self.batch_latency_ms})
+        else:
+            self.write_failures += 1
+            log.warning("Failed to set %s to %s", axis, target, extra={'stage': 'ptz'})
@@ -0,0 +1,72 @@
+"""
+Readiness - ordered start-up phases with timings
+The server accepts requests immediately; camera bring-up runs in the
+background and reports each phase here. /ready is 200 once every phase is
+done (or skipped), 503 before that.
+"""
+import threading
+import time
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+SKIPPED = 'skipped'
+FAILED = 'failed'
+
+
+class Readiness:
+    def __init__(self, phases):
+        self.lock = threading.Lock()
+        self.created = time.perf_counter()
+        self.phases = {name: {'state': PENDING} for name in phases}
+
+    def _since_start_ms(self, now):
+        return round((now - self.created) * 1000, 1)
+
+    def begin(self, name):
+        with self.lock:
+            self.phases[name] = {'state': RUNNING, 'started': time.perf_counter()}
+
+    def done(self, name, **info):
+        self._finish(name, DONE, info)
+
+    def skip(self, name, reason):
+        self._finish(name, SKIPPED, {'reason': reason})
+
+    def fail(self, name, error):
+        self._finish(name, FAILED, {'error': str(error)})
+
+    def _finish(self, name, state, info):
+        now = time.perf_counter()
+        with self.lock:
+            started = self.phases[name].get('started', now)
+            self.phases[name] = {
+                'state': state,
+                'started': started,
+                'ms': round((now - started) * 1000, 1),
+                'at_ms': self._since_start_ms(now),
+                **info
+            }
+
+    def state(self, name):
+        return self.phases[name]['state']
+
+    def is_ready(self):
+        with self.lock:
+            return all(p['state'] in (DONE, SKIPPED) for p in self.phases.values())
+
+    def get_status(self):
+        with self.lock:
+            phases = []
+            for name, phase in self.phases.items():
+                entry = {'name': name}
+                entry.update({k: v for k, v in phase.items() if k != 'started'})
+                phases.append(entry)
+            ready = all(p['state'] in (DONE, SKIPPED) for p in self.phases.values())
+            failed = any(p['state'] == FAILED for p in self.phases.values())
+        return {
+            'ready': ready,
+            'failed': failed,
+            'uptime_ms': self._since_start_ms(time.perf_counter()),
+            'phases': phases
+        }
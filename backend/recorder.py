@@ -0,0 +1,233 @@
+"""
+Recorder - non-blocking archive subscriber
+The pipeline only ever calls submit(), which never blocks: frames go into a
+bounded queue and a writer thread does all disk I/O. When the disk can't keep
+up, frames are dropped and counted instead of stalling the camera.
+
+Targets:
+  corrected - corrected output as an MJPEG stream (.mjpeg, playable by ffmpeg/VLC)
+  raw       - untouched camera frames (.raw) + per-frame metadata (.jsonl),
+              so recordings can be re-corrected offline with any .genrgb
+"""
+import cv2
+import numpy as np
+import json
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from queue import Queue, Full, Empty
+from config import *
+from thread_budget import pin_current_thread
+from app_logging import get_logger
+
+log = get_logger('recorder')
+
+TARGETS = ('corrected', 'raw')
+
+
+class Recorder:
+    def __init__(self, output_dir=RECORDINGS_PATH):
+        self.output_dir = Path(output_dir)
+        self.queue = Queue(maxsize=RECORDER_QUEUE_SIZE)
+        self.target = None
+        self.thread = None
+        self.lock = threading.Lock()
+        
+        # Current segment
+        self.session = None
+        self.segment_index = 0
+        self.segment_start = 0.0
+        self.data_file = None
+        self.meta_file = None
+        self.segment_offset = 0
+        
+        # Stats
+        self.frames_written = 0
+        self.frames_dropped = 0
+        self.bytes_written = 0
+        self.segment_count = 0
+        self.segments = deque(maxlen=RECORDING_SEGMENTS_KEPT)   # most recent segment paths
+    
+    def start(self, target):
+        """
+        Start recording ('corrected' or 'raw'); returns False if already recording.
+        Raises RuntimeError while the previous writer is still flushing
+        """
+        if target not in TARGETS:
+            raise ValueError(f"Unknown recording target: {target} (use {', '.join(TARGETS)})")
+        
+        with self.lock:
+            if self.target is not None:
+                return False
+            # Two writers must never share the queue
+            if self.thread is not None and self.thread.is_alive():
+                raise RuntimeError("Previous recording is still being written, try again shortly")
+            
+            self.output_dir.mkdir(parents=True, exist_ok=True)
+            self.session = time.strftime("%Y%m%d_%H%M%S")
+            self.segment_index = 0
+            self.frames_written = 0
+            self.frames_dropped = 0
+            self.bytes_written = 0
+            self.segment_count = 0
+            self.segments.clear()
+            
+            self.thread = threading.Thread(target=self._writer_loop, args=(target,), name="recorder", daemon=True)
+            self.thread.start()
+            self.target = target
+        
+        log.info("Recording started (%s) → %s", target, self.output_dir)
+        return True
+    
+    def stop(self):
+        with self.lock:
+            if self.target is None:
+                return False
+            self.target = None
+            thread = self.thread
+        
+        # Sentinel; the writer drains what is already queued first
+        self.queue.put(None)
+        thread.join(timeout=5.0)
+        log.info("Recording stopped: %d frames, %d dropped", self.frames_written, self.frames_dropped)
+        return True
+    
+    def submit(self, item, metadata):
+        """Queue a frame (ndarray) or FramePacket for writing - never blocks"""
+        if self.target is None:
+            return False
+        try:
+            self.queue.put_nowait((item, metadata))
+            return True
+        except Full:
+            self.frames_dropped += 1
+            return False
+    
+    # ------------------------------------------------------------------
+    # Writer thread
+    # ------------------------------------------------------------------
+    
+    def _writer_loop(self, target):
+        pin_current_thread('recorder')
+        log.info("Writer thread started (%s)", target)
+        try:
+            while True:
+                try:
+                    entry = self.queue.get(timeout=0.5)
+                except Empty:
+                    continue
+                if entry is None:
+                    break
+                
+                item, metadata = entry
+                try:
+                    if self.data_file is None or time.time() - self.segment_start >= RECORDING_SEGMENT_SEC:
+                        self._open_segment(target)
+                    
+                    if target == 'corrected':
+                        self._write_corrected(item)
+                    else:
+                        self._write_raw(item, metadata)
+                    self.frames_written += 1
+                except Exception as e:
+                    log.warning("Write error: %s", e, extra={'stage': 'recorder'})
+        finally:
+            self._close_segment()
+            # Anything left behind the sentinel is discarded
+            while True:
+                try:
+                    self.queue.get_nowait()
+                except Empty:
+                    break
+        log.info("Writer thread stopped")
+    
+    def _open_segment(self, target):
+        self._close_segment()
+        
+        base = self.output_dir / f"rec_{self.session}_{target}_{self.segment_index:04d}"
+        self.segment_index += 1
+        self.segment_start = time.time()
+        self.segment_offset = 0
+        
+        if target == 'corrected':
+            path = base.with_suffix('.mjpeg')
+            self.data_file = open(path, 'wb')
+        else:
+            path = base.with_suffix('.raw')
+            self.data_file = open(path, 'wb')
+            self.meta_file = open(base.with_suffix('.jsonl'), 'w', encoding='utf-8')
+        
+        self.segments.append(str(path))
+        self.segment_count += 1
+    
+    def _close_segment(self):
+        if self.data_file is not None:
+            self.data_file.close()
+            self.data_file = None
+        if self.meta_file is not None:
+            self.meta_file.close()
+            self.meta_file = None
+    
+    def _write_corrected(self, packet):
+        # Cached on the packet per (quality, scale): shared with viewers when the
+        # settings match, and never replaces the viewers' stream encode
+        jpeg = packet.get_jpeg(RECORDING_JPEG_QUALITY)
+        if jpeg is None:
+            return
+        self.data_file.write(jpeg)
+        self.bytes_written += len(jpeg)
+    
+    def _write_raw(self, frame, metadata):
+        data = frame.tobytes()
+        record = dict(metadata)
+        record['offset'] = self.segment_offset
+        record['length'] = len(data)
+        record['shape'] = list(frame.shape)
+        record['format'] = 'jpeg' if frame.ndim < 3 else 'bgr'
+        
+        self.data_file.write(data)
+        self.meta_file.write(json.dumps(record) + '\n')
+        self.segment_offset += len(data)
+        self.bytes_written += len(data)
+    
+    def get_summary(self):
+        """Compact state for /status (changes only on start/stop/new segment)"""
+        return {
+            'active': self.target is not None,
+            'target': self.target,
+            'current_segment': self.segments[-1] if self.segments else None
+        }
+    
+    def get_stats(self):
+        return {
+            'active': self.target is not None,
+            'target': self.target,
+            'frames_written': self.frames_written,
+            'frames_dropped': self.frames_dropped,
+            'queue_depth': self.queue.qsize(),
+            'bytes_written': self.bytes_written,
+            'segments': self.segment_count,
+            'recent_segments': list(self.segments),
+            'current_segment': self.segments[-1] if self.segments else None
+        }
+
+
+def read_raw_segment(path):
+    """
+    Iterate (frame, metadata) over a raw recording segment (.raw + .jsonl)
+    Frames come back as uncorrected BGR uint8, ready for CorrectionEngine
+    """
+    path = Path(path)
+    meta_path = path.with_suffix('.jsonl')
+    data = np.memmap(path.with_suffix('.raw'), dtype=np.uint8, mode='r')
+    
+    with open(meta_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            record = json.loads(line)
+            chunk = data[record['offset']:record['offset'] + record['length']]
+            if record['format'] == 'jpeg':
+                frame = cv2.imdecode(np.asarray(chunk), cv2.IMREAD_COLOR)
+            else:
+                frame = np.array(chunk).reshape(record['shape'])
+            yield frame, record
@@ -0,0 +1,121 @@
+"""
+Sampling profiler - on-demand hotspots from a running service
+A sampler thread snapshots every thread's Python stack with
+sys._current_frames() at a fixed interval and counts identical stacks.
+Nothing is installed into the profiled threads (no sys.setprofile), so the
+camera keeps running at full speed while a capture is in progress.
+
+Output is the "collapsed stack" format read by flamegraph.pl and speedscope:
+    <thread name>;<outer frame>;...;<inner frame> <sample count>
+Time spent in native code (OpenCV, Cython kernels) is attributed to the
+Python frame that called into it.
+"""
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from config import *
+from app_logging import get_logger
+
+log = get_logger('profiler')
+
+
+def thread_group(name):
+    """Pool threads are named <prefix>_<n> (ThreadPoolExecutor); group them under <prefix>"""
+    prefix, _, index = name.rpartition('_')
+    return prefix if prefix and index.isdigit() else name
+
+
+class ProfilerBusy(Exception):
+    """A capture is already running"""
+
+
+class SamplingProfiler:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running = False
+        self.last_stats = None
+
+    @staticmethod
+    def _frame_label(frame):
+        code = frame.f_code
+        return f"{code.co_name} ({Path(code.co_filename).name}:{frame.f_lineno})"
+
+    def _stack(self, frame):
+        stack = []
+        while frame is not None:
+            stack.append(self._frame_label(frame))
+            frame = frame.f_back
+        stack.reverse()
+        return stack
+
+    def sample(self, seconds, interval_ms=PROFILER_INTERVAL_MS, threads=None):
+        """
+        Sample all threads (or only those named in `threads`) for `seconds`.
+        A name also selects its numbered pool threads ("nlm" -> nlm, nlm_0, nlm_1...).
+        Blocks the caller for the duration; returns collapsed stack text.
+        """
+        with self.lock:
+            if self.running:
+                raise ProfilerBusy("profile already in progress")
+            self.running = True
+
+        try:
+            seconds = max(0.1, min(float(seconds), PROFILER_MAX_SECONDS))
+            interval = max(1.0, float(interval_ms)) / 1000.0
+            wanted = set(threads) if threads else None
+            own_ident = threading.get_ident()
+
+            counts = Counter()
+            samples = 0
+            start = time.perf_counter()
+            next_time = start
+            deadline = start + seconds
+
+            while True:
+                now = time.perf_counter()
+                if now >= deadline:
+                    break
+
+                names = {t.ident: t.name for t in threading.enumerate()}
+                for ident, frame in sys._current_frames().items():
+                    if ident == own_ident:
+                        continue
+                    name = names.get(ident, f"thread-{ident}")
+                    if wanted is not None and thread_group(name) not in wanted and name not in wanted:
+                        continue
+                    counts[";".join([name] + self._stack(frame))] += 1
+                samples += 1
+
+                next_time += interval
+                delay = next_time - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    next_time = time.perf_counter()
+
+            elapsed = time.perf_counter() - start
+            self.last_stats = {
+                'seconds': round(elapsed, 2),
+                'interval_ms': round(interval * 1000, 2),
+                'samples': samples,
+                'effective_interval_ms': round(elapsed / samples * 1000, 2) if samples else None,
+                'stacks': len(counts),
+                'threads': sorted({key.split(';', 1)[0] for key in counts}),
+            }
+
+            log.info("%d samples over %.1fs, %d unique stacks", samples, elapsed, len(counts))
+            return "\n".join(f"{stack} {count}" for stack, count in counts.most_common()) + "\n"
+        finally:
+            with self.lock:
+                self.running = False
+
+    def get_status(self):
+        return {
+            'running': self.running,
+            'last': self.last_stats
+        }
+
+
+profiler = SamplingProfiler()
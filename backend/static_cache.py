@@ -0,0 +1,130 @@
+"""
+Static asset cache - frontend files served from memory
+Every file in the frontend directory is read once at startup and
+precompressed (gzip, plus brotli when the module is installed). Responses
+carry a strong ETag per encoding and Cache-Control, and conditional requests
+with a matching If-None-Match get 304 without a body.
+"""
+import gzip
+import hashlib
+import mimetypes
+from pathlib import Path
+from fastapi import Response
+from config import *
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+
+
+class StaticAsset:
+    __slots__ = ('name', 'media_type', 'cache_control', 'etag', 'bodies')
+
+    def __init__(self, name, data):
+        self.name = name
+        self.media_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        if self.media_type == 'text/javascript':
+            self.media_type = 'application/javascript'
+        # HTML is always revalidated so new asset versions are picked up;
+        # the rest may be reused for a while and then revalidated by ETag
+        if self.media_type == 'text/html':
+            self.cache_control = 'no-cache'
+        else:
+            self.cache_control = f'public, max-age={STATIC_MAX_AGE}'
+
+        self.etag = hashlib.sha256(data).hexdigest()[:32]
+        self.bodies = {'identity': data}
+
+        if len(data) >= STATIC_COMPRESS_MIN_SIZE and self.media_type.startswith(COMPRESSIBLE_TYPES):
+            compressed = gzip.compress(data, compresslevel=9, mtime=0)
+            if len(compressed) < len(data):
+                self.bodies['gzip'] = compressed
+            if brotli is not None:
+                compressed = brotli.compress(data, quality=11)
+                if len(compressed) < len(data):
+                    self.bodies['br'] = compressed
+
+    def etag_for(self, encoding):
+        """Strong validator: each encoding is a different representation"""
+        if encoding == 'identity':
+            return f'"{self.etag}"'
+        return f'"{self.etag}-{encoding}"'
+
+
+class StaticAssetCache:
+    def __init__(self, root):
+        self.root = Path(root)
+        self.assets = {}
+
+    def load(self):
+        """Read and precompress every file under the frontend directory"""
+        self.assets = {}
+        if not self.root.is_dir():
+            print(f"⚠️ Frontend directory not found: {self.root}")
+            return
+
+        raw_bytes = 0
+        sent_bytes = 0
+        for path in sorted(self.root.rglob('*')):
+            if not path.is_file():
+                continue
+            name = path.relative_to(self.root).as_posix()
+            asset = StaticAsset(name, path.read_bytes())
+            self.assets[name] = asset
+            raw_bytes += len(asset.bodies['identity'])
+            sent_bytes += min(len(body) for body in asset.bodies.values())
+
+        encodings = "gzip+br" if brotli is not None else "gzip"
+        print(f"✓ Static assets cached: {len(self.assets)} files, "
+              f"{raw_bytes / 1024:.0f} KB → {sent_bytes / 1024:.0f} KB ({encodings})")
+
+    def get(self, name):
+        return self.assets.get(name)
+
+    @staticmethod
+    def _choose_encoding(asset, accept_encoding):
+        accepted = set()
+        for part in accept_encoding.split(','):
+            token, *params = part.split(';')
+            quality = 1.0
+            for param in params:
+                key, _, value = param.strip().partition('=')
+                if key == 'q':
+                    try:
+                        quality = float(value)
+                    except ValueError:
+                        quality = 0.0
+            if quality > 0:
+                accepted.add(token.strip().lower())
+
+        for encoding in ('br', 'gzip'):
+            if encoding in asset.bodies and (encoding in accepted or '*' in accepted):
+                return encoding
+        return 'identity'
+
+    def response(self, name, request):
+        """Response for `name` (None if not cached), honouring Accept-Encoding and If-None-Match"""
+        asset = self.assets.get(name)
+        if asset is None:
+            return None
+
+        encoding = self._choose_encoding(asset, request.headers.get('accept-encoding', ''))
+        etag = asset.etag_for(encoding)
+        headers = {
+            'ETag': etag,
+            'Cache-Control': asset.cache_control,
+            'Vary': 'Accept-Encoding',
+        }
+
+        if_none_match = request.headers.get('if-none-match')
+        if if_none_match:
+            tags = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+            if '*' in tags or etag in tags:
+                return Response(status_code=304, headers=headers)
+
+        if encoding != 'identity':
+            headers['Content-Encoding'] = encoding
+        return Response(content=asset.bodies[encoding], media_type=asset.media_type, headers=headers)
@@ -0,0 +1,102 @@
+"""
+Static scene detector
+Compares a downsampled luma thumbnail of each output frame with the last
+frame that was actually sent, so unchanged frames are neither encoded nor sent
+"""
+import cv2
+import numpy as np
+import threading
+import time
+from config import *
+
+
+class StaticSceneDetector:
+    def __init__(self):
+        self.enabled = STATIC_SCENE_SUPPRESSION
+        self.mean_threshold = STATIC_SCENE_MEAN_THRESHOLD
+        self.cell_threshold = STATIC_SCENE_CELL_THRESHOLD
+        self.keepalive = STATIC_SCENE_KEEPALIVE
+        self.thumb_size = STATIC_SCENE_THUMB_SIZE
+        
+        self.lock = threading.Lock()
+        self.last_thumb = None
+        self.last_sent_time = 0.0
+        self.last_sent_packet = None
+        self.last_sent_stream = (JPEG_QUALITY, 1.0)
+        
+        # Stats
+        self.frames_checked = 0
+        self.frames_suppressed = 0
+        self.bytes_saved = 0
+        self.encode_ms_saved = 0.0
+    
+    def thumbnail(self, packet):
+        """Small grayscale thumbnail (int16) of a FramePacket"""
+        if packet.passthrough:
+            # Decode the camera JPEG at 1/8 scale - far cheaper than a full decode
+            small = cv2.imdecode(np.frombuffer(packet.get_jpeg(), dtype=np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_8)
+            if small is None:
+                return None
+        else:
+            frame = packet.frame
+            if frame is None:
+                return None
+            small = cv2.resize(frame, self.thumb_size, interpolation=cv2.INTER_AREA)
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        
+        if small.shape[1::-1] != self.thumb_size:
+            small = cv2.resize(small, self.thumb_size, interpolation=cv2.INTER_AREA)
+        return small.astype(np.int16)
+    
+    def should_send(self, packet, viewers=1, stream=(JPEG_QUALITY, 1.0)):
+        """
+        True if the packet differs from the last sent one (or keep-alive is due).
+        `stream` is the viewers' (quality, scale), used for the savings stats
+        """
+        if not self.enabled:
+            return True
+        
+        thumb = self.thumbnail(packet)
+        now = time.time()
+        
+        with self.lock:
+            self.frames_checked += 1
+            
+            changed = True
+            if thumb is not None and self.last_thumb is not None and thumb.shape == self.last_thumb.shape:
+                diff = np.abs(thumb - self.last_thumb)
+                changed = diff.mean() > self.mean_threshold or diff.max() > self.cell_threshold
+            
+            if changed or now - self.last_sent_time >= self.keepalive:
+                self.last_thumb = thumb
+                self.last_sent_time = now
+                self.last_sent_packet = packet
+                self.last_sent_stream = stream
+                return True
+            
+            # Suppressed: account for the encode + send we avoided
+            self.frames_suppressed += 1
+            last = self.last_sent_packet
+            if last is not None:
+                size, encode_ms = last.encoded(*self.last_sent_stream)
+                self.bytes_saved += size * viewers
+                self.encode_ms_saved += encode_ms
+            return False
+    
+    def reset(self):
+        with self.lock:
+            self.last_thumb = None
+            self.last_sent_time = 0.0
+            self.last_sent_packet = None
+    
+    def get_stats(self):
+        with self.lock:
+            checked = max(1, self.frames_checked)
+            return {
+                'enabled': self.enabled,
+                'frames_checked': self.frames_checked,
+                'frames_suppressed': self.frames_suppressed,
+                'suppressed_ratio': round(self.frames_suppressed / checked, 3),
+                'bytes_saved': self.bytes_saved,
+                'encode_ms_saved': round(self.encode_ms_saved, 1)
+            }
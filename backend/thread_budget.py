@@ -0,0 +1,111 @@
+"""
+Thread budget - one place that decides how many threads each stage may use
+OpenMP (correction kernels), OpenCV's internal pool and the NLM strip workers
+are sized from THREAD_BUDGET instead of each library grabbing every core.
+Stages can optionally be pinned to CPU sets (CPU_AFFINITY, Linux only);
+OpenMP workers inherit the mask of the processing thread that spawns them.
+
+apply_process_budget() must run before the correction kernels are imported,
+because OpenMP reads OMP_NUM_THREADS once when it starts.
+"""
+import os
+import threading
+import cv2
+from config import *
+
+_lock = threading.Lock()
+_budget = None
+_pinned = {}
+_pin_errors = {}
+
+
+def cpu_count():
+    """CPUs this process may run on (respects container/taskset limits)"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def resolve_budget():
+    """THREAD_BUDGET with automatic values filled in"""
+    cpus = cpu_count()
+    budget = dict(THREAD_BUDGET)
+    if budget.get('openmp') is None:
+        # Leave one core for capture, encoding and the web server
+        budget['openmp'] = max(1, cpus - 1)
+    if budget.get('opencv') is None:
+        budget['opencv'] = 1
+    if budget.get('nlm_workers') is None:
+        budget['nlm_workers'] = 1
+    budget['openmp_source'] = 'config'
+    return budget
+
+
+def apply_process_budget():
+    """Set OpenMP/OpenCV thread counts once per process; returns the budget"""
+    global _budget
+    with _lock:
+        if _budget is not None:
+            return _budget
+
+        budget = resolve_budget()
+
+        # An explicit OMP_NUM_THREADS in the environment wins over the config
+        env_threads = os.environ.get('OMP_NUM_THREADS')
+        if env_threads and env_threads.isdigit():
+            budget['openmp'] = int(env_threads)
+            budget['openmp_source'] = 'env'
+        else:
+            os.environ['OMP_NUM_THREADS'] = str(budget['openmp'])
+
+        # 0 = run OpenCV functions sequentially in the calling thread
+        cv2.setNumThreads(budget['opencv'] if budget['opencv'] > 1 else 0)
+
+        _budget = budget
+        print(f"✓ Thread budget: {cpu_count()} CPUs, OpenMP {budget['openmp']} ({budget['openmp_source']}), "
+              f"OpenCV {budget['opencv']}, NLM workers {budget['nlm_workers']}")
+        return budget
+
+
+def get_budget():
+    return apply_process_budget()
+
+
+def pin_current_thread(stage):
+    """Pin the calling thread to CPU_AFFINITY[stage], if configured"""
+    cpus = CPU_AFFINITY.get(stage)
+    if not cpus:
+        return None
+
+    if not hasattr(os, 'sched_setaffinity'):
+        _pin_errors[stage] = "CPU affinity not supported on this platform"
+        return None
+
+    try:
+        # pid 0 = the calling thread on Linux
+        os.sched_setaffinity(0, cpus)
+    except (OSError, ValueError) as e:
+        _pin_errors[stage] = str(e)
+        print(f"⚠️ Could not pin {stage} to CPUs {list(cpus)}: {e}")
+        return None
+
+    with _lock:
+        _pinned[stage] = sorted(cpus)
+    return cpus
+
+
+def get_allocation():
+    """Effective allocation for /status"""
+    budget = get_budget()
+    with _lock:
+        pinned = dict(_pinned)
+    return {
+        'cpus': cpu_count(),
+        'openmp': budget['openmp'],
+        'openmp_source': budget['openmp_source'],
+        'opencv': budget['opencv'],
+        'nlm_workers': budget['nlm_workers'],
+        'affinity': pinned,
+        'affinity_errors': dict(_pin_errors),
+    }
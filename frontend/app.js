@@ -2,28 +2,30 @@ const API_BASE = 'http://192.168.2.8:8000';
 
 // ============== STATUS UPDATES ==============
 
+function applyStatus(data) {
+    document.getElementById('connectionStatus').style.background = 
+        data.connected ? '#00ff00' : '#ff0000';
+    document.getElementById('statusText').textContent = 
+        data.connected ? 'Connected' : 'Disconnected';
+    
+    document.getElementById('brightnessValue').textContent = data.brightness;
+    document.getElementById('brightnessSlider').value = data.brightness;
+    
+    const profileText = data.profile ? `Profile: ${data.profile} ✓` : 'Profile: RAW MODE';
+    document.getElementById('profileStatus').textContent = profileText;
+    
+    document.getElementById('autoCorrections').checked = data.auto_corrections;
+    
+    // Update horizontal flip checkbox state
+    if (data.horizontal_flip !== undefined) {
+        document.getElementById('horizontalFlip').checked = data.horizontal_flip;
+    }
+}
+
 function updateStatus() {
     fetch(`${API_BASE}/status`)
         .then(res => res.json())
-        .then(data => {
-            document.getElementById('connectionStatus').style.background = 
-                data.connected ? '#00ff00' : '#ff0000';
-            document.getElementById('statusText').textContent = 
-                data.connected ? 'Connected' : 'Disconnected';
-            
-            document.getElementById('brightnessValue').textContent = data.brightness;
-            document.getElementById('brightnessSlider').value = data.brightness;
-            
-            const profileText = data.profile ? `Profile: ${data.profile} ✓` : 'Profile: RAW MODE';
-            document.getElementById('profileStatus').textContent = profileText;
-            
-            document.getElementById('autoCorrections').checked = data.auto_corrections;
-            
-            // Update horizontal flip checkbox state
-            if (data.horizontal_flip !== undefined) {
-                document.getElementById('horizontalFlip').checked = data.horizontal_flip;
-            }
-        })
+        .then(data => applyStatus(data))
         .catch(err => {
             console.error('Status update failed:', err);
             document.getElementById('connectionStatus').style.background = '#ff0000';
@@ -31,6 +33,153 @@ function updateStatus() {
         });
 }
 
+// ============== PUSH STREAM (status diffs + binary histograms) ==============
+// Status arrives as JSON diffs only when something changes; histograms arrive
+// as 768 uint32 bins (R, G, B). HTTP polling is only used while the socket is down.
+
+const WS_BASE = API_BASE.replace(/^http/, 'ws');
+let streamSocket = null;
+let currentStatus = {};
+let histogramPushFps = 0;
+let statusPollInterval = null;
+
+function isStreamOpen() {
+    return streamSocket !== null && streamSocket.readyState === WebSocket.OPEN;
+}
+
+function startStatusPolling() {
+    if (statusPollInterval) return;
+    statusPollInterval = setInterval(updateStatus, 1000);
+    updateStatus();
+}
+
+function stopStatusPolling() {
+    if (statusPollInterval) {
+        clearInterval(statusPollInterval);
+        statusPollInterval = null;
+    }
+}
+
+function setHistogramPushRate(fps) {
+    histogramPushFps = fps;
+    if (isStreamOpen()) {
+        streamSocket.send(JSON.stringify({ histogram_fps: fps }));
+    }
+}
+
+function connectStream() {
+    const socket = new WebSocket(`${WS_BASE}/ws/stream`);
+    socket.binaryType = 'arraybuffer';
+    streamSocket = socket;
+
+    socket.onopen = () => {
+        console.log('[STREAM] Connected');
+        stopStatusPolling();
+        currentStatus = {};
+        setHistogramPushRate(histogramPushFps);
+    };
+
+    socket.onmessage = (event) => {
+        if (typeof event.data !== 'string') {
+            if (typeof onHistogramMessage === 'function') {
+                onHistogramMessage(event.data);
+            }
+            return;
+        }
+        const message = JSON.parse(event.data);
+        if (message.type === 'status') {
+            Object.assign(currentStatus, message.changes);
+            applyStatus(currentStatus);
+        }
+    };
+
+    socket.onclose = () => {
+        if (streamSocket === socket) {
+            streamSocket = null;
+        }
+        console.warn('[STREAM] Disconnected, falling back to polling');
+        startStatusPolling();
+        setTimeout(connectStream, 2000);
+    };
+}
+
+// ============== CONTROL CHANNEL (PTZ + settings over one WebSocket) ==============
+// Every message carries a sequence number; the server applies them in order
+// and acks each with the resulting device state. While the socket is down the
+// same actions go out as the old per-action HTTP POSTs.
+
+class ControlChannel {
+    constructor(url) {
+        this.url = url;
+        this.socket = null;
+        this.seq = 0;
+        this.pending = new Map();
+        this.connect();
+    }
+
+    connect() {
+        const socket = new WebSocket(this.url);
+        this.socket = socket;
+
+        socket.onopen = () => console.log('[CONTROL] Connected');
+
+        socket.onmessage = (event) => {
+            const message = JSON.parse(event.data);
+            if (message.type !== 'ack') return;
+            const pending = this.pending.get(message.seq);
+            if (!pending) return;
+            this.pending.delete(message.seq);
+            clearTimeout(pending.timer);
+            if (message.ok) {
+                pending.resolve(message.state);
+            } else {
+                pending.reject(new Error(message.error));
+            }
+        };
+
+        socket.onclose = () => {
+            if (this.socket === socket) {
+                this.socket = null;
+            }
+            for (const pending of this.pending.values()) {
+                clearTimeout(pending.timer);
+                pending.reject(new Error('control channel closed'));
+            }
+            this.pending.clear();
+            console.warn('[CONTROL] Disconnected, using HTTP fallback');
+            setTimeout(() => this.connect(), 2000);
+        };
+    }
+
+    isOpen() {
+        return this.socket !== null && this.socket.readyState === WebSocket.OPEN;
+    }
+
+    /**
+     * Send a control message; resolves with the acked device state.
+     * @param {object} message - {type, ...params}
+     * @param {string} fallbackEndpoint - POST endpoint used while the socket is down
+     */
+    send(message, fallbackEndpoint) {
+        if (!this.isOpen()) {
+            return fetch(`${API_BASE}${fallbackEndpoint}`, { method: 'POST' })
+                .then(res => res.json());
+        }
+
+        const seq = ++this.seq;
+        return new Promise((resolve, reject) => {
+            const timer = setTimeout(() => {
+                this.pending.delete(seq);
+                reject(new Error(`control ack timeout (seq ${seq})`));
+            }, 5000);
+            this.pending.set(seq, { resolve, reject, timer });
+            this.socket.send(JSON.stringify({ seq, ...message }));
+        });
+    }
+}
+
+const controlChannel = new ControlChannel(`${WS_BASE}/ws/control`);
+
 // ============== PROFESSIONAL PTZ CONTROL SYSTEM ==============
 // Handles both single-click steps and hold-to-move continuous control
 
@@ -44,12 +193,14 @@ class PTZController {
     /**
      * Setup a PTZ button with smart click/hold behavior
      * @param {string} buttonId - DOM element ID
+     * @param {string} axis - 'zoom' | 'focus' | 'pan'
+     * @param {number} direction - +1 / -1
      * @param {string} startEndpoint - Continuous movement start endpoint
      * @param {string} stopEndpoint - Stop movement endpoint
      * @param {string} stepEndpoint - Single step endpoint
      * @param {number} holdDelay - Milliseconds before hold activates (default 250ms)
      */
-    setupButton(buttonId, startEndpoint, stopEndpoint, stepEndpoint, holdDelay = 250) {
+    setupButton(buttonId, axis, direction, startEndpoint, stopEndpoint, stepEndpoint, holdDelay = 250) {
         const button = document.getElementById(buttonId);
         if (!button) {
             console.error(`Button ${buttonId} not found`);
@@ -72,8 +223,11 @@ class PTZController {
             button.style.transform = 'scale(0.92)';
             button.style.opacity = '0.8';
             
-            // CRITICAL: Stop all other movements first to prevent conflicts
-            await this.stopAllMovements();
+            // Over the control channel the server stops other axes when this one
+            // starts; only the HTTP fallback needs an explicit stop-all first
+            if (!controlChannel.isOpen()) {
+                await this.stopAllMovements();
+            }
             
             // Start hold timer
             buttonState.timer = setTimeout(async () => {
@@ -89,8 +243,8 @@ class PTZController {
                 
                 // Start continuous movement
                 try {
-                    const response = await fetch(`${API_BASE}${startEndpoint}`, { method: 'POST' });
-                    const data = await response.json();
+                    const data = await controlChannel.send(
+                        { type: 'ptz_start', axis, direction }, startEndpoint);
                     console.log(`[PTZ] Started continuous: ${buttonId}`, data);
                 } catch (err) {
                     console.error(`[PTZ] Start error: ${buttonId}`, err);
@@ -123,8 +277,7 @@ class PTZController {
                 }
                 
                 try {
-                    const response = await fetch(`${API_BASE}${stopEndpoint}`, { method: 'POST' });
-                    const data = await response.json();
+                    const data = await controlChannel.send({ type: 'ptz_stop', axis }, stopEndpoint);
                     console.log(`[PTZ] Stopped continuous: ${buttonId}`, data);
                 } catch (err) {
                     console.error(`[PTZ] Stop error: ${buttonId}`, err);
@@ -133,11 +286,14 @@ class PTZController {
                 // Was a quick click - execute single step
                 if (stepEndpoint) {
                     try {
-                        // Small delay to ensure stop is processed
-                        await new Promise(resolve => setTimeout(resolve, 50));
+                        // Control messages are applied in order; HTTP needs a moment
+                        // for the stop-all to land first
+                        if (!controlChannel.isOpen()) {
+                            await new Promise(resolve => setTimeout(resolve, 50));
+                        }
                         
-                        const response = await fetch(`${API_BASE}${stepEndpoint}`, { method: 'POST' });
-                        const data = await response.json();
+                        const data = await controlChannel.send(
+                            { type: 'ptz_step', axis, direction }, stepEndpoint);
                         console.log(`[PTZ] Single step: ${buttonId}`, data);
                     } catch (err) {
                         console.error(`[PTZ] Step error: ${buttonId}`, err);
@@ -155,7 +311,7 @@ class PTZController {
             if (buttonState.isHolding && this.activeMovement === buttonId) {
                 this.activeMovement = null;
                 try {
-                    await fetch(`${API_BASE}${stopEndpoint}`, { method: 'POST' });
+                    await controlChannel.send({ type: 'ptz_stop', axis }, stopEndpoint);
                     console.log(`[PTZ] Cancelled: ${buttonId}`);
                 } catch (err) {
                     console.error(`[PTZ] Cancel error: ${buttonId}`, err);
@@ -205,7 +361,7 @@ class PTZController {
 
     async stopAllMovements() {
         try {
-            await fetch(`${API_BASE}/ptz/stop`, { method: 'POST' });
+            await controlChannel.send({ type: 'ptz_stop_all' }, '/ptz/stop');
             this.activeMovement = null;
         } catch (err) {
             console.error('[PTZ] Stop all error:', err);
@@ -220,6 +376,7 @@ const ptzController = new PTZController();
 // PAN controls (UP/DOWN/LEFT/RIGHT)
 ptzController.setupButton(
     'ptzUp',
+    'focus', 1,
     '/ptz/focus/start/in',
     '/ptz/focus/stop',
     '/ptz/focus/step/in',
@@ -228,6 +385,7 @@ ptzController.setupButton(
 
 ptzController.setupButton(
     'ptzDown',
+    'focus', -1,
     '/ptz/focus/start/out',
     '/ptz/focus/stop',
     '/ptz/focus/step/out',
@@ -236,6 +394,7 @@ ptzController.setupButton(
 
 ptzController.setupButton(
     'ptzLeft',
+    'pan', -1,
     '/ptz/pan/start/left',
     '/ptz/pan/stop',
     '/ptz/left',
@@ -244,6 +403,7 @@ ptzController.setupButton(
 
 ptzController.setupButton(
     'ptzRight',
+    'pan', 1,
     '/ptz/pan/start/right',
     '/ptz/pan/stop',
     '/ptz/right',
@@ -253,6 +413,7 @@ ptzController.setupButton(
 // ZOOM controls
 ptzController.setupButton(
     'zoomIn',
+    'zoom', 1,
     '/ptz/zoom/start/in',
     '/ptz/zoom/stop',
     '/zoom/in',
@@ -261,6 +422,7 @@ ptzController.setupButton(
 
 ptzController.setupButton(
     'zoomOut',
+    'zoom', -1,
     '/ptz/zoom/start/out',
     '/ptz/zoom/stop',
     '/zoom/out',
@@ -272,8 +434,7 @@ ptzController.setupButton(
 document.getElementById('brightnessSlider').addEventListener('input', (e) => {
     const value = e.target.value;
     document.getElementById('brightnessValue').textContent = value;
-    fetch(`${API_BASE}/brightness/${value}`, { method: 'POST' })
-        .then(res => res.json())
+    controlChannel.send({ type: 'brightness', value: Number(value) }, `/brightness/${value}`)
         .then(data => {
             const profileText = data.profile ? `Profile: ${data.profile} ✓` : 'Profile: RAW MODE';
             document.getElementById('profileStatus').textContent = profileText;
@@ -300,8 +461,7 @@ document.getElementById('nlmDenoise').addEventListener('change', (e) => {
 // Horizontal flip control
 document.getElementById('horizontalFlip').addEventListener('change', (e) => {
     const enabled = e.target.checked;
-    fetch(`${API_BASE}/horizontal_flip/${enabled}`, { method: 'POST' })
-        .then(res => res.json())
+    controlChannel.send({ type: 'flip', enabled }, `/horizontal_flip/${enabled}`)
         .then(data => {
             console.log('Horizontal Flip:', data.horizontal_flip ? 'ENABLED' : 'DISABLED');
         })
@@ -328,8 +488,8 @@ document.getElementById('backBtn').addEventListener('click', () => {
 // ============== INITIALIZATION ==============
 
 
-setInterval(updateStatus, 1000);
-updateStatus();
+startStatusPolling();
+connectStream();
 
 // Log initialization
 console.log('Professional PTZ Control System Loaded');
@@ -2,6 +2,10 @@
 // API_BASE is already defined in app.js
 
 let histogramUpdateInterval = null;
+let histogramFrameRequest = null;
+let latestHistogram = null;
+let histogramDirty = false;
+const HISTOGRAM_PUSH_FPS = 5;
 
 function drawHistogram(histData) {
     const canvas = document.getElementById('histogramCanvas');
@@ -92,7 +96,35 @@ function drawHistogram(histData) {
     ctx.globalAlpha = 1.0;
 }
 
+function onHistogramMessage(buffer) {
+    // Binary push from /ws/stream: 768 uint32 bins laid out R, G, B
+    const bins = new Uint32Array(buffer);
+    if (bins.length !== 768) {
+        console.error('Invalid histogram payload length:', bins.length);
+        return;
+    }
+    latestHistogram = {
+        r: bins.subarray(0, 256),
+        g: bins.subarray(256, 512),
+        b: bins.subarray(512, 768)
+    };
+    histogramDirty = true;
+}
+
+function renderHistogramFrame() {
+    // Draw at most once per display frame, and only when new data arrived
+    if (histogramDirty && latestHistogram) {
+        histogramDirty = false;
+        drawHistogram(latestHistogram);
+    }
+    histogramFrameRequest = requestAnimationFrame(renderHistogramFrame);
+}
+
 function updateHistogram() {
+    // HTTP fallback, only used while the push stream is down
+    if (typeof isStreamOpen === 'function' && isStreamOpen()) {
+        return;
+    }
     fetch(`${API_BASE}/histogram`)
         .then(res => res.json())
         .then(data => {
@@ -101,7 +133,8 @@ function updateHistogram() {
                 return;
             }
             if (data.histogram) {
-                drawHistogram(data.histogram);
+                latestHistogram = data.histogram;
+                histogramDirty = true;
             }
         })
         .catch(err => console.error('Histogram fetch error:', err));
@@ -109,32 +142,43 @@ function updateHistogram() {
 
 function startHistogramUpdates() {
     console.log('Starting histogram updates...');
+    setHistogramPushRate(HISTOGRAM_PUSH_FPS);
     updateHistogram();
     if (histogramUpdateInterval) {
         clearInterval(histogramUpdateInterval);
     }
     histogramUpdateInterval = setInterval(updateHistogram, 200);
+    if (!histogramFrameRequest) {
+        histogramFrameRequest = requestAnimationFrame(renderHistogramFrame);
+    }
 }
 
 function stopHistogramUpdates() {
     console.log('Stopping histogram updates...');
+    setHistogramPushRate(0);
     if (histogramUpdateInterval) {
         clearInterval(histogramUpdateInterval);
         histogramUpdateInterval = null;
     }
+    if (histogramFrameRequest) {
+        cancelAnimationFrame(histogramFrameRequest);
+        histogramFrameRequest = null;
+    }
 }
 
 // Slider event handlers
 document.getElementById('minSlider').addEventListener('input', (e) => {
     const value = e.target.value;
     document.getElementById('minValue').textContent = value;
-    fetch(`${API_BASE}/histogram/min/${value}`, { method: 'POST' });
+    controlChannel.send({ type: 'histogram_min', value: Number(value) }, `/histogram/min/${value}`)
+        .catch(err => console.error('Histogram min error:', err));
 });
 
 document.getElementById('maxSlider').addEventListener('input', (e) => {
     const value = e.target.value;
     document.getElementById('maxValue').textContent = value;
-    fetch(`${API_BASE}/histogram/max/${value}`, { method: 'POST' });
+    controlChannel.send({ type: 'histogram_max', value: Number(value) }, `/histogram/max/${value}`)
+        .catch(err => console.error('Histogram max error:', err));
 });
 
 console.log('histogram.js loaded successfully');
\ No newline at end of file